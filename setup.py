@@ -169,6 +169,14 @@ setup(
     entry_points={
         "console_scripts": [
             "mousetrap = mousetrap.main:main",
+            "mousetrap-compare-detectors = "
+            "mousetrap.tools.compare_detectors:main",
+            "mousetrap-batch = mousetrap.tools.batch:main",
+            "mousetrap-control = mousetrap.tools.control:main",
+            "mousetrap-detect-server = mousetrap.tools.detect_server:main",
+            "mousetrap-soak = mousetrap.tools.soak:main",
+            "mousetrap-tune-detectors = "
+            "mousetrap.tools.tune_detectors:main",
         ],
     },
     classifiers=[
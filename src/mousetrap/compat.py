@@ -8,5 +8,9 @@ PY3 = sys.version_info[0] == 3
 
 if PY3:
     string_types = (str, )
+    import queue
+    from time import perf_counter as timer
 else:
     string_types = (basestring, )
+    import Queue as queue  # noqa: F401
+    from time import time as timer  # noqa: F401
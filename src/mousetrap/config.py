@@ -9,6 +9,7 @@ from io import open
 
 
 class Config(dict):
+    DEFAULT_PATH = dirname(__file__) + '/mousetrap.yaml'
 
     def load(self, paths):
         for path in paths:
@@ -16,7 +17,7 @@ class Config(dict):
         return self
 
     def load_default(self):
-        return self.load_path(dirname(__file__) + '/mousetrap.yaml')
+        return self.load_path(self.DEFAULT_PATH)
 
     def load_path(self, path):
         print("# Loading %s" % (path))
@@ -60,7 +61,7 @@ def _rmerge(target, source):
         return
     for key, value in source.items():
         if isinstance(value, dict):
-            if key not in target:
+            if not isinstance(target.get(key), dict):
                 target[key] = {}
             _rmerge(target[key], value)
         else:
@@ -0,0 +1,275 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Control of a running MouseTrap over a local UNIX socket.
+
+A client connects, sends one request as a line of JSON and receives one
+response line:
+
+    {"command": "set_loops_per_second", "value": 5}
+    {"ok": true, "result": 5}
+
+ControlServer accepts connections on its own thread but only queues the
+requests; ControlPlugin executes them on the loop, between plugins, so
+commands never race with the pipeline. See COMMANDS for what they do.
+'''
+
+import json
+import math
+import os
+import socket
+import threading
+
+from mousetrap.compat import queue
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+MILLISECONDS_PER_SECOND = 1000.0
+RESPONSE_TIMEOUT = 5.0
+ACCEPT_TIMEOUT = 0.5
+MAX_REQUEST_BYTES = 65536
+CONTROL_PLUGIN = 'mousetrap.plugins.control.ControlPlugin'
+
+
+def get_default_socket_path():
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = '/tmp'
+    return os.path.join(directory, 'mousetrap-control-%d' % os.getuid())
+
+
+class ControlError(Exception):
+    pass
+
+
+class ControlRequest(object):
+
+    def __init__(self, request):
+        self.request = request
+        self.response = None
+        self._done = threading.Event()
+
+    def respond(self, response):
+        self.response = response
+        self._done.set()
+
+    def wait(self, timeout):
+        self._done.wait(timeout)
+        return self.response
+
+
+class ControlServer(object):
+    '''Listens on path and queues the requests it receives.'''
+
+    def __init__(self, path):
+        self._path = path
+        self._requests = queue.Queue()
+        self._stopping = threading.Event()
+        if os.path.exists(path):
+            os.unlink(path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        previous_umask = os.umask(0o077)
+        try:
+            self._socket.bind(path)
+        finally:
+            os.umask(previous_umask)
+        self._socket.listen(1)
+        self._socket.settimeout(ACCEPT_TIMEOUT)
+        self._thread = threading.Thread(
+            target=self._serve, name='mousetrap-control')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def get_path(self):
+        return self._path
+
+    def get_pending(self):
+        '''Return the queued ControlRequests, without waiting.'''
+        pending = []
+        while True:
+            try:
+                pending.append(self._requests.get_nowait())
+            except queue.Empty:
+                return pending
+
+    def close(self):
+        self._stopping.set()
+        self._thread.join()
+        self._socket.close()
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+
+    def _serve(self):
+        while not self._stopping.is_set():
+            try:
+                connection, _address = self._socket.accept()
+            except socket.timeout:
+                continue
+            try:
+                self._handle(connection)
+            except Exception:
+                LOGGER.exception("Control connection failed")
+            finally:
+                connection.close()
+
+    def _handle(self, connection):
+        connection.settimeout(RESPONSE_TIMEOUT)
+        line = _read_line(connection)
+        try:
+            request = ControlRequest(json.loads(line.decode('utf-8')))
+        except ValueError as error:
+            _send(connection, {'ok': False, 'error': str(error)})
+            return
+        self._requests.put(request)
+        response = request.wait(RESPONSE_TIMEOUT)
+        if response is None:
+            response = {'ok': False, 'error': 'The loop did not respond.'}
+        _send(connection, response)
+
+
+def execute(app, request):
+    '''Run one request against app. Return the response dict.'''
+    command = request.get('command')
+    if command not in COMMANDS:
+        return {
+            'ok': False,
+            'error': 'Unknown command %r, expected one of %s.' % (
+                command, ', '.join(sorted(COMMANDS))),
+        }
+    try:
+        return {'ok': True, 'result': COMMANDS[command](app, request)}
+    except (ControlError, KeyError, TypeError, ValueError) as error:
+        return {'ok': False, 'error': str(error)}
+
+
+def get_stats(app, request):
+    '''
+    Loop rate, per plugin schedule and timing, per feature hit rates and,
+    if the camera reports them, camera disconnections.
+    '''
+    plugins = []
+    for schedule in app.loop.get_schedules():
+        plugins.append({
+            'name': schedule.name,
+            'enabled': schedule.enabled,
+            'every': schedule.every,
+            'rate': schedule.rate,
+            'priority': schedule.priority,
+            'run_count': schedule.run_count,
+            'shed_count': schedule.shed_count,
+            'average_ms': schedule.average_duration * MILLISECONDS_PER_SECOND,
+            'last_ms': schedule.last_duration * MILLISECONDS_PER_SECOND,
+        })
+
+    detectors = app.session.get_stats()
+    for stats in detectors.values():
+        attempts = stats['attempts']
+        stats['hit_rate'] = stats['hits'] / attempts if attempts else 0.0
+
+    stats = {
+        'loops_per_second': app.loop.get_loops_per_second(),
+        'base_loops_per_second': app.loop.get_base_loops_per_second(),
+        'max_loops_per_second': app.loop.get_max_loops_per_second(),
+        'plugins': plugins,
+        'detectors': detectors,
+    }
+    if hasattr(app.camera, 'get_stats'):
+        stats['camera'] = app.camera.get_stats()
+    return stats
+
+
+def set_loops_per_second(app, request):
+    '''
+    Set the loop's base rate. Return the rate now in effect, which power
+    modes scale from the base and the governor may cap.
+    '''
+    value = float(request['value'])
+    if math.isnan(value) or math.isinf(value) or value <= 0:
+        raise ControlError('loops per second must be positive and finite')
+    app.loop.set_base_loops_per_second(value)
+    return app.loop.get_loops_per_second()
+
+
+def set_detector(app, request):
+    '''
+    Change scale_factor, min_neighbors and/or scale of every detector of
+    feature.
+    '''
+    feature = request['feature']
+    detectors = [
+        detector for detector in app.session.get_detectors().values()
+        if detector.get_name() == feature
+    ]
+    if not detectors:
+        raise ControlError('No detector for %s' % feature)
+
+    parameters = {}
+    for key, type_ in (('scale_factor', float), ('min_neighbors', int),
+                       ('scale', float)):
+        if request.get(key) is not None:
+            parameters[key] = type_(request[key])
+
+    for detector in detectors:
+        detector.set_parameters(**parameters)
+
+    return [detector.get_parameters() for detector in detectors]
+
+
+def enable_plugin(app, request):
+    return _set_plugin_enabled(app, request['name'], True)
+
+
+def disable_plugin(app, request):
+    return _set_plugin_enabled(app, request['name'], False)
+
+
+def _set_plugin_enabled(app, name, enabled):
+    schedule = app.loop.find_schedule(name)
+    if schedule is None:
+        raise ControlError('No plugin %s' % name)
+    if not enabled and schedule.name == CONTROL_PLUGIN:
+        raise ControlError('The control plugin cannot be disabled')
+    schedule.enabled = enabled
+    LOGGER.info("Plugin %s enabled: %s", schedule.name, enabled)
+    return {'name': schedule.name, 'enabled': enabled}
+
+
+COMMANDS = {
+    'stats': get_stats,
+    'set_loops_per_second': set_loops_per_second,
+    'set_detector': set_detector,
+    'enable_plugin': enable_plugin,
+    'disable_plugin': disable_plugin,
+}
+
+
+def send_request(path, request, timeout=RESPONSE_TIMEOUT + 1):
+    '''Client side: send request to the server at path, return response.'''
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+        _send(client, request)
+        return json.loads(_read_line(client).decode('utf-8'))
+    finally:
+        client.close()
+
+
+def _send(connection, message):
+    connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def _read_line(connection):
+    data = b''
+    while b'\n' not in data and len(data) < MAX_REQUEST_BYTES:
+        chunk = connection.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data.split(b'\n', 1)[0]
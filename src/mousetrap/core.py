@@ -9,21 +9,30 @@ from gi.repository import GLib
 
 from mousetrap.i18n import _
 from mousetrap.gui import Gui, Pointer
-from mousetrap.vision import Camera
+from mousetrap.vision import Camera, DetectionSession
+from mousetrap.compat import timer
+from mousetrap.trace import get_tracer
 
 
 class App(object):
 
-    def __init__(self, config):
+    def __init__(self, config, camera=None, pointer=None, gui=None):
+        '''
+        camera, pointer, gui - replacements for the built-in Camera, Pointer
+                and Gui, e.g. to run without a display. Default is to build
+                the built-in ones.
+        '''
         LOGGER.info("Initializing")
         self.config = config
         self.image = None
         self.loop = Loop(config, self)
-        self.gui = Gui(config)
-        self.camera = Camera(config)
-        self.pointer = Pointer(config)
+        self.gui = gui if gui is not None else Gui(config)
+        self.camera = camera if camera is not None else Camera(config)
+        self.pointer = pointer if pointer is not None else Pointer(config)
+        self.session = DetectionSession()
         self.plugins = []
-        self._assemble_plugins()
+        with self.session.activate():
+            self._assemble_plugins()
 
     def _assemble_plugins(self):
         self._load_plugins()
@@ -70,47 +79,258 @@ class App(object):
 class Observable(object):
 
     def __init__(self):
-        self.__observers = []
-        self.__arguments = {}
+        self._observers = []
+        self._arguments = {}
 
     def subscribe(self, observer):
-        self.__observers.append(observer)
+        self._observers.append(observer)
 
     def _add_argument(self, key, value):
-        self.__arguments[key] = value
+        self._arguments[key] = value
 
     def _fire(self, callback_name):
-        for observer in self.__observers:
-            callback = getattr(observer, callback_name)
-            callback(**self.__arguments)
+        for observer in self._observers:
+            self._notify(observer, callback_name)
+
+    def _notify(self, observer, callback_name):
+        callback = getattr(observer, callback_name)
+        callback(**self._arguments)
 
 
 class Loop(Observable):
     MILLISECONDS_PER_SECOND = 1000.0
     CALLBACK_RUN = 'run'
+    DEFAULT_SHED_BELOW_PRIORITY = 10
 
     def __init__(self, config, app):
         super(Loop, self).__init__()
         self._config = config
         self._interval = None
         self._loops_per_second = None
+        self._base_loops_per_second = config['loops_per_second']
+        self._requested_loops_per_second = config['loops_per_second']
+        self._max_loops_per_second = None
         self._timeout_id = None
         self._set_loops_per_second(config['loops_per_second'])
         self._add_argument('app', app)
         self._loop_enabled = False
+        self._reschedule = False
+        self._ticks = 0
+        self._schedules = []
+        loop_config = config.get('loop') or {}
+        self._plugins_config = loop_config.get('plugins') or {}
+        self._budget_ms = loop_config.get('budget_ms') or 0
+        self._shed_below_priority = loop_config.get(
+            'shed_below_priority', self.DEFAULT_SHED_BELOW_PRIORITY)
 
     def _set_loops_per_second(self, loops_per_second):
         self._loops_per_second = loops_per_second
         self._interval = int(round(
             self.MILLISECONDS_PER_SECOND / self._loops_per_second))
 
+    def get_loops_per_second(self):
+        return self._loops_per_second
+
+    def set_loops_per_second(self, loops_per_second):
+        '''Change the loop rate. Takes effect after the current pass.'''
+        self._requested_loops_per_second = loops_per_second
+        self._apply_loops_per_second()
+
+    def get_base_loops_per_second(self):
+        return self._base_loops_per_second
+
+    def set_base_loops_per_second(self, loops_per_second):
+        '''
+        Change the rate the loop normally runs at, which plugins such as
+        PowerModePlugin scale from. A rate they have set is scaled along.
+        '''
+        scale = self._requested_loops_per_second / \
+            self._base_loops_per_second
+        self._base_loops_per_second = loops_per_second
+        self.set_loops_per_second(loops_per_second * scale)
+
+    def get_max_loops_per_second(self):
+        return self._max_loops_per_second
+
+    def set_max_loops_per_second(self, max_loops_per_second):
+        '''
+        Cap the loop rate, whatever set_loops_per_second asks for. None
+        removes the cap.
+        '''
+        self._max_loops_per_second = max_loops_per_second
+        self._apply_loops_per_second()
+
+    def _apply_loops_per_second(self):
+        loops_per_second = self._requested_loops_per_second
+        if self._max_loops_per_second is not None:
+            loops_per_second = min(
+                loops_per_second, self._max_loops_per_second)
+        if loops_per_second == self._loops_per_second:
+            return
+        LOGGER.info("Loops per second: %s", loops_per_second)
+        self._set_loops_per_second(loops_per_second)
+        self._reschedule = True
+
+    def subscribe(self, observer):
+        super(Loop, self).subscribe(observer)
+        self._schedules.append(
+            PluginSchedule.from_config(observer, self._plugins_config)
+        )
+
+    def get_schedules(self):
+        return list(self._schedules)
+
+    def find_schedule(self, name):
+        '''
+        Return the schedule of the plugin named name, its class path or just
+        its class name, or None.
+        '''
+        for schedule in self._schedules:
+            if name in (schedule.name, schedule.name.rsplit('.', 1)[-1]):
+                return schedule
+        return None
+
     def start(self):
         self._loop_enabled = True
+        self._reschedule = False
         self._timeout_id = GLib.timeout_add(self._interval, self._run)
 
     def stop(self):
         self._loop_enabled = False
 
+    def _get_budget(self):
+        '''Seconds a pass may take before low priority plugins are shed.'''
+        if self._budget_ms:
+            return self._budget_ms / self.MILLISECONDS_PER_SECOND
+        return self._interval / self.MILLISECONDS_PER_SECOND
+
+    def _get_remaining_cost(self, index, now, interval):
+        '''
+        Expected seconds the plugins after index that cannot be shed will
+        take this pass, so a low priority plugin early in the pass is shed
+        when they would overrun the budget.
+        '''
+        remaining = 0.0
+        for schedule in self._schedules[index + 1:]:
+            if not schedule.enabled or \
+                    schedule.priority < self._shed_below_priority:
+                continue
+            if schedule.is_due(self._ticks, now, interval):
+                remaining += schedule.average_duration
+        return remaining
+
     def _run(self):
-        self._fire(self.CALLBACK_RUN)
+        self.step()
+
+        if self._loop_enabled and self._reschedule:
+            self._reschedule = False
+            self._timeout_id = GLib.timeout_add(self._interval, self._run)
+            return False
+
         return self._loop_enabled
+
+    def step(self):
+        '''Run one pass of the loop now, without waiting for GLib.'''
+        self._ticks += 1
+        pass_begin = timer()
+        interval = self._interval / self.MILLISECONDS_PER_SECOND
+        budget = self._get_budget()
+
+        for index, schedule in enumerate(self._schedules):
+            begin = timer()
+
+            if not schedule.enabled or \
+                    not schedule.is_due(self._ticks, begin, interval):
+                continue
+
+            if schedule.priority < self._shed_below_priority and \
+                    begin - pass_begin + schedule.average_duration + \
+                    self._get_remaining_cost(index, begin, interval) > \
+                    budget:
+                schedule.shed()
+                continue
+
+            with get_tracer().current_frame().span(schedule.name):
+                self._notify(schedule.plugin, self.CALLBACK_RUN)
+
+            schedule.ran(self._ticks, begin, timer())
+
+        get_tracer().end_frame()
+
+
+class PluginSchedule(object):
+    '''
+    When a plugin runs within the loop, and what it has cost so far.
+    '''
+
+    DEFAULT_PRIORITY = 50
+    SMOOTHING = 0.1
+
+    def __init__(self, plugin, every=1, rate=None, priority=DEFAULT_PRIORITY):
+        '''
+        every - run on every Nth pass of the loop.
+
+        rate - run at most this many times per second. Overrides every.
+
+        priority - plugins with a low priority are shed when a pass of the
+                loop is over budget.
+        '''
+        self.plugin = plugin
+        self.name = plugin.__class__.__module__ + '.' + \
+            plugin.__class__.__name__
+        self.every = every
+        self.rate = rate
+        self.priority = priority
+        self.enabled = True
+        self.average_duration = 0.0
+        self.last_duration = 0.0
+        self.run_count = 0
+        self.shed_count = 0
+        self._last_run_tick = None
+        self._last_run_time = None
+
+    @classmethod
+    def from_config(cls, plugin, plugins_config):
+        schedule = cls(plugin)
+        plugin_config = plugins_config.get(schedule.name) or {}
+        schedule.every = plugin_config.get('every', schedule.every)
+        schedule.rate = plugin_config.get('rate', schedule.rate)
+        schedule.priority = plugin_config.get('priority', schedule.priority)
+        return schedule
+
+    def is_due(self, tick, now, interval):
+        '''
+        tick - number of the current pass of the loop.
+
+        now - time the plugin would run.
+
+        interval - seconds between passes of the loop. A plugin with a rate
+                runs on the pass closest to when it is due.
+        '''
+        if self._last_run_tick is None:
+            return True
+
+        if self.rate:
+            period = 1.0 / self.rate
+            return now - self._last_run_time >= period - interval / 2
+
+        return tick - self._last_run_tick >= self.every
+
+    def ran(self, tick, begin, end):
+        self.run_count += 1
+        self._last_run_tick = tick
+        self._last_run_time = begin
+        self.last_duration = end - begin
+        if self.run_count == 1:
+            self.average_duration = self.last_duration
+        else:
+            self.average_duration += self.SMOOTHING * (
+                self.last_duration - self.average_duration)
+
+    def shed(self):
+        '''
+        Record a skipped run. The cost estimate decays while shed, so a
+        plugin that was slow once is eventually tried again.
+        '''
+        self.shed_count += 1
+        self.average_duration *= 1 - self.SMOOTHING
@@ -0,0 +1,397 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+A detection server for several MouseTrap instances to share, e.g. on a
+multi-seat machine: it loads the cascades once and runs the detections of
+all its clients on a few worker threads, instead of every instance loading
+its own and competing for the cores.
+
+Clients are RemoteBackends (see mousetrap.vision). Each holds one
+connection, over which it sends a line of JSON per request and receives
+one response line. The hello carries the file descriptor of the client's
+own one-slot frame bus (see mousetrap.framebus); each detect names the
+frame the client has just written there:
+
+    {"command": "hello", "client": "1234", "feature": "face"}
+    {"ok": true}
+    {"command": "detect", "sequence": 7, "scale_factor": 1.5,
+     "min_neighbors": 5}
+    {"ok": true, "rects": [[120, 80, 160, 160]]}
+
+The server detects with the backends of its own configuration. Requests
+are queued per client, and workers take them in batches of one request
+from each client in turn, so a busy client cannot starve the others.
+
+Passing file descriptors needs Python 3.3 or later.
+'''
+
+import array
+from collections import deque
+import json
+import os
+import pwd
+import socket
+import stat
+import struct
+import threading
+
+from mousetrap.framebus import FrameBusFormatError, FrameBusReader
+from mousetrap.vision import DetectorBackend, HaarLoader
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+ACCEPT_TIMEOUT = 0.5
+MAX_LINE_BYTES = 65536
+FD_SIZE = array.array('i').itemsize
+SHARED_SOCKET_PATH = '/tmp/mousetrap-detect'
+
+
+def get_default_socket_path(shared=False):
+    '''
+    Return the socket of this user's server or, if shared, the one path
+    where the clients of every user look for the machine's server.
+    '''
+    if shared:
+        return SHARED_SOCKET_PATH
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = '/tmp'
+    return os.path.join(directory, 'mousetrap-detect-%d' % os.getuid())
+
+
+def check_socket_owner(path, owner=None):
+    '''
+    Raise socket.error unless path is a socket of this user, root or owner
+    (a user name or id). Anyone can create a socket in /tmp, and a server
+    there gets every frame its clients send.
+    '''
+    status = os.lstat(path)
+    if not stat.S_ISSOCK(status.st_mode):
+        raise socket.error('%s is not a socket' % path)
+    owners = set([os.getuid(), 0])
+    if isinstance(owner, int):
+        owners.add(owner)
+    elif owner is not None:
+        owners.add(pwd.getpwnam(owner).pw_uid)
+    if status.st_uid not in owners:
+        raise socket.error('%s belongs to the untrusted user %d' % (
+            path, status.st_uid))
+
+
+class Channel(object):
+    '''Lines of JSON, and file descriptors, over a connected UNIX socket.'''
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._file = None
+
+    def send(self, message, fds=()):
+        data = json.dumps(message).encode('utf-8') + b'\n'
+        if not fds:
+            self._connection.sendall(data)
+            return
+        sent = self._connection.sendmsg([data], [(
+            socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))])
+        if sent < len(data):
+            self._connection.sendall(data[sent:])
+
+    def receive(self):
+        '''Return the next message, or None if the other end closed.'''
+        if self._file is None:
+            self._file = self._connection.makefile('rb')
+        line = self._file.readline(MAX_LINE_BYTES)
+        if not line:
+            return None
+        return json.loads(line.decode('utf-8'))
+
+    def receive_with_fds(self):
+        '''
+        Return the first message, or None, and the file descriptors sent
+        with it. Must come before receive: the other end has to wait for a
+        response before it sends more.
+        '''
+        data = b''
+        fds = array.array('i')
+        while not data.endswith(b'\n') and len(data) < MAX_LINE_BYTES:
+            chunk, ancillary, _flags, _address = self._connection.recvmsg(
+                4096, socket.CMSG_SPACE(FD_SIZE))
+            for level, type_, fd_data in ancillary:
+                if level == socket.SOL_SOCKET and \
+                        type_ == socket.SCM_RIGHTS:
+                    fds.frombytes(
+                        fd_data[:len(fd_data) - len(fd_data) % FD_SIZE])
+            if not chunk:
+                break
+            data += chunk
+        if not data.endswith(b'\n'):
+            return None, list(fds)
+        return json.loads(data.decode('utf-8')), list(fds)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._connection.close()
+
+
+class DetectRequest(object):
+
+    def __init__(self, client, reader, feature, sequence, scale_factor,
+                 min_neighbors):
+        self.client = client
+        self.reader = reader
+        self.feature = feature
+        self.sequence = sequence
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.response = None
+        self._done = threading.Event()
+
+    def respond(self, response):
+        self.response = response
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        return self.response
+
+
+class FairScheduler(object):
+    '''
+    Queues requests per client. get_batch hands out up to max_batch of
+    them, one from each client with requests waiting in turn, so every
+    such client gets its share of each batch.
+    '''
+
+    def __init__(self, max_batch):
+        self._max_batch = max_batch
+        self._condition = threading.Condition()
+        self._queues = {}
+        self._turns = deque()
+        self._closed = False
+
+    def put(self, request):
+        with self._condition:
+            if self._closed:
+                request.respond(
+                    {'ok': False, 'error': 'The server is closing.'})
+                return
+            if request.client not in self._queues:
+                self._queues[request.client] = deque()
+                self._turns.append(request.client)
+            self._queues[request.client].append(request)
+            self._condition.notify()
+
+    def get_batch(self):
+        '''
+        Wait for requests and return a batch of them. Return an empty
+        batch once closed and all requests are handed out.
+        '''
+        with self._condition:
+            while not self._turns and not self._closed:
+                self._condition.wait()
+
+            batch = []
+            while self._turns and len(batch) < self._max_batch:
+                client = self._turns.popleft()
+                requests = self._queues[client]
+                batch.append(requests.popleft())
+                if requests:
+                    self._turns.append(client)
+                else:
+                    del self._queues[client]
+            return batch
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class DetectWorker(object):
+    '''
+    Answers batches of requests from a FairScheduler on its own thread,
+    with its own backends: cascades must not be used by two threads at
+    once.
+    '''
+
+    def __init__(self, config, scheduler, name):
+        self._config = config
+        self._scheduler = scheduler
+        self._loader = HaarLoader(config)
+        self._backends = {}
+        self._thread = threading.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def join(self):
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = self._scheduler.get_batch()
+            if not batch:
+                return
+            # Requests for one feature run back to back, on its cascade.
+            for request in sorted(batch, key=lambda request: request.feature):
+                request.respond(self._detect(request))
+
+    def _detect(self, request):
+        try:
+            backend = self._get_backend(request.feature)
+            frame = request.reader.read(request.sequence, copy=False)
+            if frame is None:
+                return {
+                    'ok': False,
+                    'error': 'Frame %d is not in the frame bus.' % (
+                        request.sequence),
+                }
+            rects = backend.detect(
+                frame.image, request.scale_factor, request.min_neighbors)
+            if not request.reader.is_intact(frame):
+                return {'ok': False, 'error': 'The frame was overwritten.'}
+            return {
+                'ok': True,
+                'rects': [[int(value) for value in rect] for rect in rects],
+            }
+        except Exception as error:
+            LOGGER.exception("Detecting %s failed", request.feature)
+            return {'ok': False, 'error': str(error)}
+
+    def _get_backend(self, feature):
+        if feature not in self._backends:
+            self._backends[feature] = DetectorBackend.from_config(
+                self._config, feature, self._loader, local=True)
+        return self._backends[feature]
+
+
+class DetectServer(object):
+    '''
+    Listens on path for RemoteBackends, and answers their requests with
+    the workers and max_batch of the detect_server configuration.
+    '''
+
+    def __init__(self, config, path):
+        server_config = config.get('detect_server') or {}
+        self._path = path
+        self._stopping = threading.Event()
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+        self._scheduler = FairScheduler(server_config.get('max_batch', 8))
+        self._workers = [
+            DetectWorker(config, self._scheduler, 'mousetrap-detect-%d' % (
+                index))
+            for index in range(server_config.get('workers', 2))
+        ]
+
+        if os.path.exists(path):
+            os.unlink(path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        previous_umask = os.umask(0o077)
+        try:
+            self._socket.bind(path)
+        finally:
+            os.umask(previous_umask)
+        if server_config.get('shared', False):
+            os.chmod(path, 0o666)
+        self._socket.listen(16)
+        self._socket.settimeout(ACCEPT_TIMEOUT)
+        self._thread = threading.Thread(
+            target=self._serve, name='mousetrap-detect-server')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def get_path(self):
+        return self._path
+
+    def wait(self):
+        '''Wait until the server is stopped.'''
+        while self._thread.is_alive():
+            self._thread.join(ACCEPT_TIMEOUT)
+
+    def stop(self):
+        '''Stop accepting clients. Safe to call from a signal handler.'''
+        self._stopping.set()
+
+    def close(self):
+        self.stop()
+        self._thread.join()
+        self._socket.close()
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+        with self._connections_lock:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+        self._scheduler.close()
+        for worker in self._workers:
+            worker.join()
+
+    def _serve(self):
+        while not self._stopping.is_set():
+            try:
+                connection, _address = self._socket.accept()
+            except socket.timeout:
+                continue
+            connection.settimeout(None)
+            with self._connections_lock:
+                self._connections.add(connection)
+            thread = threading.Thread(
+                target=self._serve_client, args=(connection,),
+                name='mousetrap-detect-client')
+            thread.daemon = True
+            thread.start()
+
+    def _serve_client(self, connection):
+        channel = Channel(connection)
+        client = None
+        reader = None
+        try:
+            hello, fds = channel.receive_with_fds()
+            for fd in fds[1:]:
+                os.close(fd)
+            if hello is None or hello.get('command') != 'hello' or \
+                    len(fds) == 0:
+                if fds:
+                    os.close(fds[0])
+                channel.send({
+                    'ok': False,
+                    'error': 'Expected a hello with a frame bus.',
+                })
+                return
+
+            reader = FrameBusReader(fds[0])
+            client = hello.get('client', '')
+            feature = hello['feature']
+            LOGGER.info("Client %s connected for %s", client, feature)
+            channel.send({'ok': True})
+
+            while True:
+                message = channel.receive()
+                if message is None:
+                    break
+                request = DetectRequest(
+                    client, reader, feature, int(message['sequence']),
+                    float(message['scale_factor']),
+                    int(message['min_neighbors']),
+                )
+                self._scheduler.put(request)
+                channel.send(request.wait())
+
+            LOGGER.info("Client %s disconnected", client)
+        except (socket.error, struct.error, FrameBusFormatError, KeyError,
+                TypeError, ValueError) as error:
+            LOGGER.warning("Client %s failed: %s", client, error)
+        finally:
+            if reader is not None:
+                reader.close()
+            with self._connections_lock:
+                self._connections.discard(connection)
+            channel.close()
@@ -0,0 +1,268 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+A ring of frames in shared memory, for processes that want MouseTrap's
+camera feed without running inside it.
+
+One writer publishes frames into a fixed number of slots of a file, usually
+under /dev/shm. Readers map the same file and read the latest frame, or a
+recent one by sequence number. The writer never waits for readers: each
+slot carries a write count, odd while the slot is being written, so
+readers can tell when they have read a frame that was being overwritten
+and try again.
+
+    from mousetrap.framebus import FrameBusReader, get_default_path
+
+    with FrameBusReader(get_default_path()) as bus:
+        frame = bus.read_latest()
+        if frame is not None:
+            print(frame.sequence, frame.image.shape, frame.metadata)
+
+Layout:
+
+    header - HEADER: MAGIC, version, slot count, slot size, metadata size,
+             sequence of the latest complete frame (0 for none)
+    slots  - slot count slots of slot size bytes, each a SLOT header, JSON
+             metadata padded to metadata size, and pixels
+'''
+
+from io import open
+import json
+import mmap
+import os
+import stat
+import struct
+
+import numpy
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+MAGIC = b'MTFRAMES'
+VERSION = 1
+
+HEADER = struct.Struct('<8sIIQIxxxxQ')
+LATEST = struct.Struct('<Q')
+LATEST_OFFSET = HEADER.size - LATEST.size
+SLOT = struct.Struct('<QQdHHBxxxI')
+WRITE_COUNT = struct.Struct('<Q')
+
+READ_ATTEMPTS = 3
+
+
+def get_default_path():
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp'
+    return os.path.join(directory, 'mousetrap-frames-%d' % os.getuid())
+
+
+class FrameBusWriter(object):
+    '''
+    The bus file is readable by its owner only, as it holds camera frames.
+    An existing file at path is reused only if it is a regular file of this
+    user, not a symbolic link.
+    '''
+
+    def __init__(self, path, slot_count=4, max_width=1280, max_height=720,
+                 max_channels=3, metadata_size=4096):
+        self._path = path
+        self._slot_count = slot_count
+        self._metadata_size = metadata_size
+        self._pixels_size = max_width * max_height * max_channels
+        self._slot_size = SLOT.size + metadata_size + self._pixels_size
+        size = HEADER.size + slot_count * self._slot_size
+
+        self._file = _open_private(path)
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        HEADER.pack_into(
+            self._map, 0, MAGIC, VERSION, slot_count, self._slot_size,
+            metadata_size, 0)
+        self._sequence = 0
+
+    def get_path(self):
+        return self._path
+
+    def fileno(self):
+        '''The descriptor of the bus file, e.g. to pass to another process.'''
+        return self._file.fileno()
+
+    def publish(self, timestamp, image_cv, metadata=None):
+        '''
+        Write a frame into the next slot. Return its sequence number, or
+        None if the frame is too large for a slot.
+        '''
+        if image_cv.nbytes > self._pixels_size:
+            return None
+        metadata_bytes = json.dumps(metadata).encode('utf-8')
+        if len(metadata_bytes) > self._metadata_size:
+            LOGGER.warning(
+                "Frame metadata (%d bytes) too large for the frame bus",
+                len(metadata_bytes))
+            metadata_bytes = b'null'
+
+        sequence = self._sequence + 1
+        offset = HEADER.size + (sequence % self._slot_count) * \
+            self._slot_size
+        write_count = WRITE_COUNT.unpack_from(self._map, offset)[0]
+
+        WRITE_COUNT.pack_into(self._map, offset, write_count + 1)
+        height, width = image_cv.shape[:2]
+        channels = 1 if image_cv.ndim == 2 else image_cv.shape[2]
+        SLOT.pack_into(
+            self._map, offset, write_count + 1, sequence, timestamp,
+            width, height, channels, len(metadata_bytes))
+        metadata_offset = offset + SLOT.size
+        self._map[metadata_offset:metadata_offset + len(metadata_bytes)] = \
+            metadata_bytes
+        pixels = numpy.frombuffer(
+            self._map, dtype=numpy.uint8, count=image_cv.nbytes,
+            offset=metadata_offset + self._metadata_size)
+        pixels[:] = image_cv.reshape(-1)
+        del pixels
+        WRITE_COUNT.pack_into(self._map, offset, write_count + 2)
+
+        LATEST.pack_into(self._map, LATEST_OFFSET, sequence)
+        self._sequence = sequence
+        return sequence
+
+    def close(self, unlink=True):
+        self._map.close()
+        self._file.close()
+        if unlink:
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+
+
+def _open_private(path):
+    fd = os.open(
+        path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    try:
+        status = os.fstat(fd)
+        if status.st_uid != os.getuid() or not stat.S_ISREG(status.st_mode):
+            raise IOError('%s belongs to another user' % path)
+        os.fchmod(fd, 0o600)
+        os.ftruncate(fd, 0)
+    except Exception:
+        os.close(fd)
+        raise
+    return open(fd, 'r+b')
+
+
+class FrameBusFrame(object):
+
+    def __init__(self, sequence, timestamp, image, metadata):
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.image = image
+        self.metadata = metadata
+
+
+class FrameBusReader(object):
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise FrameBusFormatError(path)
+        magic, version, self._slot_count, self._slot_size, \
+            self._metadata_size, _latest = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version > VERSION:
+            self.close()
+            raise FrameBusFormatError(path)
+        self._pixels_size = \
+            self._slot_size - SLOT.size - self._metadata_size
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def get_latest_sequence(self):
+        '''Sequence number of the latest complete frame, 0 if none.'''
+        return LATEST.unpack_from(self._map, LATEST_OFFSET)[0]
+
+    def read_latest(self, copy=True):
+        '''Return the latest FrameBusFrame, or None if there is none yet.'''
+        for _attempt in range(READ_ATTEMPTS):
+            sequence = self.get_latest_sequence()
+            if sequence == 0:
+                return None
+            frame = self.read(sequence, copy)
+            if frame is not None:
+                return frame
+        return None
+
+    def read(self, sequence, copy=True):
+        '''
+        Return the frame with sequence number sequence, or None if it is no
+        longer (or not yet) in the ring.
+
+        copy - if False, the image is a read-only view of the shared memory,
+                valid only until the writer reuses its slot. Check with
+                is_intact after using it.
+        '''
+        offset = self._get_offset(sequence)
+        for _attempt in range(READ_ATTEMPTS):
+            write_count, slot_sequence, timestamp, width, height, channels, \
+                metadata_length = SLOT.unpack_from(self._map, offset)
+            if write_count % 2 or \
+                    self._get_write_count(offset) != write_count:
+                continue
+            if slot_sequence != sequence:
+                return None
+            # A header torn by a concurrent write could point anywhere.
+            if metadata_length > self._metadata_size or \
+                    width * height * channels > self._pixels_size:
+                continue
+
+            metadata_offset = offset + SLOT.size
+            try:
+                metadata = json.loads(self._map[
+                    metadata_offset:metadata_offset + metadata_length
+                ].decode('utf-8'))
+                shape = (height, width) if channels == 1 else \
+                    (height, width, channels)
+                image = numpy.frombuffer(
+                    self._map, dtype=numpy.uint8,
+                    count=width * height * channels,
+                    offset=metadata_offset + self._metadata_size,
+                ).reshape(shape)
+            except ValueError:
+                # Torn metadata; UnicodeDecodeError is a ValueError too.
+                continue
+            if copy:
+                image = image.copy()
+
+            if self._get_write_count(offset) == write_count:
+                return FrameBusFrame(sequence, timestamp, image, metadata)
+        return None
+
+    def is_intact(self, frame):
+        '''True if frame's slot has not been rewritten since frame was read.'''
+        offset = self._get_offset(frame.sequence)
+        return SLOT.unpack_from(self._map, offset)[1] == frame.sequence and \
+            self._get_write_count(offset) % 2 == 0
+
+    def _get_offset(self, sequence):
+        return HEADER.size + (sequence % self._slot_count) * self._slot_size
+
+    def _get_write_count(self, offset):
+        return WRITE_COUNT.unpack_from(self._map, offset)[0]
+
+
+class FrameBusFormatError(Exception):
+    pass
@@ -48,6 +48,11 @@ from Xlib import X
 
 
 from mousetrap.i18n import _
+from mousetrap.log import RateLimitedLog
+from mousetrap.trace import get_tracer
+
+# Pointer messages come every pass of the loop.
+PASS_LOG = RateLimitedLog(LOGGER)
 
 
 class ImageWindow(object):
@@ -69,26 +74,24 @@ class ImageWindow(object):
 
 
 class Gui(object):
-    _running = False
 
-    @classmethod
-    def start(cls):
+    def __init__(self, config):
+        self._config = config
+        self._windows = {}
+        self._running = False
+
+    def start(self):
         '''Start handling events.'''
-        if not cls._running:
-            cls._running = True
+        if not self._running:
+            self._running = True
             get_gtk().main()
 
-    @classmethod
-    def stop(cls):
+    def stop(self):
         '''Stop handling events.'''
-        if cls._running:
-            cls._running = False
+        if self._running:
+            self._running = False
             get_gtk().main_quit()
 
-    def __init__(self, config):
-        self._config = config
-        self._windows = {}
-
     def show_image(self, window_name, image):
         '''Displays image in window named by window_name.
            May reuse named windows.
@@ -106,6 +109,8 @@ class Gui(object):
 
 class Pointer(object):
     BUTTON_LEFT = X.Button1
+    S_MOVING = _('Moving pointer to %s')
+    S_NOT_MOVING = _('Not moving the pointer')
 
     def __init__(self, config):
         self._config = config
@@ -114,18 +119,23 @@ class Pointer(object):
         self._pointer = device_manager.get_client_pointer()
         self._screen = gdk_display.get_default_screen()
         self._moved = False
+        self._click_count = 0
 
     def set_position(self, position=None):
         '''Move pointer to position (x, y). If position is None,
         no change is made.'''
+        with get_tracer().current_frame().span('Pointer.set_position'):
+            self._set_position(position)
+
+    def _set_position(self, position):
         self._moved = False
         if position is not None:
-            LOGGER.debug(_('Moving pointer to %s'), position)
+            PASS_LOG.debug(self.S_MOVING, position)
 
             self._pointer.warp(self._screen, position[0], position[1])
             self._moved = True
         else:
-            LOGGER.debug(_('Not moving the pointer'))
+            PASS_LOG.debug(self.S_NOT_MOVING)
 
     def is_moving(self):
         '''Returns True if last call to set_position passed a non-None value
@@ -139,9 +149,92 @@ class Pointer(object):
         return (position[x_index], position[y_index])
 
     def click(self, button=BUTTON_LEFT):
+        with get_tracer().current_frame().span('Pointer.click'):
+            self._click(button)
+        self._click_count += 1
+
+    def get_click_count(self):
+        '''Number of clicks since the pointer was built.'''
+        return self._click_count
+
+    def _click(self, button):
         display = XlibDisplay()
         for event, button in \
                 [(X.ButtonPress, button), (X.ButtonRelease, button)]:
             LOGGER.debug('%s %s', event, button)
             xtest.fake_input(display, event, button)
             display.sync()
+
+
+class NullGui(object):
+    '''Gui for running without a display. Shows nothing.'''
+
+    def __init__(self, config, screen_width=1920, screen_height=1080):
+        self._config = config
+        self._screen_width = screen_width
+        self._screen_height = screen_height
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def show_image(self, window_name, image):
+        pass
+
+    def get_screen_width(self):
+        return self._screen_width
+
+    def get_screen_height(self):
+        return self._screen_height
+
+
+class NullPointer(object):
+    '''
+    Pointer for running without a display. Remembers where it was moved
+    and when it clicked instead of moving the real pointer.
+    '''
+
+    def __init__(self, config, screen_width=1920, screen_height=1080,
+                 keep_trajectory=True):
+        '''
+        keep_trajectory - if False, trajectory and clicks stay empty, for
+                          runs too long to remember every pass.
+        '''
+        self._config = config
+        self._screen_width = screen_width
+        self._screen_height = screen_height
+        self._keep_trajectory = keep_trajectory
+        self._position = (screen_width // 2, screen_height // 2)
+        self._moved = False
+        self._passes = 0
+        self._click_count = 0
+        self.trajectory = []
+        self.clicks = []
+
+    def set_position(self, position=None):
+        self._moved = False
+        if position is not None:
+            self._position = (
+                min(max(int(position[0]), 0), self._screen_width - 1),
+                min(max(int(position[1]), 0), self._screen_height - 1),
+            )
+            self._moved = True
+        self._passes += 1
+        if self._keep_trajectory:
+            self.trajectory.append(self._position)
+
+    def is_moving(self):
+        return self._moved
+
+    def get_position(self):
+        return self._position
+
+    def click(self, button=Pointer.BUTTON_LEFT):
+        self._click_count += 1
+        if self._keep_trajectory:
+            self.clicks.append((self._passes, button))
+
+    def get_click_count(self):
+        return self._click_count
@@ -9,15 +9,33 @@ All things image manipulation.
 import cv2
 from gi.repository import GdkPixbuf
 
+from mousetrap.compat import timer
+from mousetrap.trace import NULL_FRAME_TRACE
+
 _GDK_PIXBUF_BIT_PER_SAMPLE = 8
 
 
 class Image(object):
-    def __init__(self, config, image_cv, is_grayscale=False):
+    def __init__(self, config, image_cv, is_grayscale=False, trace=None,
+                 timestamp=None):
+        '''
+        trace - FrameTrace of the frame this image came from. Crops of a
+                frame should pass on the trace of the frame.
+        timestamp - seconds (on compat.timer's clock) when the frame was
+                    captured, defaults to now. Crops of a frame should pass
+                    on the timestamp of the frame.
+        '''
+        if trace is None:
+            trace = NULL_FRAME_TRACE
+        if timestamp is None:
+            timestamp = timer()
+        self.trace = trace
+        self.timestamp = timestamp
         self._config = config
         self._image_cv = image_cv
         self._is_grayscale = is_grayscale
         self._image_cv_grayscale = None
+        self._thumbnails = {}
         if self._is_grayscale:
             self._image_cv_grayscale = self._image_cv
 
@@ -29,6 +47,16 @@ class Image(object):
             self._image_cv_grayscale = _cv_rgb_to_cv_grayscale(self._image_cv)
         return self._image_cv_grayscale
 
+    def get_thumbnail(self, size):
+        '''Grayscale copy of this image shrunk to size (width, height).'''
+        if size not in self._thumbnails:
+            self._thumbnails[size] = cv2.resize(
+                self.to_cv_grayscale(),
+                size,
+                interpolation=cv2.INTER_AREA,
+            )
+        return self._thumbnails[size]
+
     def to_pixbuf(self):
         return _cvimage_to_pixbuf(self._image_cv)
 
@@ -0,0 +1,155 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Logging that stays off the loop's critical path.
+
+configure() sets up logging from the configuration and, if logging_queue is
+enabled, moves the root handlers behind a queue: the loop only puts records
+on the queue, and a background thread formats and writes them. Records
+are dropped, and counted, rather than block when the queue is full.
+
+RateLimitedLog is for messages logged every pass of the loop.
+'''
+
+import logging
+import logging.config
+import threading
+
+from mousetrap.compat import queue, timer
+
+
+_listener = None
+
+
+def configure(config):
+    '''Configure logging from config's logging and logging_queue.'''
+    logging.config.dictConfig(config['logging'])
+    queue_config = config.get('logging_queue') or {}
+    if queue_config.get('enabled'):
+        start_queue(queue_config.get('size', 1000))
+
+
+def start_queue(size):
+    '''Route the root logger's records through a queue of size records.'''
+    global _listener
+    stop_queue()
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    records = queue.Queue(maxsize=size)
+    _listener = QueueListener(records, handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(records))
+    _listener.start()
+
+
+def stop_queue():
+    '''Write out queued records and restore the root handlers.'''
+    global _listener
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    dropped = 0
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler):
+            dropped += handler.dropped
+            root.removeHandler(handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    _listener = None
+    if dropped:
+        root.warning("%d log records were dropped: queue full", dropped)
+
+
+class QueueHandler(logging.Handler):
+    '''Puts records on a queue without blocking. Counts dropped records.'''
+
+    def __init__(self, records):
+        super(QueueHandler, self).__init__()
+        self._records = records
+        self.dropped = 0
+
+    def emit(self, record):
+        # Merge the arguments now: they may change before the listener
+        # formats the record. Exception text is formatted here for the
+        # same reason.
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(
+                    record.exc_info)
+                record.exc_info = None
+            self._records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    '''Hands records from a queue to handlers on a background thread.'''
+
+    _STOP = object()
+
+    def __init__(self, records, handlers):
+        self._records = records
+        self.handlers = handlers
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name='mousetrap-logging')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._records.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            record = self._records.get()
+            if record is self._STOP:
+                return
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+
+class RateLimitedLog(object):
+    '''
+    Logs each message at most once per interval seconds. The next message
+    let through says how many were held back. Does no work at all when the
+    level is disabled.
+    '''
+
+    def __init__(self, logger, interval=1.0):
+        self._logger = logger
+        self._interval = interval
+        self._last = {}
+        self._suppressed = {}
+
+    def debug(self, message, *args):
+        self.log(logging.DEBUG, message, *args)
+
+    def log(self, level, message, *args):
+        if not self._logger.isEnabledFor(level):
+            return
+
+        now = timer()
+        last = self._last.get(message)
+        if last is not None and now - last < self._interval:
+            self._suppressed[message] = self._suppressed.get(message, 0) + 1
+            return
+
+        self._last[message] = now
+        suppressed = self._suppressed.pop(message, 0)
+        if suppressed:
+            self._logger.log(
+                level, message + ' (and %d more)', *(args + (suppressed,)))
+        else:
+            self._logger.log(level, message, *args)
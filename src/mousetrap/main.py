@@ -10,14 +10,19 @@ Where it all begins.
 from argparse import ArgumentParser
 from io import open
 import logging
-import logging.config
 from os.path import dirname, expanduser, exists
+import os
 import signal
 import sys
+import threading
+import time
 import yaml
 
 from mousetrap.config import Config
 from mousetrap.core import App
+from mousetrap import log
+from mousetrap.profiler import SamplingProfiler
+from mousetrap.trace import Tracer, get_tracer, set_tracer
 
 
 class Main(object):
@@ -27,6 +32,7 @@ class Main(object):
     def __init__(self):
         try:
             self._app = None
+            self._profiler = None
             self._args = CommandLineArguments()
             self._handle_dump_annotated()
             self._config = Config().load(self._get_config_paths())
@@ -62,15 +68,64 @@ class Main(object):
         print(yaml.dump(dict(self._config), default_flow_style=False))
 
     def _configure_logging(self):
-        logging.config.dictConfig(self._config['logging'])
+        log.configure(self._config)
         logger = logging.getLogger('mousetrap.main')
-        logger.debug(yaml.dump(dict(self._config), default_flow_style=False))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                yaml.dump(dict(self._config), default_flow_style=False))
 
     def run(self):
-        self._app = App(self._config)
-        signal.signal(signal.SIGTERM, self._stop_signal_handler)
-        signal.signal(signal.SIGINT, self._stop_signal_handler)
-        self._app.run()
+        self._start_tracing()
+        try:
+            self._app = App(self._config)
+            signal.signal(signal.SIGTERM, self._stop_signal_handler)
+            signal.signal(signal.SIGINT, self._stop_signal_handler)
+            signal.signal(signal.SIGUSR1, self._profile_signal_handler)
+            if self._args.profile is not None:
+                self._start_profiling()
+            self._app.run()
+        finally:
+            self._stop_profiling()
+            self._stop_tracing()
+            log.stop_queue()
+
+    def _profile_signal_handler(self, signal_number, stack_frame):
+        self._start_profiling()
+
+    def _start_profiling(self):
+        '''
+        Profile the main thread for --profile-seconds, then write the results
+        in the background. Does nothing if a profile is being taken.
+        '''
+        if self._profiler is not None and self._profiler.is_running():
+            return
+        self._profiler = SamplingProfiler(
+            threading.current_thread().ident,
+            interval=self._args.profile_interval / 1000.0,
+        )
+        self._profiler.start(
+            duration=self._args.profile_seconds,
+            output_prefix=self._get_profile_prefix(),
+        )
+
+    def _stop_profiling(self):
+        if self._profiler is not None and self._profiler.is_running():
+            self._profiler.stop()
+
+    def _get_profile_prefix(self):
+        prefix = self._args.profile
+        if prefix is None:
+            prefix = expanduser('~/mousetrap-profile-%d' % os.getpid())
+        return '%s-%s' % (prefix, time.strftime('%Y%m%d-%H%M%S'))
+
+    def _start_tracing(self):
+        if self._args.trace is not None:
+            set_tracer(Tracer(self._args.trace))
+
+    def _stop_tracing(self):
+        if self._args.trace is not None:
+            get_tracer().close()
+            set_tracer(None)
 
     def _stop_signal_handler(self, signal_number, stack_frame):
         self._app.stop()
@@ -96,6 +151,37 @@ class CommandLineArguments(object):
             ),
             action="store_true"
         )
+        parser.add_argument(
+            "--trace",
+            metavar="FILE",
+            help=(
+                "Writes a per-frame trace to FILE in Chrome trace-event "
+                "format."
+            )
+        )
+        parser.add_argument(
+            "--profile",
+            metavar="PREFIX",
+            help=(
+                "Profiles the main loop from launch for --profile-seconds and "
+                "writes PREFIX-<time>.pstats and PREFIX-<time>.collapsed. "
+                "Sending SIGUSR1 takes another profile at any time."
+            )
+        )
+        parser.add_argument(
+            "--profile-seconds",
+            metavar="SECONDS",
+            type=float,
+            default=30.0,
+            help="Length of each profile. Default: 30."
+        )
+        parser.add_argument(
+            "--profile-interval",
+            metavar="MILLISECONDS",
+            type=float,
+            default=5.0,
+            help="Time between profile samples. Default: 5."
+        )
         parser.parse_args(namespace=self)
 
 
@@ -11,4 +11,5 @@ class CameraPlugin(interface.Plugin):
         self._config = config
 
     def run(self, app):
+        # None while the camera reconnects; later plugins skip the pass.
         app.image = app.camera.read_image()
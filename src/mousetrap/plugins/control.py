@@ -0,0 +1,30 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Lets mousetrap-control query and tune this instance while it runs.
+'''
+
+import atexit
+
+from mousetrap.i18n import _
+import logging
+LOGGER = logging.getLogger(__name__)
+
+import mousetrap.plugins.interface as interface
+from mousetrap.control import ControlServer, execute, get_default_socket_path
+
+
+class ControlPlugin(interface.Plugin):
+    '''Executes the requests received by a ControlServer on each pass.'''
+
+    def __init__(self, config):
+        path = config[self].get('path') or get_default_socket_path()
+        self._server = ControlServer(path)
+        atexit.register(self._server.close)
+        LOGGER.info(_('Listening for control requests on %s'), path)
+
+    def run(self, app):
+        for request in self._server.get_pending():
+            request.respond(execute(app, request.request))
@@ -12,4 +12,7 @@ class DisplayPlugin(interface.Plugin):
         self._window_title = config[self]['window_title']
 
     def run(self, app):
+        if app.image is None:
+            return
+
         app.gui.show_image(self._window_title, app.image)
@@ -7,19 +7,30 @@ from mousetrap.i18n import _
 import logging
 LOGGER = logging.getLogger(__name__)
 
+from mousetrap.log import RateLimitedLog
+PASS_LOG = RateLimitedLog(LOGGER)
+
+
+import cv2
+import numpy
 
 import mousetrap.plugins.interface as interface
-from mousetrap.vision import FeatureDetector, FeatureNotFoundException
+from mousetrap.vision import FeatureDetector
 
 
 class EyesPlugin(interface.Plugin):
     def __init__(self, config):
         self._config = config
         self._motion_detector = MotionDetector(config)
-        self._closed_detector = ClosedDetector(config)
+        self._closed_detector = CLOSED_DETECTORS[
+            config[self]['closed_detector']
+        ](config)
 
     def run(self, app):
-        self._motion_detector.update(app.pointer)
+        if app.image is None:
+            return
+
+        self._motion_detector.update(app.pointer, app.image.timestamp)
         self._closed_detector.update(app.image)
 
         if self._motion_detector.is_stationary() and \
@@ -31,11 +42,10 @@ class EyesPlugin(interface.Plugin):
 class MotionDetector(object):
     def __init__(self, config):
         self._config = config
-        self._max_samples = config[self]['max_samples']
-        self._history = History(config, self._max_samples)
+        self._history = TimeWindow(config, config[self]['window'])
 
-    def update(self, pointer):
-        self._history.append(pointer.get_position())
+    def update(self, pointer, timestamp):
+        self._history.append(timestamp, pointer.get_position())
 
     def is_stationary(self):
         last_point = self._history[-1]
@@ -45,86 +55,237 @@ class MotionDetector(object):
 class ClosedDetector(object):
     def __init__(self, config):
         self._config = config
-        self._max_samples = config[self]['max_samples']
+        self._window = config[self]['window']
         self._min_fraction_to_be_closed = config[self][
             'min_fraction_to_be_closed'
         ]
-        self._min_misses_to_be_closed = int(
-            self._min_fraction_to_be_closed * self._max_samples)
+        self._min_seconds_closed = \
+            self._min_fraction_to_be_closed * self._window
         self._left_locator = LeftEyeLocator(config)
-        self._detection_history = History(config, self._max_samples)
+        self._detection_history = TimeWindow(config, self._window)
 
     def update(self, image):
-        self._detection_history.append(self._left_locator.locate(image))
+        self._detection_history.append(
+            image.timestamp, self._left_locator.locate(image))
 
     def is_closed(self):
-        misses = self._detection_history.count(False)
-        return misses > self._min_misses_to_be_closed
+        closed = self._detection_history.get_seconds(False)
+        return closed > self._min_seconds_closed
 
     def reset(self):
         self._detection_history.clear()
 
 
+class TemplateClosedDetector(object):
+    '''
+    Decides open or closed like ClosedDetector, but runs the cascades only
+    to (re)acquire the left eye. Once the eye is found open, its patch
+    becomes the open-eye template. Later frames are compared with the
+    template by normalized cross-correlation, around where the eye was
+    last seen. The cascades run again after reacquire_every frames,
+    or after reacquire_after_misses frames in a row that do not match.
+    '''
+
+    def __init__(self, config):
+        self._config = config
+        plugin_config = config[self]
+        self._window = plugin_config['window']
+        self._min_seconds_closed = \
+            plugin_config['min_fraction_to_be_closed'] * self._window
+        self._open_threshold = plugin_config['open_threshold']
+        self._reacquire_every = plugin_config['reacquire_every']
+        self._reacquire_after_misses = plugin_config['reacquire_after_misses']
+        self._search_margin = plugin_config['search_margin']
+        self._template_update = plugin_config['template_update']
+        self._left_locator = LeftEyeLocator(config)
+        self._detection_history = TimeWindow(config, self._window)
+        self._template = None
+        self._eye = None
+        self._frames_since_acquire = 0
+        self._misses = 0
+
+    def update(self, image):
+        if self._needs_acquire():
+            is_open = self._acquire(image)
+        else:
+            is_open = self._match(image.to_cv_grayscale())
+        self._detection_history.append(image.timestamp, is_open)
+
+    def is_closed(self):
+        closed = self._detection_history.get_seconds(False)
+        return closed > self._min_seconds_closed
+
+    def reset(self):
+        self._detection_history.clear()
+
+    def get_eye(self):
+        '''(x, y, width, height) of the tracked eye, or None.'''
+        return self._eye
+
+    def _needs_acquire(self):
+        return self._template is None or \
+            self._frames_since_acquire >= self._reacquire_every or \
+            self._misses >= self._reacquire_after_misses
+
+    def _acquire(self, image):
+        self._frames_since_acquire = 0
+        self._misses = 0
+        eye, is_open = self._left_locator.find_left_eye(image)
+
+        if eye is None:
+            self._template = None
+            self._eye = None
+        elif is_open:
+            x, y, width, height = eye
+            self._template = image.to_cv_grayscale()[
+                y:y + height, x:x + width].astype(numpy.float32)
+            self._eye = eye
+
+        return is_open
+
+    def _match(self, image_cv_grayscale):
+        self._frames_since_acquire += 1
+        x, y, width, height = self._eye
+        margin_x = int(width * self._search_margin)
+        margin_y = int(height * self._search_margin)
+        image_height, image_width = image_cv_grayscale.shape[:2]
+        from_x = max(0, x - margin_x)
+        from_y = max(0, y - margin_y)
+        to_x = min(image_width, x + width + margin_x)
+        to_y = min(image_height, y + height + margin_y)
+
+        if to_x - from_x < width or to_y - from_y < height:
+            self._misses = self._reacquire_after_misses
+            return True
+
+        window = image_cv_grayscale[from_y:to_y, from_x:to_x]
+        scores = cv2.matchTemplate(
+            window.astype(numpy.float32), self._template,
+            cv2.TM_CCOEFF_NORMED)
+        _min_score, score, _min_location, location = cv2.minMaxLoc(scores)
+        PASS_LOG.debug("Open eye template score: %.2f", score)
+
+        if score < self._open_threshold:
+            self._misses += 1
+            return False
+
+        self._misses = 0
+        self._eye = (from_x + location[0], from_y + location[1], width, height)
+        self._update_template(window, location)
+
+        return True
+
+    def _update_template(self, window, location):
+        x, y = location
+        height, width = self._template.shape
+        cv2.accumulateWeighted(
+            window[y:y + height, x:x + width].astype(numpy.float32),
+            self._template,
+            self._template_update,
+        )
+
+
+CLOSED_DETECTORS = {
+    'cascade': ClosedDetector,
+    'template': TemplateClosedDetector,
+}
+
+
+S_FOUND_FACE = _("Found the face")
+S_FOUND_LEFT_EYE = _("Found the left eye at %s")
+S_FOUND_OPEN_EYE = _("Found an open eye at %s")
+
+
 class LeftEyeLocator(object):
 
     def __init__(self, config):
         self._config = config
-        self._face_detector = FeatureDetector.get_detector(
-            config,
-            "face",
-            scale_factor=config[self]['face_detector']['scale_factor'],
-            min_neighbors=config[self]['face_detector']['min_neighbors'],
+        self._face_detector = FeatureDetector.from_config(
+            config, "face", config[self]['face_detector']
         )
-        self._open_eye_detector = FeatureDetector.get_detector(
-            config,
-            "open_eye",
-            scale_factor=config[self]['open_eye_detector']['scale_factor'],
-            min_neighbors=config[self]['open_eye_detector']['min_neighbors'],
+        self._open_eye_detector = FeatureDetector.from_config(
+            config, "open_eye", config[self]['open_eye_detector']
         )
-        self._left_eye_detector = FeatureDetector.get_detector(
-            config,
-            "left_eye",
-            scale_factor=config[self]['left_eye_detector']['scale_factor'],
-            min_neighbors=config[self]['left_eye_detector']['min_neighbors'],
+        self._left_eye_detector = FeatureDetector.from_config(
+            config, "left_eye", config[self]['left_eye_detector']
         )
 
     def locate(self, image):
-        face = None
+        '''
+        Return False if the left eye is found and it is not open, otherwise
+        True.
+        '''
+        return self.find_left_eye(image)[1]
 
-        try:
-            face = self._face_detector.detect(image)
+    def find_left_eye(self, image):
+        '''
+        Return (eye, open): eye is (x, y, width, height) of the left eye in
+        image, or None if the face or the left eye is not found; open is as
+        for locate.
+        '''
+        face = self._face_detector.find(image)
+        left_eye = self._find_left_eye(face)
+        if left_eye is None:
+            # The face may be reused from an earlier frame and have moved.
+            face = self._face_detector.refresh(image)
+            left_eye = self._find_left_eye(face)
+        if left_eye is None:
+            return None, True
 
-            LOGGER.debug(_("Found the face"))
-        except FeatureNotFoundException:
-            return True
+        PASS_LOG.debug(S_FOUND_LEFT_EYE, left_eye)
 
-        try:
-            left_eye = self._left_eye_detector.detect(face["image"])
+        eye = (
+            face.x + left_eye.x, face.y + left_eye.y,
+            left_eye.width, left_eye.height,
+        )
 
-            LOGGER.debug(_("Found the left eye at %s"), left_eye)
-        except FeatureNotFoundException:
-            return True
+        open_eye = self._open_eye_detector.find(face.image)
+        if open_eye is None:
+            return eye, False
 
-        try:
-            open_eye = self._open_eye_detector.detect(face["image"])
+        PASS_LOG.debug(S_FOUND_OPEN_EYE, open_eye)
 
-            LOGGER.debug(_("Found an open eye at %s"), open_eye)
+        return eye, True
 
-            return True
-        except FeatureNotFoundException:
-            return False
+    def _find_left_eye(self, face):
+        if face is None:
+            return None
 
+        PASS_LOG.debug(S_FOUND_FACE)
 
-class History(list):
-    def __init__(self, config, max_length):
-        super(History, self).__init__()
+        return self._left_eye_detector.find(face.image)
+
+
+class TimeWindow(list):
+    '''
+    The values seen in the last seconds seconds, by frame timestamp, so
+    decisions over the window do not depend on the loop rate.
+    '''
+
+    def __init__(self, config, seconds):
+        super(TimeWindow, self).__init__()
         self._config = config
-        self._max_length = max_length
+        self._seconds = seconds
+        self._timestamps = []
 
-    def append(self, value):
-        super(History, self).append(value)
-        while len(self) > self._max_length:
+    def append(self, timestamp, value):
+        super(TimeWindow, self).append(value)
+        self._timestamps.append(timestamp)
+        while self._timestamps[0] < timestamp - self._seconds:
             del self[0]
+            del self._timestamps[0]
+
+    def get_seconds(self, value):
+        '''
+        Seconds in the window during which value was seen, taking each
+        value to hold from the frame before it until its own frame.
+        '''
+        return sum(
+            self._timestamps[index] - self._timestamps[index - 1]
+            for index in range(1, len(self))
+            if self[index] == value
+        )
 
     def clear(self):
         del self[:]
+        del self._timestamps[:]
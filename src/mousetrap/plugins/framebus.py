@@ -0,0 +1,60 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Publishes each frame and what was found in it to a shared-memory frame bus.
+See mousetrap.framebus for reading it from another process.
+'''
+
+import atexit
+
+from mousetrap.i18n import _
+import logging
+LOGGER = logging.getLogger(__name__)
+
+import mousetrap.plugins.interface as interface
+from mousetrap.framebus import FrameBusWriter, get_default_path
+
+
+class FrameBusPlugin(interface.Plugin):
+    '''
+    Place it after the plugins that detect and move the pointer, and before
+    FeatureDetectorClearCachePlugin, which forgets the detections.
+    '''
+
+    def __init__(self, config):
+        plugin_config = config[self]
+        path = plugin_config.get('path') or get_default_path()
+        self._grayscale = plugin_config['grayscale']
+        self._writer = FrameBusWriter(
+            path,
+            slot_count=plugin_config['slots'],
+            max_width=plugin_config['max_width'],
+            max_height=plugin_config['max_height'],
+            max_channels=1 if self._grayscale else 3,
+            metadata_size=plugin_config['metadata_size'],
+        )
+        self._warned = False
+        atexit.register(self._writer.close)
+        LOGGER.info(_('Publishing frames to %s'), path)
+
+    def run(self, app):
+        if app.image is None:
+            return
+
+        if self._grayscale:
+            image_cv = app.image.to_cv_grayscale()
+        else:
+            image_cv = app.image.to_cv()
+
+        sequence = self._writer.publish(app.image.timestamp, image_cv, {
+            'detections': app.session.get_detections(app.image),
+            'pointer': list(app.pointer.get_position()),
+        })
+
+        if sequence is None and not self._warned:
+            self._warned = True
+            LOGGER.warning(
+                _('Frame of %s is larger than the frame bus allows'),
+                image_cv.shape)
@@ -0,0 +1,226 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Keeps MouseTrap's use of the CPU within bounds.
+'''
+
+import os
+
+import cv2
+
+from mousetrap.i18n import _
+import logging
+LOGGER = logging.getLogger(__name__)
+
+from mousetrap.compat import timer
+import mousetrap.plugins.interface as interface
+
+
+class GovernorPlugin(interface.Plugin):
+    '''
+    On start, sets OpenCV's thread count and optimizations and pins the
+    process to chosen cores. Then, if cpu_percent is set, measures the
+    process's CPU time and, while over budget, caps the loop rate a step at
+    a time down to min_loops_per_second and then switches the camera to
+    reduced_camera dimensions. It steps back up while well under budget.
+    '''
+
+    def __init__(self, config):
+        plugin_config = config[self]
+        self._process_settings = apply_process_settings(plugin_config)
+        LOGGER.info(_('Process settings: %s'), self._process_settings)
+        self._levels = build_levels(
+            config['loops_per_second'],
+            plugin_config['rate_step'],
+            plugin_config['min_loops_per_second'],
+            plugin_config.get('reduced_camera'),
+        )
+        self._budget = None
+        if plugin_config.get('cpu_percent'):
+            self._budget = CpuBudget(
+                plugin_config['cpu_percent'],
+                plugin_config['check_every'],
+                plugin_config['recover_below'],
+                len(self._levels) - 1,
+            )
+        self._level = 0
+        self._reduced_camera = plugin_config.get('reduced_camera')
+
+    def run(self, app):
+        if self._budget is None:
+            return
+
+        level = self._budget.update(timer(), get_process_cpu_seconds())
+        if level != self._level:
+            self._switch(app, level)
+
+    def get_report(self):
+        '''What the governor has set and measured.'''
+        report = dict(self._process_settings)
+        max_loops_per_second, reduced_camera = self._levels[self._level]
+        report.update({
+            'level': self._level,
+            'max_loops_per_second': max_loops_per_second,
+            'reduced_camera': reduced_camera,
+            'cpu_percent': None,
+        })
+        if self._budget is not None:
+            report['cpu_percent'] = self._budget.get_cpu_percent()
+        return report
+
+    def _switch(self, app, level):
+        max_loops_per_second, reduced_camera = self._levels[level]
+        was_reduced_camera = self._levels[self._level][1]
+        LOGGER.info(
+            _('CPU %.0f%% (budget %s%%): level %d, loop rate cap %s, '
+              'reduced camera %s'),
+            self._budget.get_cpu_percent(),
+            self._budget.get_target(),
+            level,
+            max_loops_per_second,
+            reduced_camera,
+        )
+
+        app.loop.set_max_loops_per_second(max_loops_per_second)
+
+        if reduced_camera and not was_reduced_camera:
+            app.camera.reduce_dimensions(
+                self,
+                self._reduced_camera['width'],
+                self._reduced_camera['height'],
+            )
+        elif was_reduced_camera and not reduced_camera:
+            app.camera.restore_dimensions(self)
+
+        self._level = level
+
+
+def build_levels(loops_per_second, rate_step, min_loops_per_second,
+                 reduced_camera=None):
+    '''
+    Return the governor's levels, from no restriction to the most: a list
+    of (max_loops_per_second or None, reduced_camera).
+    '''
+    levels = [(None, False)]
+    rate = loops_per_second
+    while rate > min_loops_per_second:
+        rate = max(min_loops_per_second, rate * rate_step)
+        levels.append((rate, False))
+    if reduced_camera:
+        levels.append((levels[-1][0], True))
+    return levels
+
+
+class CpuBudget(object):
+    '''
+    Chooses a level from the CPU use measured over each check_every
+    seconds: one up while over target percent (of one core), one down while
+    under recover_below times the target.
+    '''
+
+    PERCENT = 100.0
+
+    def __init__(self, target, check_every, recover_below, max_level):
+        self._target = target
+        self._check_every = check_every
+        self._recover_below = recover_below
+        self._max_level = max_level
+        self._level = 0
+        self._cpu_percent = None
+        self._window_begin = None
+        self._window_cpu_seconds = None
+
+    def get_target(self):
+        return self._target
+
+    def get_cpu_percent(self):
+        '''CPU use over the last complete window, or None.'''
+        return self._cpu_percent
+
+    def update(self, now, cpu_seconds):
+        '''
+        now - wall clock seconds.
+
+        cpu_seconds - CPU seconds used by the process so far.
+        '''
+        if self._window_begin is None:
+            self._window_begin = now
+            self._window_cpu_seconds = cpu_seconds
+            return self._level
+
+        elapsed = now - self._window_begin
+        if elapsed < self._check_every:
+            return self._level
+
+        self._cpu_percent = self.PERCENT * \
+            (cpu_seconds - self._window_cpu_seconds) / elapsed
+        self._window_begin = now
+        self._window_cpu_seconds = cpu_seconds
+
+        if self._cpu_percent > self._target:
+            self._level = min(self._max_level, self._level + 1)
+        elif self._cpu_percent < self._target * self._recover_below:
+            self._level = max(0, self._level - 1)
+
+        return self._level
+
+
+def get_process_cpu_seconds():
+    times = os.times()
+    return times[0] + times[1]
+
+
+def apply_process_settings(plugin_config):
+    '''
+    Apply opencv_threads, opencv_optimized and cpu_affinity from
+    plugin_config, where set. Return the resulting settings.
+    '''
+    threads = plugin_config.get('opencv_threads')
+    if threads is not None:
+        cv2.setNumThreads(threads)
+
+    optimized = plugin_config.get('opencv_optimized')
+    if optimized is not None:
+        cv2.setUseOptimized(optimized)
+
+    cores = plugin_config.get('cpu_affinity')
+    if cores:
+        set_cpu_affinity(cores)
+
+    return {
+        'opencv_threads': cv2.getNumThreads(),
+        'opencv_optimized': cv2.useOptimized(),
+        'cpu_affinity': get_cpu_affinity(),
+    }
+
+
+def set_cpu_affinity(cores):
+    '''
+    Pin every thread of the process to cores. Threads started later
+    inherit the affinity of the thread starting them.
+    '''
+    if not hasattr(os, 'sched_setaffinity'):
+        LOGGER.warning(_('CPU affinity is not supported here'))
+        return
+
+    task_directory = '/proc/self/task'
+    if os.path.isdir(task_directory):
+        thread_ids = [int(name) for name in os.listdir(task_directory)]
+    else:
+        thread_ids = [0]
+
+    for thread_id in thread_ids:
+        try:
+            os.sched_setaffinity(thread_id, cores)
+        except OSError as error:
+            LOGGER.warning(
+                _('Could not pin thread %d to %s: %s'),
+                thread_id, cores, error)
+
+
+def get_cpu_affinity():
+    if not hasattr(os, 'sched_getaffinity'):
+        return None
+    return sorted(os.sched_getaffinity(0))
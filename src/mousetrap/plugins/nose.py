@@ -3,6 +3,7 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import division
 
+from mousetrap.i18n import _
 import mousetrap.plugins.interface as interface
 from mousetrap.vision import FeatureDetector, FeatureNotFoundException
 from mousetrap.gui import Gui
@@ -18,12 +19,11 @@ class NosePlugin(interface.Plugin):
 
     def update_image(self, image):
         self._image = image
-        try:
-            point_image = self._nose_locator.locate(image)
-            point_screen = self._convert_image_to_screen_point(*point_image)
-            self._location = point_screen
-        except FeatureNotFoundException:
+        point_image = self._nose_locator.find(image)
+        if point_image is None:
             self._location = None
+        else:
+            self._location = self._convert_image_to_screen_point(*point_image)
 
     def _convert_image_to_screen_point(self, image_x, image_y):
         image_width = self._image.get_width()
@@ -41,26 +41,48 @@ class NosePlugin(interface.Plugin):
 
 
 class NoseJoystickPlugin(interface.Plugin):
+    '''
+    Moves the pointer like a joystick: at a velocity proportional to how
+    far the nose is from where it was first seen. The pointer moves by the
+    velocity times the time between frames, so its speed does not depend
+    on the loop rate.
+    '''
 
     def __init__(self, config):
         self._config = config
         self._threshold = config[self]['threshold']
+        self._speed = config[self]['speed']
+        self._max_step = config[self]['max_step']
         self._nose_locator = NoseLocator(config)
         self._initial_image_location = (0, 0)
         self._last_delta = (0, 0)
+        self._last_timestamp = None
+        self._elapsed = 0.0
 
     def run(self, app):
+        if app.image is None:
+            app.pointer.set_position(None)
+            return
+
         self._app = app
-        location = None
-        try:
-            point_image = self._nose_locator.locate(app.image)
-            point_screen = self._convert_image_to_screen_point(*point_image)
-            location = point_screen
-        except FeatureNotFoundException:
+        self._update_elapsed(app.image.timestamp)
+        point_image = self._nose_locator.find(app.image)
+        if point_image is None:
             location = app.pointer.get_position()
             location = self._apply_delta_to_point(location, self._last_delta)
+        else:
+            location = self._convert_image_to_screen_point(*point_image)
         app.pointer.set_position(location)
 
+    def _update_elapsed(self, timestamp):
+        # Capped so the pointer does not jump after a gap in the frames.
+        if self._last_timestamp is None:
+            self._elapsed = 0.0
+        else:
+            self._elapsed = min(
+                max(timestamp - self._last_timestamp, 0.0), self._max_step)
+        self._last_timestamp = timestamp
+
     def _apply_delta_to_point(self, point, delta):
         delta_x, delta_y = delta
         point_x, point_y = point
@@ -68,8 +90,9 @@ class NoseJoystickPlugin(interface.Plugin):
         if delta_x == 0 and delta_y == 0:
             return None
 
-        point_x += delta_x
-        point_y += delta_y
+        step = self._speed * self._elapsed
+        point_x += int(round(delta_x * step))
+        point_y += int(round(delta_y * step))
 
         return (point_x, point_y)
 
@@ -102,23 +125,37 @@ class NoseJoystickPlugin(interface.Plugin):
 class NoseLocator(object):
     def __init__(self, config):
         self._config = config
-        self._face_detector = FeatureDetector.get_detector(
-            config,
-            'face',
-            scale_factor=config[self]['face_detector']['scale_factor'],
-            min_neighbors=config[self]['face_detector']['min_neighbors'],
+        self._face_detector = FeatureDetector.from_config(
+            config, 'face', config[self]['face_detector']
         )
-        self._nose_detector = FeatureDetector.get_detector(
-            config,
-            'nose',
-            scale_factor=config[self]['nose_detector']['scale_factor'],
-            min_neighbors=config[self]['nose_detector']['min_neighbors'],
+        self._nose_detector = FeatureDetector.from_config(
+            config, 'nose', config[self]['nose_detector']
         )
 
-    def locate(self, image):
-        face = self._face_detector.detect(image)
-        nose = self._nose_detector.detect(face['image'])
+    def find(self, image):
+        '''Return the (x, y) of the nose in image, or None.'''
+        face = self._face_detector.find(image)
+        nose = self._find_nose(face)
+        if nose is None:
+            # The face may be reused from an earlier frame and have moved.
+            face = self._face_detector.refresh(image)
+            nose = self._find_nose(face)
+        if nose is None:
+            return None
         return (
-            face['x'] + nose['center']['x'],
-            face['y'] + nose['center']['y'],
+            face.x + nose.center_x,
+            face.y + nose.center_y,
         )
+
+    def _find_nose(self, face):
+        if face is None:
+            return None
+        return self._nose_detector.find(face.image)
+
+    def locate(self, image):
+        '''As find, but raises FeatureNotFoundException for None.'''
+        point = self.find(image)
+        if point is None:
+            raise FeatureNotFoundException(_('Feature not detected: %s') % (
+                'nose'))
+        return point
@@ -0,0 +1,143 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Adapts the loop rate to what the user is doing.
+'''
+
+from mousetrap.i18n import _
+import logging
+LOGGER = logging.getLogger(__name__)
+
+from mousetrap.compat import timer
+import mousetrap.plugins.interface as interface
+
+
+MODE_IDLE = 'idle'
+MODE_REDUCED = 'reduced'
+MODE_NORMAL = 'normal'
+MODE_BOOST = 'boost'
+
+
+class PowerModePlugin(interface.Plugin):
+    '''
+    Switches between power modes:
+
+        idle - no face seen for a while. Lowest rate, optionally a smaller
+               camera image.
+        reduced - face present but the pointer has been still for a while.
+        normal - the loop's base rate: loops_per_second, unless changed
+                 over the control socket. The other modes' rates scale
+                 with it.
+        boost - the pointer is moving.
+
+    Place it after the plugins that detect the face and move the pointer.
+    '''
+
+    def __init__(self, config):
+        plugin_config = config[self]
+        normal_rate = config['loops_per_second']
+        self._scales = {
+            MODE_IDLE: plugin_config['idle_loops_per_second'] or normal_rate,
+            MODE_REDUCED:
+                plugin_config['reduced_loops_per_second'] or normal_rate,
+            MODE_NORMAL: normal_rate,
+            MODE_BOOST: plugin_config['boost_loops_per_second'] or normal_rate,
+        }
+        for mode in self._scales:
+            self._scales[mode] /= normal_rate
+        self._idle_camera = plugin_config.get('idle_camera')
+        self._selector = ModeSelector(plugin_config)
+        self._mode = MODE_NORMAL
+
+    def run(self, app):
+        mode = self._selector.update(
+            timer(),
+            app.session.is_detected('face'),
+            app.pointer.is_moving(),
+        )
+
+        if mode != self._mode:
+            self._switch(app, mode)
+
+    def get_mode(self):
+        return self._mode
+
+    def _switch(self, app, mode):
+        LOGGER.info(_('Power mode: %s'), mode)
+
+        if self._idle_camera:
+            if mode == MODE_IDLE:
+                app.camera.reduce_dimensions(
+                    self,
+                    self._idle_camera['width'],
+                    self._idle_camera['height'],
+                )
+            elif self._mode == MODE_IDLE:
+                app.camera.restore_dimensions(self)
+
+        app.loop.set_loops_per_second(
+            app.loop.get_base_loops_per_second() * self._scales[mode])
+        self._mode = mode
+
+
+class ModeSelector(object):
+    '''
+    Chooses a power mode from whether a face is seen and whether the pointer
+    moves. Hysteresis keeps the mode from flickering:
+
+        - leaving idle takes wake_after consecutive face detections.
+        - boost lasts boost_hold seconds after the pointer stops.
+    '''
+
+    def __init__(self, plugin_config):
+        self._idle_after = plugin_config['idle_after']
+        self._reduce_after = plugin_config['reduce_after']
+        self._boost_hold = plugin_config['boost_hold']
+        self._wake_after = plugin_config['wake_after']
+        self._mode = MODE_NORMAL
+        self._last_face_time = None
+        self._last_motion_time = None
+        self._face_streak = 0
+
+    def update(self, now, face_seen, moving):
+        '''Return the mode for now.'''
+        if self._last_face_time is None:
+            self._last_face_time = now
+            self._last_motion_time = now
+
+        if face_seen:
+            self._face_streak += 1
+            self._last_face_time = now
+        else:
+            self._face_streak = 0
+
+        if moving:
+            self._last_motion_time = now
+
+        if self._mode == MODE_IDLE:
+            if self._face_streak < self._wake_after:
+                return self._mode
+            self._last_motion_time = now
+        elif now - self._last_face_time >= self._idle_after:
+            self._mode = MODE_IDLE
+            return self._mode
+
+        self._mode = self._select_active_mode(now, moving)
+
+        return self._mode
+
+    def _select_active_mode(self, now, moving):
+        still_for = now - self._last_motion_time
+
+        if moving:
+            return MODE_BOOST
+
+        if self._mode == MODE_BOOST and still_for < self._boost_hold:
+            return MODE_BOOST
+
+        if still_for >= self._reduce_after:
+            return MODE_REDUCED
+
+        return MODE_NORMAL
@@ -0,0 +1,79 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Records the session: each camera frame, what the detectors found in it and
+what the pointer did. See mousetrap.recording for the file format.
+'''
+
+import atexit
+import os
+import time
+
+from mousetrap.i18n import _
+import logging
+LOGGER = logging.getLogger(__name__)
+
+import mousetrap.plugins.interface as interface
+from mousetrap.recording import RecordingWriter
+
+
+class RecorderPlugin(interface.Plugin):
+    '''
+    Hands each pass's frame, detections and pointer actions to a
+    RecordingWriter, which encodes and writes them on its own thread.
+
+    Place it after the plugins that detect and move the pointer, and before
+    FeatureDetectorClearCachePlugin, which forgets the detections.
+    '''
+
+    def __init__(self, config):
+        plugin_config = config[self]
+        self._path = os.path.expanduser(
+            time.strftime(plugin_config['path']))
+        self._grayscale = plugin_config['grayscale']
+        self._writer = RecordingWriter(
+            self._path,
+            encoding=plugin_config['encoding'],
+            jpeg_quality=plugin_config['jpeg_quality'],
+            queue_size=plugin_config['queue_size'],
+        )
+        self._sequence = 0
+        self._click_count = 0
+        atexit.register(self.close)
+        LOGGER.info(_('Recording to %s'), self._path)
+
+    def run(self, app):
+        if app.image is None:
+            return
+
+        timestamp = app.image.timestamp
+        if self._grayscale:
+            image_cv = app.image.to_cv_grayscale()
+        else:
+            image_cv = app.image.to_cv()
+
+        self._writer.put_frame(self._sequence, timestamp, image_cv)
+        self._writer.put_detections(
+            self._sequence, timestamp, app.session.get_detections(app.image))
+        self._writer.put_pointer(
+            self._sequence, timestamp, self._describe_pointer(app.pointer))
+        self._sequence += 1
+
+    def _describe_pointer(self, pointer):
+        click_count = pointer.get_click_count()
+        clicks = click_count - self._click_count
+        self._click_count = click_count
+        return {
+            'position': list(pointer.get_position()),
+            'moving': pointer.is_moving(),
+            'clicks': clicks,
+        }
+
+    def get_path(self):
+        return self._path
+
+    def close(self):
+        '''Finish the recording. Called at exit.'''
+        self._writer.close()
@@ -0,0 +1,159 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+A sampling profiler for the main loop.
+
+A background thread periodically records the stack of the profiled thread.
+Time spent inside C calls, such as OpenCV's detectMultiScale, is counted
+against the Python function making the call. Results are written as pstats
+(for pstats, snakeviz, ...) and as collapsed stacks (for flamegraph.pl,
+speedscope, ...).
+'''
+
+from io import open
+import pstats
+import sys
+import threading
+import time
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+class SamplingProfiler(object):
+
+    def __init__(self, thread_id, interval=0.005):
+        '''
+        thread_id - ident of the thread to profile.
+
+        interval - seconds between samples.
+        '''
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stacks = {}
+        self._sample_count = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration=None, output_prefix=None):
+        '''
+        Start sampling in the background. If duration (seconds) is given,
+        stop after it and, if output_prefix is given, write the results.
+        '''
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._sample,
+            args=(duration, output_prefix),
+            name='mousetrap-profiler',
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and \
+                self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def get_sample_count(self):
+        return self._sample_count
+
+    def _sample(self, duration, output_prefix):
+        LOGGER.info("Profiling for %s seconds", duration)
+        end = None
+        if duration is not None:
+            end = time.time() + duration
+
+        while not self._stop_event.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                break
+            self._add_sample(frame)
+            if end is not None and time.time() >= end:
+                break
+
+        if output_prefix is not None:
+            self.write(output_prefix)
+
+    def _add_sample(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        stack.reverse()
+        stack = tuple(stack)
+        self._stacks[stack] = self._stacks.get(stack, 0) + 1
+        self._sample_count += 1
+
+    def write(self, output_prefix):
+        '''Write output_prefix.pstats and output_prefix.collapsed.'''
+        stacks = dict(self._stacks)
+        write_collapsed(stacks, output_prefix + '.collapsed')
+        pstats.Stats(_SampledStats(stacks, self._interval)).dump_stats(
+            output_prefix + '.pstats')
+        LOGGER.info(
+            "Wrote %d samples to %s.pstats and %s.collapsed",
+            self._sample_count, output_prefix, output_prefix,
+        )
+
+
+def write_collapsed(stacks, path):
+    '''
+    Write stacks, a dict of stack tuples to sample counts, one line per
+    stack: frames from the root joined by ";", a space and the count.
+    '''
+    with open(path, 'w') as collapsed_file:
+        for stack, count in sorted(stacks.items()):
+            collapsed_file.write('%s %d\n' % (
+                ';'.join(_format_function(function) for function in stack),
+                count,
+            ))
+
+
+def _format_function(function):
+    filename, line, name = function
+    return '%s (%s:%d)' % (name, filename, line)
+
+
+class _SampledStats(object):
+    '''
+    Converts sampled stacks into the structure pstats.Stats expects from a
+    profiler. Call counts are sample counts.
+    '''
+
+    def __init__(self, stacks, interval):
+        self.stats = {}
+        self._stacks = stacks
+        self._interval = interval
+
+    def create_stats(self):
+        for stack, count in self._stacks.items():
+            seconds = count * self._interval
+            for function in set(stack):
+                self._add(function, count, 0.0, seconds)
+            self._add(stack[-1], 0, seconds, 0.0)
+            for caller, callee in set(zip(stack, stack[1:])):
+                self._add_caller(callee, caller, count, seconds)
+
+    def _entry(self, function):
+        if function not in self.stats:
+            self.stats[function] = (0, 0, 0.0, 0.0, {})
+        return self.stats[function]
+
+    def _add(self, function, calls, own_seconds, total_seconds):
+        cc, nc, tt, ct, callers = self._entry(function)
+        self.stats[function] = (
+            cc + calls, nc + calls, tt + own_seconds, ct + total_seconds,
+            callers,
+        )
+
+    def _add_caller(self, function, caller, calls, seconds):
+        callers = self._entry(function)[4]
+        nc, cc, tt, ct = callers.get(caller, (0, 0, 0.0, 0.0))
+        callers[caller] = (nc + calls, cc + calls, tt, ct + seconds)
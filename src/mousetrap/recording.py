@@ -0,0 +1,283 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Session recordings: frames, detections and pointer actions in one file.
+
+A recording is a sequence of records followed by an index:
+
+    header  - MAGIC, format version
+    records - each a RECORD header (kind, payload size, timestamp, frame
+              sequence number) followed by its payload
+    index   - one INDEX_ENTRY per record
+    footer  - offset of the index, INDEX_MAGIC
+
+Frame payloads are a FRAME header and pixels, either raw (so a reader can
+use them straight from the memory-mapped file) or JPEG/PNG encoded. Other
+payloads are JSON. A recording that was not closed has no index; readers
+rebuild it by scanning the records.
+'''
+
+import bisect
+from io import open
+import json
+import mmap
+import struct
+import threading
+
+import cv2
+import numpy
+
+from mousetrap.compat import queue
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+MAGIC = b'MTREC\x00\x00\x00'
+INDEX_MAGIC = b'MTRECIDX'
+VERSION = 1
+
+HEADER = struct.Struct('<8sI4x')
+RECORD = struct.Struct('<4sIdQ')
+FRAME = struct.Struct('<HHBB2x')
+INDEX_ENTRY = struct.Struct('<4sQdQ')
+FOOTER = struct.Struct('<Q8s')
+
+KIND_FRAME = b'FRAM'
+KIND_DETECTIONS = b'DETS'
+KIND_POINTER = b'PNTR'
+
+ENCODING_RAW = 0
+ENCODING_JPEG = 1
+ENCODING_PNG = 2
+ENCODINGS = {
+    'raw': ENCODING_RAW,
+    'jpeg': ENCODING_JPEG,
+    'png': ENCODING_PNG,
+}
+
+
+class RecordingWriter(object):
+    '''
+    Writes a recording from a background thread. The put_* methods never
+    block: when the writer falls behind by queue_size records, new records
+    are dropped and counted.
+    '''
+
+    _STOP = object()
+
+    def __init__(self, path, encoding='raw', jpeg_quality=90,
+                 queue_size=64):
+        self._path = path
+        self._encoding = ENCODINGS[encoding]
+        self._jpeg_quality = jpeg_quality
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._index = []
+        self._dropped = 0
+        self._closed = False
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION))
+        self._thread = threading.Thread(
+            target=self._write_records, name='mousetrap-recorder')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def get_dropped_count(self):
+        return self._dropped
+
+    def put_frame(self, sequence, timestamp, image_cv):
+        '''image_cv - grayscale or BGR image. It must not change later.'''
+        self._put((KIND_FRAME, sequence, timestamp, image_cv))
+
+    def put_detections(self, sequence, timestamp, detections):
+        '''detections - JSON serializable description of detections.'''
+        self._put((KIND_DETECTIONS, sequence, timestamp, detections))
+
+    def put_pointer(self, sequence, timestamp, pointer):
+        '''pointer - JSON serializable description of pointer actions.'''
+        self._put((KIND_POINTER, sequence, timestamp, pointer))
+
+    def _put(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._dropped += 1
+
+    def close(self):
+        '''Write the remaining records and the index.'''
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+        if self._dropped:
+            LOGGER.warning(
+                "Recording %s dropped %d records", self._path, self._dropped)
+
+    def _write_records(self):
+        while True:
+            record = self._queue.get()
+            if record is self._STOP:
+                break
+            kind, sequence, timestamp, data = record
+            if kind == KIND_FRAME:
+                payload = self._encode_frame(data)
+            else:
+                payload = json.dumps(data).encode('utf-8')
+            self._write_record(kind, sequence, timestamp, payload)
+        self._write_index()
+        self._file.close()
+
+    def _encode_frame(self, image_cv):
+        height, width = image_cv.shape[:2]
+        channels = 1 if image_cv.ndim == 2 else image_cv.shape[2]
+
+        if self._encoding == ENCODING_JPEG:
+            ok, encoded = cv2.imencode(
+                '.jpg', image_cv,
+                [int(cv2.IMWRITE_JPEG_QUALITY), self._jpeg_quality])
+            pixels = encoded.tobytes()
+        elif self._encoding == ENCODING_PNG:
+            ok, encoded = cv2.imencode('.png', image_cv)
+            pixels = encoded.tobytes()
+        else:
+            pixels = numpy.ascontiguousarray(image_cv).tobytes()
+
+        return FRAME.pack(width, height, channels, self._encoding) + pixels
+
+    def _write_record(self, kind, sequence, timestamp, payload):
+        offset = self._file.tell()
+        self._file.write(RECORD.pack(kind, len(payload), timestamp, sequence))
+        self._file.write(payload)
+        self._index.append((kind, offset, timestamp, sequence))
+
+    def _write_index(self):
+        index_offset = self._file.tell()
+        for entry in self._index:
+            self._file.write(INDEX_ENTRY.pack(*entry))
+        self._file.write(FOOTER.pack(index_offset, INDEX_MAGIC))
+
+
+class RecordingReader(object):
+    '''
+    Random access to a recording through a memory map. Raw frames are
+    returned as read-only arrays backed by the map, without copying.
+    '''
+
+    def __init__(self, path):
+        self._path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise RecordingFormatError(path)
+        if version > VERSION:
+            raise RecordingFormatError(
+                '%s: unsupported version %d' % (path, version))
+        self._index = self._read_index()
+        self._frames = [
+            entry for entry in self._index if entry[0] == KIND_FRAME]
+        self._frame_times = [entry[2] for entry in self._frames]
+
+    def __len__(self):
+        return len(self._frames)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def get_frame(self, index):
+        '''
+        Return (sequence, timestamp, image) of the index-th frame. Raw images
+        are views of the memory map: copy them to keep them after close.
+        '''
+        _kind, offset, timestamp, sequence = self._frames[index]
+        _kind, size, _timestamp, _sequence = RECORD.unpack_from(
+            self._map, offset)
+        payload_offset = offset + RECORD.size
+        width, height, channels, encoding = FRAME.unpack_from(
+            self._map, payload_offset)
+        pixels_offset = payload_offset + FRAME.size
+        pixels_size = size - FRAME.size
+        pixels = numpy.frombuffer(
+            self._map, dtype=numpy.uint8, count=pixels_size,
+            offset=pixels_offset)
+
+        if encoding == ENCODING_RAW:
+            shape = (height, width) if channels == 1 else \
+                (height, width, channels)
+            image = pixels.reshape(shape)
+        else:
+            flags = cv2.IMREAD_GRAYSCALE if channels == 1 else \
+                cv2.IMREAD_COLOR
+            image = cv2.imdecode(pixels, flags)
+
+        return sequence, timestamp, image
+
+    def find_frame(self, timestamp):
+        '''Index of the first frame at or after timestamp.'''
+        return bisect.bisect_left(self._frame_times, timestamp)
+
+    def get_records(self, kind):
+        '''
+        Return (sequence, timestamp, data) of each JSON record of kind,
+        e.g. KIND_DETECTIONS.
+        '''
+        records = []
+        for entry_kind, offset, timestamp, sequence in self._index:
+            if entry_kind != kind:
+                continue
+            _kind, size, _timestamp, _sequence = RECORD.unpack_from(
+                self._map, offset)
+            start = offset + RECORD.size
+            data = json.loads(self._map[start:start + size].decode('utf-8'))
+            records.append((sequence, timestamp, data))
+        return records
+
+    def _read_index(self):
+        end = len(self._map)
+        if end >= HEADER.size + FOOTER.size:
+            index_offset, magic = FOOTER.unpack_from(
+                self._map, end - FOOTER.size)
+            if magic == INDEX_MAGIC:
+                return [
+                    INDEX_ENTRY.unpack_from(self._map, offset)
+                    for offset in range(
+                        index_offset, end - FOOTER.size, INDEX_ENTRY.size)
+                ]
+        LOGGER.info("%s has no index, scanning records", self._path)
+        return self._scan_index()
+
+    def _scan_index(self):
+        index = []
+        offset = HEADER.size
+        end = len(self._map)
+        while offset + RECORD.size <= end:
+            kind, size, timestamp, sequence = RECORD.unpack_from(
+                self._map, offset)
+            if offset + RECORD.size + size > end:
+                break
+            index.append((kind, offset, timestamp, sequence))
+            offset += RECORD.size + size
+        return index
+
+
+def is_recording(path):
+    try:
+        with open(path, 'rb') as recording_file:
+            return recording_file.read(len(MAGIC)) == MAGIC
+    except IOError:
+        return False
+
+
+class RecordingFormatError(Exception):
+    pass
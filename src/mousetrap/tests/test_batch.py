@@ -0,0 +1,109 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import unittest
+
+import cv2
+import numpy
+
+from mousetrap.config import Config
+from mousetrap.tools.batch import run_recording, summarize
+from mousetrap.tools.frames import EndOfReplay, ReplayCamera
+from mousetrap.tools.headless import build_app, run_to_end
+from .test_config import Files
+
+
+FRAME_COUNT = 3
+
+
+class test_headless(unittest.TestCase):
+
+    def setUp(self):
+        self.files = Files()
+        self.config = Config().load_default()
+        for index in range(FRAME_COUNT):
+            cv2.imwrite(
+                self.files.path('frame-%d.png' % index),
+                numpy.full((120, 160, 3), 120, dtype=numpy.uint8))
+
+    def tearDown(self):
+        self.files.delete()
+
+    def test_replay_camera(self):
+        camera = ReplayCamera(self.config, [self.files.directory])
+        timestamps = [
+            camera.read_image().timestamp for _index in range(FRAME_COUNT)]
+        self.assertEqual([0.0, 0.1, 0.2], timestamps)
+        self.assertEqual(FRAME_COUNT, camera.frame_count)
+        self.assertRaises(EndOfReplay, camera.read_image)
+
+        camera = ReplayCamera(
+            self.config, [self.files.directory], max_frames=2)
+        camera.read_image()
+        camera.read_image()
+        self.assertRaises(EndOfReplay, camera.read_image)
+
+    def test_run_to_end(self):
+        app = build_app(self.config, [self.files.directory])
+        passes = []
+        frames, seconds = run_to_end(app, passes.append)
+        self.assertEqual(FRAME_COUNT, frames)
+        self.assertEqual([1, 2, 3], passes)
+        self.assertTrue(seconds >= 0.0)
+
+    def test_run_recording(self):
+        report = run_recording(
+            ([Config.DEFAULT_PATH], self.files.directory, 2))
+        self.assertNotIn('error', report)
+        self.assertEqual(2, report['frames'])
+        self.assertIn('face', report['detectors'])
+        self.assertEqual(0.0, report['detectors']['face']['hit_rate'])
+
+    def test_run_recording_reports_errors(self):
+        self.files.write('broken.png', 'not an image')
+        report = run_recording(
+            ([Config.DEFAULT_PATH], self.files.path('broken.png'), None))
+        self.assertIn('Could not read image', report['error'])
+        self.assertNotIn('frames', report)
+
+
+class test_summarize(unittest.TestCase):
+
+    def report(self, frames, seconds, hits, clicks):
+        return {
+            'recording': 'recording',
+            'frames': frames,
+            'seconds': seconds,
+            'clicks': list(range(clicks)),
+            'detectors': {
+                'face': {'attempts': frames, 'hits': hits, 'reused': 0},
+            },
+        }
+
+    def test_totals(self):
+        reports = [
+            self.report(10, 1.0, 5, 1),
+            self.report(30, 2.0, 25, 2),
+            {'recording': 'broken', 'error': 'Traceback'},
+        ]
+        overall = summarize(reports, 2.0)
+        self.assertEqual(3, overall['recordings'])
+        self.assertEqual(1, overall['failed'])
+        self.assertEqual(40, overall['frames'])
+        self.assertEqual(3, overall['clicks'])
+        self.assertAlmostEqual(40 / 3.0, overall['frames_per_second'])
+        self.assertEqual(20.0, overall['frames_per_wall_second'])
+        self.assertEqual(
+            {'attempts': 40, 'hits': 30, 'reused': 0, 'hit_rate': 0.75},
+            overall['detectors']['face'])
+
+    def test_all_failed(self):
+        overall = summarize([{'recording': 'broken', 'error': ''}], 0.0)
+        self.assertEqual(0, overall['frames'])
+        self.assertEqual(0.0, overall['frames_per_second'])
+        self.assertEqual({}, overall['detectors'])
+
+
+if __name__ == '__main__':
+    unittest.main()
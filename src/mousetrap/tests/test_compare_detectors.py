@@ -0,0 +1,80 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import unittest
+
+import cv2
+import numpy
+
+from mousetrap.image import Image
+from mousetrap.main import Config
+from mousetrap.tools.compare_detectors import Comparison, parse_backend_spec
+from mousetrap.vision import CascadeBackend, DetectorBackendError
+from .test_vision import draw_face
+
+
+class test_parse_backend_spec(unittest.TestCase):
+
+    def setUp(self):
+        self.config = Config().load_default()
+
+    def test_two_stage(self):
+        backend = parse_backend_spec(self.config, 'face', 'haar@12')
+        self.assertIsInstance(backend, CascadeBackend)
+        self.assertIsNotNone(backend._prefilter)
+        self.assertIsNone(
+            parse_backend_spec(self.config, 'face', 'haar')._prefilter)
+
+    def test_unknown_backend(self):
+        self.assertRaises(
+            DetectorBackendError, parse_backend_spec, self.config, 'face',
+            'nope')
+
+    def test_bad_stages(self):
+        self.assertRaises(
+            ValueError, parse_backend_spec, self.config, 'face', 'haar@x')
+
+
+class test_Comparison(unittest.TestCase):
+
+    def setUp(self):
+        self.config = Config().load_default()
+        face_cv = numpy.full((480, 640), 120, dtype=numpy.uint8)
+        draw_face(face_cv, 400, 240, 100)
+        self.face_cv = cv2.GaussianBlur(face_cv, (5, 5), 0)
+        self.blank_cv = numpy.full((480, 640), 120, dtype=numpy.uint8)
+
+    def image(self, image_cv):
+        return Image(self.config, image_cv, is_grayscale=True)
+
+    def test_two_backends(self):
+        comparison = Comparison(
+            self.config, 'face', ['haar', 'haar@5'], scale_factor=1.2)
+        for image_cv in (self.face_cv, self.blank_cv, self.face_cv):
+            comparison.add_frame(self.image(image_cv))
+
+        results = comparison.get_results()
+        self.assertEqual(
+            ['haar', 'haar@5'], [result['backend'] for result in results])
+        for result in results:
+            self.assertEqual(3, result['frames'])
+            self.assertEqual(2, result['hits'])
+            self.assertEqual(1.0, result['recall'])
+
+    def test_within_searches_every_frame(self):
+        comparison = Comparison(
+            self.config, 'nose', ['haar'], within='face',
+            within_scale_factor=1.2, within_min_neighbors=3)
+        for image_cv in (self.face_cv, self.face_cv, self.blank_cv):
+            comparison.add_frame(self.image(image_cv))
+
+        self.assertEqual(1, comparison.skipped_frames)
+        self.assertEqual(2, comparison.get_results()[0]['frames'])
+        self.assertEqual(
+            {'attempts': 3, 'hits': 2, 'reused': 0},
+            comparison._within_detector.get_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
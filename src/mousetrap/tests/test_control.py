@@ -0,0 +1,88 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import threading
+import unittest
+
+from mousetrap.control import ControlServer, execute, send_request
+from mousetrap.main import Config
+from mousetrap.tools.headless import build_app
+from .test_config import Files
+
+
+class test_control(unittest.TestCase):
+
+    def setUp(self):
+        self.files = Files()
+        self.app = build_app(Config().load_default(), [])
+
+    def tearDown(self):
+        self.files.delete()
+
+    def test_stats(self):
+        result = execute(self.app, {'command': 'stats'})['result']
+        self.assertEqual(10, result['loops_per_second'])
+        self.assertIn(
+            'mousetrap.plugins.nose.NoseJoystickPlugin',
+            [plugin['name'] for plugin in result['plugins']],
+        )
+
+    def test_set_detector(self):
+        response = execute(self.app, {
+            'command': 'set_detector', 'feature': 'nose', 'scale_factor': 1.3,
+        })
+        self.assertTrue(response['ok'])
+        self.assertEqual(1.3, response['result'][0]['scale_factor'])
+
+    def test_disable_plugin(self):
+        response = execute(
+            self.app, {'command': 'disable_plugin', 'name': 'EyesPlugin'})
+        self.assertTrue(response['ok'])
+        schedule = self.app.loop.find_schedule('EyesPlugin')
+        self.assertFalse(schedule.enabled)
+
+    def test_errors(self):
+        self.assertFalse(execute(self.app, {'command': 'reboot'})['ok'])
+        self.assertFalse(execute(
+            self.app, {'command': 'enable_plugin', 'name': 'Missing'})['ok'])
+        self.assertFalse(execute(
+            self.app,
+            {'command': 'set_loops_per_second', 'value': 0})['ok'])
+        for value in ('nan', 'inf'):
+            self.assertFalse(execute(self.app, {
+                'command': 'set_loops_per_second', 'value': value})['ok'])
+        self.assertEqual(10, self.app.loop.get_loops_per_second())
+
+    def test_power_modes_scale_from_set_rate(self):
+        from mousetrap.plugins.power import MODE_IDLE, MODE_NORMAL
+        power = self.app.loop.find_schedule('PowerModePlugin').plugin
+        self.assertEqual(20, execute(self.app, {
+            'command': 'set_loops_per_second', 'value': 20})['result'])
+
+        power._switch(self.app, MODE_IDLE)
+        self.assertEqual(4, self.app.loop.get_loops_per_second())
+        self.assertEqual(10, execute(self.app, {
+            'command': 'set_loops_per_second', 'value': 50})['result'])
+        power._switch(self.app, MODE_NORMAL)
+        self.assertEqual(50, self.app.loop.get_loops_per_second())
+
+    def test_requests_run_when_polled(self):
+        server = ControlServer(self.files.path('control'))
+        responses = []
+        client = threading.Thread(target=lambda: responses.append(
+            send_request(server.get_path(), {
+                'command': 'set_loops_per_second', 'value': 4})))
+        client.start()
+        while client.is_alive():
+            for request in server.get_pending():
+                request.respond(execute(self.app, request.request))
+            client.join(0.01)
+        server.close()
+
+        self.assertEqual([{'ok': True, 'result': 4}], responses)
+        self.assertEqual(4, self.app.loop.get_loops_per_second())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -78,6 +78,103 @@ class test_Loop(unittest.TestCase):
     def test_loop(self):
         self.loop.start()
 
+    def test_set_loops_per_second_reschedules(self):
+        self.loop.start()
+        self.loop.set_loops_per_second(5)
+        self.assertEqual(5, self.loop.get_loops_per_second())
+        self.assertFalse(self.loop._run())
+        self.assertTrue(self.loop._run())
+
+    def test_max_loops_per_second(self):
+        self.loop.set_max_loops_per_second(4)
+        self.loop.set_loops_per_second(20)
+        self.assertEqual(4, self.loop.get_loops_per_second())
+        self.loop.set_max_loops_per_second(None)
+        self.assertEqual(20, self.loop.get_loops_per_second())
+
+    def test_plugins_run_in_order(self):
+        calls = []
+        self.loop.subscribe(Plugin(calls, 'a'))
+        self.loop.subscribe(Plugin(calls, 'b'))
+        self.loop._run()
+        self.assertEqual(['a', 'b'], calls)
+
+
+class test_Loop_scheduling(unittest.TestCase):
+
+    def setUp(self):
+        from mousetrap.core import Loop
+
+        self.gdk_patcher = GtkGdkPatch()
+        self.gdk_patcher.patch_in_setup(test_case=self)
+
+        self.calls = []
+        self.config = {
+            'loops_per_second': 10,
+            'loop': {
+                'budget_ms': 0,
+                'shed_below_priority': 10,
+                'plugins': {
+                    __name__ + '.Plugin': {'every': 3},
+                    __name__ + '.SlowPlugin': {'priority': 0},
+                },
+            },
+        }
+        self.loop = Loop(self.config, app=None)
+
+    def test_every_nth_pass(self):
+        self.loop.subscribe(Plugin(self.calls, 'a'))
+        for _ in range(7):
+            self.loop._run()
+        self.assertEqual(3, len(self.calls))
+
+    def test_low_priority_shed_when_over_budget(self):
+        slow = SlowPlugin(self.calls, 'slow', seconds=0.15)
+        self.loop.subscribe(slow)
+        self.loop._run()
+        self.loop._run()
+        schedule = self.loop.get_schedules()[0]
+        self.assertEqual(1, schedule.run_count)
+        self.assertEqual(1, schedule.shed_count)
+
+    def test_low_priority_shed_before_slow_plugins(self):
+        # The shipped order: the display runs before the detectors.
+        self.loop.subscribe(Plugin(self.calls, 'camera'))
+        self.loop.subscribe(SlowPlugin(self.calls, 'display', seconds=0))
+        self.loop.subscribe(DetectorPlugin(self.calls, 'nose', seconds=0.15))
+        self.loop._run()
+        self.loop._run()
+        display = self.loop.get_schedules()[1]
+        self.assertEqual(1, display.run_count)
+        self.assertEqual(1, display.shed_count)
+        self.assertEqual(2, self.calls.count('nose'))
+
+
+class Plugin(object):
+
+    def __init__(self, calls, name):
+        self.calls = calls
+        self.name = name
+
+    def run(self, app):
+        self.calls.append(self.name)
+
+
+class SlowPlugin(Plugin):
+
+    def __init__(self, calls, name, seconds):
+        super(SlowPlugin, self).__init__(calls, name)
+        self.seconds = seconds
+
+    def run(self, app):
+        import time
+        time.sleep(self.seconds)
+        super(SlowPlugin, self).run(app)
+
+
+class DetectorPlugin(SlowPlugin):
+    pass
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,159 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import os
+import socket
+import unittest
+
+import cv2
+import numpy
+
+from mousetrap.detectserver import Channel, DetectRequest, DetectServer, \
+    FairScheduler, get_default_socket_path
+from mousetrap.main import Config
+from mousetrap.vision import CascadeBackend, DetectorBackend, HaarLoader, \
+    RemoteBackend
+from .patches import mock
+from .test_config import Files
+from .test_vision import draw_face
+
+
+def request(client):
+    return DetectRequest(client, None, 'face', 1, 1.2, 3)
+
+
+class test_FairScheduler(unittest.TestCase):
+
+    def test_one_request_per_client_in_turn(self):
+        scheduler = FairScheduler(max_batch=2)
+        busy = [request('busy') for _index in range(3)]
+        quiet = request('quiet')
+        for queued in busy[:2] + [quiet, busy[2]]:
+            scheduler.put(queued)
+
+        self.assertEqual([busy[0], quiet], scheduler.get_batch())
+        self.assertEqual(busy[1:], scheduler.get_batch())
+
+    def test_drains_then_stops_when_closed(self):
+        scheduler = FairScheduler(max_batch=8)
+        queued = request('client')
+        scheduler.put(queued)
+        scheduler.close()
+        self.assertEqual([queued], scheduler.get_batch())
+        self.assertEqual([], scheduler.get_batch())
+
+        late = request('client')
+        scheduler.put(late)
+        self.assertFalse(late.wait()['ok'])
+
+
+@unittest.skipUnless(
+    hasattr(socket.socket, 'sendmsg'), 'needs file descriptor passing')
+class test_DetectServer(unittest.TestCase):
+
+    def setUp(self):
+        self.files = Files()
+        self.config = Config().load_default()
+        self.config.load_dict({'detect_server': {
+            'client': True,
+            'path': self.files.path('detect'),
+            'workers': 1,
+        }})
+        image_cv = numpy.full((480, 640), 120, dtype=numpy.uint8)
+        draw_face(image_cv, 400, 240, 100)
+        self.image_cv = cv2.GaussianBlur(image_cv, (5, 5), 0)
+        self.local = CascadeBackend(
+            self.config, 'face', {}, HaarLoader(self.config))
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.close()
+        self.files.delete()
+
+    def test_client_backend(self):
+        backend = DetectorBackend.from_config(self.config, 'face')
+        self.assertIsInstance(backend, RemoteBackend)
+        local = DetectorBackend.from_config(self.config, 'face', local=True)
+        self.assertIsInstance(local, CascadeBackend)
+
+    def test_detects_like_local(self):
+        self.server = DetectServer(self.config, self.files.path('detect'))
+        backend = DetectorBackend.from_config(self.config, 'face')
+        region_cv = self.image_cv[100:400, 250:550]
+        try:
+            for image_cv in (self.image_cv, region_cv):
+                self.assertEqual(
+                    self.local.detect(image_cv, 1.2, 3).tolist(),
+                    backend.detect(image_cv, 1.2, 3).tolist())
+            self.assertIsNotNone(backend._channel)
+            self.assertIsNone(backend._local)
+        finally:
+            backend.close()
+
+    def test_falls_back_without_server(self):
+        backend = DetectorBackend.from_config(self.config, 'face')
+        self.assertEqual(
+            self.local.detect(self.image_cv, 1.2, 3).tolist(),
+            backend.detect(self.image_cv, 1.2, 3).tolist())
+
+        self.config.load_dict({'detect_server': {'fallback': False}})
+        backend = DetectorBackend.from_config(self.config, 'face')
+        self.assertEqual(0, len(backend.detect(self.image_cv, 1.2, 3)))
+
+    def test_shared_path(self):
+        self.config.load_dict({'detect_server': {
+            'path': None, 'shared': True}})
+        backend = DetectorBackend.from_config(self.config, 'face')
+        self.assertEqual(get_default_socket_path(True), backend._path)
+        self.assertNotEqual(get_default_socket_path(), backend._path)
+
+    def test_refuses_socket_of_other_user(self):
+        self.server = DetectServer(self.config, self.files.path('detect'))
+        lstat = os.lstat
+
+        def other_user(path):
+            status = lstat(path)
+            return mock.Mock(st_mode=status.st_mode, st_uid=4242)
+
+        with mock.patch('mousetrap.detectserver.os.lstat', other_user):
+            backend = DetectorBackend.from_config(self.config, 'face')
+            backend.detect(self.image_cv, 1.2, 3)
+            self.assertIsNone(backend._channel)
+
+            self.config.load_dict({'detect_server': {'owner': 4242}})
+            backend = DetectorBackend.from_config(self.config, 'face')
+            try:
+                backend.detect(self.image_cv, 1.2, 3)
+                self.assertIsNotNone(backend._channel)
+            finally:
+                backend.close()
+
+    def test_bad_frame_bus_closes_client(self):
+        self.server = DetectServer(self.config, self.files.path('detect'))
+        self.files.write('short', 'MTF')
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(5.0)
+        connection.connect(self.files.path('detect'))
+        channel = Channel(connection)
+        try:
+            with self.assertLogs('mousetrap.detectserver', 'WARNING') as logs:
+                with open(self.files.path('short'), 'rb') as short:
+                    channel.send({
+                        'command': 'hello', 'client': 'bad',
+                        'feature': 'face',
+                    }, fds=[short.fileno()])
+                self.assertIsNone(channel.receive())
+        finally:
+            channel.close()
+        self.assertIn('failed', logs.output[0])
+
+        backend = DetectorBackend.from_config(self.config, 'face')
+        try:
+            self.assertEqual(
+                self.local.detect(self.image_cv, 1.2, 3).tolist(),
+                backend.detect(self.image_cv, 1.2, 3).tolist())
+            self.assertIsNotNone(backend._channel)
+        finally:
+            backend.close()
@@ -0,0 +1,145 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import unittest
+
+import numpy
+
+from mousetrap.image import Image
+from mousetrap.main import Config
+from mousetrap.plugins.eyes import (
+    ClosedDetector, TemplateClosedDetector, TimeWindow
+)
+
+
+EYE = (40, 30, 20, 10)
+
+
+class FixedLocator(object):
+
+    def __init__(self, eye, is_open):
+        self.eye = eye
+        self.is_open = is_open
+        self.calls = 0
+
+    def find_left_eye(self, image):
+        self.calls += 1
+        return self.eye, self.is_open
+
+
+class test_TemplateClosedDetector(unittest.TestCase):
+
+    def setUp(self):
+        self.config = Config().load_default()
+        self.config.load_dict({'classes': {
+            'mousetrap.plugins.eyes.TemplateClosedDetector': {
+                'window': 0.4,
+                'min_fraction_to_be_closed': 0.5,
+                'reacquire_every': 100,
+                'reacquire_after_misses': 3,
+            },
+        }})
+        self.detector = TemplateClosedDetector(self.config)
+        self.locator = FixedLocator(EYE, True)
+        self.detector._left_locator = self.locator
+        random = numpy.random.RandomState(0)
+        self.background = random.randint(
+            0, 256, (100, 120)).astype(numpy.uint8)
+        self.timestamp = 0.0
+
+    def image(self, eye_open=True, shift=0):
+        image_cv = numpy.roll(self.background, shift, axis=1)
+        if not eye_open:
+            x, y, width, height = EYE
+            image_cv = image_cv.copy()
+            image_cv[y:y + height, x + shift:x + width + shift] = 128
+        self.timestamp += 0.1
+        return Image(
+            self.config, image_cv, is_grayscale=True,
+            timestamp=self.timestamp)
+
+    def test_tracks_open_eye_without_cascades(self):
+        for shift in (0, 2, 4, 6):
+            self.detector.update(self.image(shift=shift))
+
+        self.assertEqual(1, self.locator.calls)
+        self.assertEqual((46, 30, 20, 10), self.detector.get_eye())
+        self.assertFalse(self.detector.is_closed())
+
+    def test_closed_eye(self):
+        self.detector.update(self.image())
+        for _i in range(3):
+            self.detector.update(self.image(eye_open=False))
+
+        self.assertTrue(self.detector.is_closed())
+        self.assertEqual(1, self.locator.calls)
+
+    def test_reacquires_after_misses(self):
+        self.detector.update(self.image())
+        for _i in range(4):
+            self.detector.update(self.image(eye_open=False))
+
+        self.assertEqual(2, self.locator.calls)
+
+    def test_no_template_until_eye_found(self):
+        self.locator.eye = None
+        self.detector.update(self.image())
+        self.detector.update(self.image())
+
+        self.assertEqual(2, self.locator.calls)
+        self.assertIsNone(self.detector.get_eye())
+
+
+class FixedOpenLocator(object):
+
+    def __init__(self):
+        self.is_open = True
+
+    def locate(self, image):
+        return self.is_open
+
+
+class test_ClosedDetector(unittest.TestCase):
+
+    def setUp(self):
+        self.config = Config().load_default()
+        self.image_cv = numpy.zeros((10, 10), numpy.uint8)
+
+    def closed_after(self, loops_per_second, seconds_closed):
+        detector = ClosedDetector(self.config)
+        detector._left_locator = locator = FixedOpenLocator()
+        period = 1.0 / loops_per_second
+        frames_open = int(round(2 / period))
+        frames_closed = int(round(seconds_closed / period))
+        for frame in range(frames_open + frames_closed):
+            locator.is_open = frame < frames_open
+            detector.update(Image(
+                self.config, self.image_cv, is_grayscale=True,
+                timestamp=frame * period))
+        return detector.is_closed()
+
+    def test_same_timing_at_any_rate(self):
+        # Defaults: closed for more than 0.8 of 1.5 seconds.
+        for loops_per_second in (5, 10, 30):
+            self.assertFalse(self.closed_after(loops_per_second, 1.0))
+            self.assertTrue(self.closed_after(loops_per_second, 1.4))
+
+
+class test_TimeWindow(unittest.TestCase):
+
+    def test_keeps_recent_values(self):
+        window = TimeWindow(Config(), 1.0)
+        for timestamp, value in ((0.0, 'a'), (0.5, 'b'), (1.0, 'b'),
+                                 (1.25, 'a')):
+            window.append(timestamp, value)
+
+        self.assertEqual(['b', 'b', 'a'], list(window))
+        self.assertEqual(0.5, window.get_seconds('b'))
+        self.assertEqual(0.25, window.get_seconds('a'))
+        window.clear()
+        self.assertEqual([], list(window))
+
+
+if __name__ == '__main__':
+    unittest.main()
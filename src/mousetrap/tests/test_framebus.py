@@ -0,0 +1,93 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import unittest
+
+import numpy
+
+from mousetrap.framebus import FrameBusReader, FrameBusWriter, HEADER, SLOT
+from .test_config import Files
+
+
+class test_FrameBus(unittest.TestCase):
+
+    def setUp(self):
+        self.files = Files()
+        self.writer = FrameBusWriter(
+            self.files.path('frames'), slot_count=2, max_width=8,
+            max_height=6, max_channels=3, metadata_size=64)
+        self.reader = FrameBusReader(self.files.path('frames'))
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+        self.files.delete()
+
+    def frame(self, value, channels=3):
+        return numpy.full((6, 8, channels), value, dtype=numpy.uint8)
+
+    def test_no_frames(self):
+        self.assertIsNone(self.reader.read_latest())
+
+    def test_read_latest(self):
+        self.writer.publish(1.0, self.frame(1), {'pointer': [1, 2]})
+        self.writer.publish(2.0, self.frame(2)[:, :, 0], None)
+
+        frame = self.reader.read_latest()
+        self.assertEqual((2, 2.0), (frame.sequence, frame.timestamp))
+        self.assertEqual((6, 8), frame.image.shape)
+        self.assertTrue((frame.image == 2).all())
+        self.assertEqual({'pointer': [1, 2]}, self.reader.read(1).metadata)
+
+    def test_overwritten_frames(self):
+        for value in range(3):
+            self.writer.publish(value, self.frame(value))
+
+        self.assertIsNone(self.reader.read(1))
+        view = self.reader.read(3, copy=False)
+        self.assertTrue(self.reader.is_intact(view))
+        self.writer.publish(3, self.frame(3))
+        self.writer.publish(4, self.frame(4))
+        self.assertFalse(self.reader.is_intact(view))
+        del view
+
+    def test_private(self):
+        import os
+        import stat
+        mode = os.stat(self.files.path('frames')).st_mode
+        self.assertEqual(0o600, stat.S_IMODE(mode))
+
+        os.symlink(self.files.path('frames'), self.files.path('link'))
+        self.assertRaises(
+            (IOError, OSError), FrameBusWriter, self.files.path('link'))
+
+    def test_too_large(self):
+        self.assertIsNone(self.writer.publish(
+            0, numpy.zeros((7, 8, 3), dtype=numpy.uint8)))
+
+    def test_torn_slot(self):
+        self.writer.publish(1.0, self.frame(1), {'pointer': [1, 2]})
+        offset = HEADER.size + self.writer._slot_size
+        good = self.writer._map[offset:offset + SLOT.size + 64]
+
+        # Metadata cut off mid-write, then not even UTF-8.
+        self.writer._map[offset + SLOT.size:offset + SLOT.size + 2] = \
+            b'{\xff'
+        self.assertIsNone(self.reader.read(1))
+
+        # Dimensions from a frame larger than a slot.
+        self.writer._map[offset:offset + SLOT.size + 64] = good
+        write_count, sequence, timestamp, _width, height, channels, \
+            metadata_length = SLOT.unpack_from(self.writer._map, offset)
+        SLOT.pack_into(
+            self.writer._map, offset, write_count, sequence, timestamp,
+            60000, height, channels, metadata_length)
+        self.assertIsNone(self.reader.read(1))
+
+        self.writer._map[offset:offset + SLOT.size + 64] = good
+        self.assertEqual({'pointer': [1, 2]}, self.reader.read(1).metadata)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import unittest
+
+from mousetrap.plugins.governor import CpuBudget, build_levels
+
+
+class test_build_levels(unittest.TestCase):
+
+    def test_rate_steps_then_camera(self):
+        self.assertEqual(
+            [(None, False), (5.0, False), (2.5, False), (2, False),
+             (2, True)],
+            build_levels(10, 0.5, 2, {'width': 160, 'height': 120}),
+        )
+
+    def test_without_reduced_camera(self):
+        self.assertEqual([(None, False), (5, False)], build_levels(10, 0.5, 5))
+
+
+class test_CpuBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.budget = CpuBudget(50, 1.0, 0.8, 2)
+
+    def test_steps_up_while_over_budget(self):
+        self.assertEqual(0, self.budget.update(0.0, 0.0))
+        self.assertEqual(0, self.budget.update(0.5, 0.5))
+        self.assertEqual(1, self.budget.update(1.0, 0.9))
+        self.assertAlmostEqual(90.0, self.budget.get_cpu_percent())
+        self.assertEqual(2, self.budget.update(2.0, 1.8))
+        self.assertEqual(2, self.budget.update(3.0, 2.7))
+
+    def test_steps_down_well_under_budget(self):
+        self.budget.update(0.0, 0.0)
+        self.budget.update(1.0, 0.9)
+        self.assertEqual(1, self.budget.update(2.0, 1.35))
+        self.assertEqual(0, self.budget.update(3.0, 1.6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -45,5 +45,39 @@ class test_pointer(unittest.TestCase):
         self.assertEquals(4, pointer_y)
 
 
+class test_NullPointer(unittest.TestCase):
+
+    def setUp(self):
+        from mousetrap.gui import NullPointer
+        self.pointer = NullPointer(
+            Config(), screen_width=100, screen_height=50)
+
+    def test_starts_centered(self):
+        self.assertEqual((50, 25), self.pointer.get_position())
+
+    def test_records_trajectory_and_clamps(self):
+        self.pointer.set_position((10, 20))
+        self.pointer.set_position(None)
+        self.pointer.set_position((500, -3))
+        self.assertEqual([(10, 20), (10, 20), (99, 0)],
+                         self.pointer.trajectory)
+        self.assertTrue(self.pointer.is_moving())
+
+    def test_records_clicks(self):
+        self.pointer.set_position((10, 20))
+        self.pointer.click()
+        self.assertEqual(1, len(self.pointer.clicks))
+
+    def test_keep_trajectory_false_only_counts(self):
+        from mousetrap.gui import NullPointer
+        pointer = NullPointer(Config(), keep_trajectory=False)
+        pointer.set_position((10, 20))
+        pointer.click()
+        self.assertEqual((10, 20), pointer.get_position())
+        self.assertEqual([], pointer.trajectory)
+        self.assertEqual([], pointer.clicks)
+        self.assertEqual(1, pointer.get_click_count())
+
+
 if __name__ == '__main__':
     unittest.main()
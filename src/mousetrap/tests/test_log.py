@@ -0,0 +1,75 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import logging
+import threading
+import unittest
+
+from mousetrap import log
+
+
+class Recorder(logging.Handler):
+
+    def __init__(self):
+        super(Recorder, self).__init__()
+        self.messages = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+        self.threads.add(threading.current_thread().name)
+
+
+class test_RateLimitedLog(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('mousetrap.tests.rate_limited')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.recorder = Recorder()
+        self.logger.addHandler(self.recorder)
+        self.addCleanup(self.logger.removeHandler, self.recorder)
+
+    def test_limits_and_counts(self):
+        limited = log.RateLimitedLog(self.logger, interval=0.0)
+        limited.debug('at %d', 1)
+        self.assertEqual(['at 1'], self.recorder.messages)
+
+        limited = log.RateLimitedLog(self.logger, interval=60.0)
+        for position in range(3):
+            limited.debug('at %d', position)
+        limited._last.clear()
+        limited.debug('at %d', 3)
+        self.assertEqual(
+            ['at 1', 'at 0', 'at 3 (and 2 more)'], self.recorder.messages)
+
+    def test_disabled_level_does_nothing(self):
+        self.logger.setLevel(logging.INFO)
+        limited = log.RateLimitedLog(self.logger)
+        limited.debug('at %d', 1)
+        self.assertEqual([], self.recorder.messages)
+        self.assertEqual({}, limited._last)
+
+
+class test_queue(unittest.TestCase):
+
+    def test_records_written_by_listener(self):
+        root = logging.getLogger()
+        recorder = Recorder()
+        root.addHandler(recorder)
+        self.addCleanup(root.removeHandler, recorder)
+        log.start_queue(10)
+        try:
+            self.assertNotIn(recorder, root.handlers)
+            root.error('queued %s', [1])
+        finally:
+            log.stop_queue()
+
+        self.assertIn(recorder, root.handlers)
+        self.assertEqual(['queued [1]'], recorder.messages)
+        self.assertEqual({'mousetrap-logging'}, recorder.threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
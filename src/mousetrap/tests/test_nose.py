@@ -0,0 +1,63 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import unittest
+
+import numpy
+
+from mousetrap.gui import NullPointer
+from mousetrap.image import Image
+from mousetrap.main import Config
+from mousetrap.plugins.nose import NoseJoystickPlugin
+
+
+class FixedNoseLocator(object):
+
+    def __init__(self):
+        self.point = (100, 100)
+
+    def find(self, image):
+        return self.point
+
+
+class App(object):
+
+    def __init__(self, config):
+        self.pointer = NullPointer(config)
+        self.image = None
+
+
+class test_NoseJoystickPlugin(unittest.TestCase):
+
+    def setUp(self):
+        self.config = Config().load_default()
+        self.image_cv = numpy.zeros((10, 10), numpy.uint8)
+
+    def travel(self, loops_per_second, seconds=1.0):
+        '''Pointer x travel with the nose 20 pixels left of its start.'''
+        plugin = NoseJoystickPlugin(self.config)
+        plugin._nose_locator = locator = FixedNoseLocator()
+        app = App(self.config)
+        period = 1.0 / loops_per_second
+        for frame in range(int(round(seconds / period)) + 1):
+            app.image = Image(
+                self.config, self.image_cv, is_grayscale=True,
+                timestamp=frame * period)
+            plugin.run(app)
+            if frame == 0:
+                locator.point = (80, 100)
+                start_x = app.pointer.get_position()[0]
+        return app.pointer.get_position()[0] - start_x
+
+    def test_speed_does_not_depend_on_rate(self):
+        # Default speed: 5 screen pixels per second per pixel of offset.
+        for loops_per_second in (5, 10, 20):
+            self.assertEqual(100, self.travel(loops_per_second))
+
+    def test_gap_in_frames_is_capped(self):
+        self.assertEqual(50, self.travel(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
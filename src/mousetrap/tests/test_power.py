@@ -0,0 +1,115 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import unittest
+
+from mousetrap.main import Config
+from mousetrap.plugins.governor import GovernorPlugin
+from mousetrap.plugins.power import (
+    ModeSelector, PowerModePlugin, MODE_IDLE, MODE_REDUCED, MODE_NORMAL,
+    MODE_BOOST
+)
+from mousetrap.vision import Camera
+from .patches import mock
+from .test_vision import FakeDevice
+
+
+class test_ModeSelector(unittest.TestCase):
+
+    def setUp(self):
+        self.selector = ModeSelector({
+            'idle_after': 10.0,
+            'reduce_after': 3.0,
+            'boost_hold': 1.0,
+            'wake_after': 2,
+        })
+
+    def test_starts_normal(self):
+        self.assertEqual(MODE_NORMAL, self.selector.update(0, True, False))
+
+    def test_boost_while_moving_then_hold(self):
+        self.selector.update(0, True, False)
+        self.assertEqual(MODE_BOOST, self.selector.update(1, True, True))
+        self.assertEqual(MODE_BOOST, self.selector.update(1.5, True, False))
+        self.assertEqual(MODE_NORMAL, self.selector.update(2.5, True, False))
+
+    def test_reduced_when_still(self):
+        self.selector.update(0, True, False)
+        self.assertEqual(MODE_REDUCED, self.selector.update(3, True, False))
+
+    def test_idle_without_face_and_wake(self):
+        self.selector.update(0, False, False)
+        self.assertEqual(MODE_IDLE, self.selector.update(10, False, False))
+        self.assertEqual(MODE_IDLE, self.selector.update(11, True, False))
+        self.assertEqual(MODE_NORMAL, self.selector.update(12, True, False))
+
+
+class test_PowerModeWithGovernor(unittest.TestCase):
+
+    def setUp(self):
+        config = Config().load_default()
+        config.load_dict({
+            'loops_per_second': 10,
+            'classes': {
+                'mousetrap.plugins.power.PowerModePlugin': {
+                    'idle_camera': {'width': 160, 'height': 120},
+                },
+                'mousetrap.plugins.governor.GovernorPlugin': {
+                    'check_every': 1.0,
+                    'cpu_percent': 50,
+                    'min_loops_per_second': 10,
+                    'reduced_camera': {'width': 320, 'height': 240},
+                },
+            },
+        })
+        patcher = mock.patch.object(
+            Camera, '_new_capture_device',
+            side_effect=lambda index: FakeDevice([]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.app = mock.Mock()
+        self.app.camera = Camera(config)
+        self.app.pointer.is_moving.return_value = False
+        self.app.loop.get_base_loops_per_second.return_value = 10
+        self.power = PowerModePlugin(config)
+        self.governor = GovernorPlugin(config)
+
+    def run_power(self, now, face_seen):
+        self.app.session.is_detected.return_value = face_seen
+        with mock.patch('mousetrap.plugins.power.timer', return_value=now):
+            self.power.run(self.app)
+
+    def run_governor(self, now, cpu_seconds):
+        with mock.patch('mousetrap.plugins.governor.timer',
+                        return_value=now), \
+                mock.patch('mousetrap.plugins.governor.'
+                           'get_process_cpu_seconds',
+                           return_value=cpu_seconds):
+            self.governor.run(self.app)
+
+    def test_neither_undoes_the_other(self):
+        self.run_power(0, False)
+        self.run_governor(0, 0)
+        self.run_governor(1, 1)
+        self.assertEqual((320, 240), self.app.camera.get_dimensions())
+
+        self.run_power(10, False)
+        self.assertEqual(MODE_IDLE, self.power.get_mode())
+        self.assertEqual((160, 120), self.app.camera.get_dimensions())
+        self.run_power(11, True)
+        self.run_power(12, True)
+        self.assertEqual(MODE_NORMAL, self.power.get_mode())
+        self.assertEqual((320, 240), self.app.camera.get_dimensions())
+
+        self.run_power(22, False)
+        self.run_governor(2, 1)
+        self.assertEqual(0, self.governor.get_report()['level'])
+        self.assertEqual((160, 120), self.app.camera.get_dimensions())
+        self.run_power(23, True)
+        self.run_power(24, True)
+        self.assertEqual((400, 300), self.app.camera.get_dimensions())
+
+
+if __name__ == '__main__':
+    unittest.main()
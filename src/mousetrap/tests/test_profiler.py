@@ -0,0 +1,62 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import pstats
+import threading
+import time
+import unittest
+from io import open
+
+from mousetrap.profiler import SamplingProfiler
+from .test_config import Files
+
+
+def busy_wait(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class test_SamplingProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.files = Files()
+        self.prefix = self.files.path('profile')
+
+    def tearDown(self):
+        self.files.delete()
+
+    def test_profiles_thread(self):
+        profiler = SamplingProfiler(
+            threading.current_thread().ident, interval=0.001)
+        profiler.start()
+        busy_wait(0.2)
+        profiler.stop()
+        profiler.write(self.prefix)
+
+        self.assertTrue(profiler.get_sample_count() > 0)
+
+        with open(self.prefix + '.collapsed') as collapsed_file:
+            lines = collapsed_file.read().splitlines()
+        self.assertTrue(any('busy_wait' in line for line in lines))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit()
+                            for line in lines))
+
+        stats = pstats.Stats(self.prefix + '.pstats')
+        names = [function[2] for function in stats.stats]
+        self.assertIn('busy_wait', names)
+
+    def test_stops_after_duration_and_writes(self):
+        profiler = SamplingProfiler(
+            threading.current_thread().ident, interval=0.001)
+        profiler.start(duration=0.05, output_prefix=self.prefix)
+        busy_wait(0.2)
+        self.assertFalse(profiler.is_running())
+
+        stats = pstats.Stats(self.prefix + '.pstats')
+        self.assertTrue(len(stats.stats) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
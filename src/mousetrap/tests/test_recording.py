@@ -0,0 +1,103 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+from io import open
+import unittest
+
+import numpy
+
+from mousetrap.recording import (
+    FOOTER, KIND_DETECTIONS, KIND_POINTER, RecordingReader, RecordingWriter,
+    is_recording,
+)
+from mousetrap.main import Config
+from mousetrap.tools.frames import read_frames
+from .test_config import Files
+
+
+def make_frame(value, width=8, height=6):
+    return numpy.full((height, width), value, dtype=numpy.uint8)
+
+
+class test_Recording(unittest.TestCase):
+
+    def setUp(self):
+        self.files = Files()
+        self.path = self.files.path('session.mtrec')
+
+    def tearDown(self):
+        self.files.delete()
+
+    def record(self, encoding='raw', count=3):
+        writer = RecordingWriter(self.path, encoding=encoding)
+        for sequence in range(count):
+            timestamp = 100.0 + sequence
+            writer.put_frame(sequence, timestamp, make_frame(sequence * 10))
+            writer.put_detections(sequence, timestamp, [
+                {'feature': 'face', 'rect': [1, 2, 3, 4], 'in_image': True},
+            ])
+            writer.put_pointer(sequence, timestamp, {'clicks': sequence})
+        writer.close()
+
+    def test_raw_round_trip(self):
+        self.record()
+        self.assertTrue(is_recording(self.path))
+
+        with RecordingReader(self.path) as reader:
+            self.assertEqual(3, len(reader))
+            sequence, timestamp, image = reader.get_frame(2)
+            self.assertEqual((2, 102.0), (sequence, timestamp))
+            self.assertEqual((6, 8), image.shape)
+            self.assertTrue((image == 20).all())
+            del image
+
+            self.assertEqual(1, reader.find_frame(100.5))
+            self.assertEqual(
+                [0, 1, 2],
+                [data['clicks']
+                 for _s, _t, data in reader.get_records(KIND_POINTER)],
+            )
+            self.assertEqual(
+                [1, 2, 3, 4],
+                reader.get_records(KIND_DETECTIONS)[0][2][0]['rect'],
+            )
+
+    def test_png_round_trip(self):
+        self.record(encoding='png')
+
+        with RecordingReader(self.path) as reader:
+            _sequence, _timestamp, image = reader.get_frame(1)
+            self.assertTrue((image == 10).all())
+
+    def test_rebuilds_missing_index(self):
+        self.record()
+        with open(self.path, 'rb') as recording_file:
+            data = recording_file.read()
+        index_offset = FOOTER.unpack(data[-FOOTER.size:])[0]
+        with open(self.path, 'wb') as recording_file:
+            recording_file.write(data[:index_offset])
+
+        with RecordingReader(self.path) as reader:
+            self.assertEqual(3, len(reader))
+            self.assertEqual(3, len(reader.get_records(KIND_POINTER)))
+
+    def test_is_recording(self):
+        self.files.write('other.txt', 'not a recording')
+        self.assertFalse(is_recording(self.files.path('other.txt')))
+        self.assertFalse(is_recording(self.files.path('missing')))
+
+    def test_replayed_frames_keep_recorded_times(self):
+        self.record()
+        config = Config().load_default()
+        timestamps = [
+            image.timestamp
+            for image in read_frames(config, [self.path, self.path])
+        ]
+        # The second recording follows one loop interval after the first.
+        self.assertEqual([0.0, 1.0, 2.0, 2.1, 3.1, 4.1], [
+            round(timestamp, 6) for timestamp in timestamps])
+
+
+if __name__ == '__main__':
+    unittest.main()
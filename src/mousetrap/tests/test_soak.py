@@ -0,0 +1,66 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import unittest
+
+import numpy
+
+from mousetrap.main import Config
+from mousetrap.tools.frames import EndOfReplay
+from mousetrap.tools.soak import SoakCamera, SoakMonitor, fit_slope
+
+
+class Leaked(object):
+    pass
+
+
+class test_fit_slope(unittest.TestCase):
+
+    def test_fit_slope(self):
+        self.assertAlmostEqual(2.0, fit_slope([(0, 1), (1, 3), (2, 5)]))
+        self.assertEqual(0.0, fit_slope([(0, 1)]))
+        self.assertEqual(0.0, fit_slope([(1, 1), (1, 3)]))
+
+
+class test_SoakCamera(unittest.TestCase):
+
+    def test_cycles_new_images_until_duration(self):
+        frames_cv = [numpy.zeros((4, 4), numpy.uint8)]
+        camera = SoakCamera(Config(), frames_cv, 60)
+        first, second = camera.read_image(), camera.read_image()
+        self.assertIsNot(first, second)
+        self.assertIs(first.to_cv(), second.to_cv())
+        self.assertEqual(2, camera.frame_count)
+
+        camera = SoakCamera(Config(), frames_cv, 0)
+        self.assertRaises(EndOfReplay, camera.read_image)
+
+
+class test_SoakMonitor(unittest.TestCase):
+
+    def test_fails_on_object_growth(self):
+        monitor = SoakMonitor(0, trace_frames=0, types=(Leaked,))
+        leaked = []
+        monitor.start()
+        for frames in range(1, 4):
+            leaked.extend(Leaked() for _count in range(10))
+            monitor.sample(frames)
+        monitor.stop()
+
+        self.assertEqual({'Leaked': 30}, monitor.get_growth()['objects'])
+        self.assertEqual(
+            [], monitor.get_failures(None, None, max_object_growth=30))
+        failures = monitor.get_failures(None, None, max_object_growth=10)
+        self.assertEqual(1, len(failures))
+        self.assertIn('Leaked', failures[0])
+
+    def test_fails_without_enough_samples(self):
+        monitor = SoakMonitor(3600, trace_frames=0, types=(Leaked,))
+        monitor.start()
+        monitor.stop()
+        self.assertEqual(1, len(monitor.get_failures(None, None, None)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import json
+import unittest
+from io import open
+
+from mousetrap.trace import Tracer, NullTracer, NULL_FRAME_TRACE
+from .test_config import Files
+
+
+class test_Tracer(unittest.TestCase):
+
+    def setUp(self):
+        self.files = Files()
+        self.path = self.files.path('trace.json')
+        self.tracer = Tracer(self.path)
+
+    def tearDown(self):
+        self.files.delete()
+
+    def read_events(self):
+        with open(self.path) as trace_file:
+            return json.load(trace_file)
+
+    def test_spans_and_frames_written(self):
+        frame = self.tracer.new_frame()
+        with frame.span('stage', feature='face'):
+            pass
+        self.tracer.end_frame()
+        self.tracer.close()
+
+        events = [e for e in self.read_events() if e['ph'] == 'X']
+        names = [event['name'] for event in events]
+        self.assertEqual(['stage', 'frame 1'], names)
+        self.assertEqual('face', events[0]['args']['feature'])
+        self.assertEqual(1, events[0]['args']['frame'])
+        self.assertNotEqual(events[0]['tid'], events[1]['tid'])
+
+    def test_frame_finished_once(self):
+        frame = self.tracer.new_frame()
+        frame.finish()
+        self.tracer.close()
+
+        events = [e for e in self.read_events() if e['ph'] == 'X']
+        self.assertEqual(1, len(events))
+
+    def test_empty_trace_is_valid(self):
+        self.tracer.close()
+        self.assertIsInstance(self.read_events(), list)
+
+
+class test_NullTracer(unittest.TestCase):
+
+    def test_frames_are_null(self):
+        tracer = NullTracer()
+        frame = tracer.new_frame()
+        self.assertIs(NULL_FRAME_TRACE, frame)
+        with frame.span('stage'):
+            pass
+        tracer.end_frame()
+
+
+if __name__ == '__main__':
+    unittest.main()
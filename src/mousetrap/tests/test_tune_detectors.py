@@ -0,0 +1,84 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+import unittest
+
+from mousetrap.main import Config
+from mousetrap.tools.tune_detectors import Candidate, Tuner, overlap
+from .patches import mock
+
+
+def candidate(scale_factor, mean_seconds, hits, frames=4):
+    result = Candidate(scale_factor, 3, 1.0)
+    for frame in range(frames):
+        result.add(mean_seconds, frame < hits)
+    return result
+
+
+class test_overlap(unittest.TestCase):
+
+    def test_overlap(self):
+        self.assertEqual(1.0, overlap((0, 0, 10, 10), (0, 0, 10, 10)))
+        self.assertEqual(0.0, overlap((0, 0, 10, 10), (20, 20, 10, 10)))
+        self.assertAlmostEqual(
+            50 / 150, overlap((0, 0, 10, 10), (5, 0, 10, 10)))
+
+
+class test_Tuner(unittest.TestCase):
+
+    def setUp(self):
+        self.tuner = Tuner(Config().load_default(), 'face', [], [], [])
+        self.fast = candidate(1.5, 0.001, 2)
+        self.slow = candidate(1.1, 0.010, 4)
+        self.dominated = candidate(1.2, 0.020, 3)
+        self.tuner.candidates = [self.slow, self.dominated, self.fast]
+
+    def test_pareto_front(self):
+        self.assertEqual(
+            [self.fast, self.slow], self.tuner.get_pareto_front())
+
+    def test_choose(self):
+        self.assertIs(self.slow, self.tuner.choose())
+        self.assertIs(self.fast, self.tuner.choose(max_ms=5))
+        self.assertIs(self.fast, self.tuner.choose(min_accuracy=0.5))
+        self.assertIsNone(self.tuner.choose(max_ms=0.5))
+
+    def test_override_covers_every_use(self):
+        override = self.tuner.get_override(self.fast)['classes']
+        self.assertEqual(
+            {'scale_factor': 1.5, 'min_neighbors': 3, 'scale': 1.0},
+            override['mousetrap.plugins.nose.NoseLocator']['face_detector'])
+        self.assertIn('mousetrap.plugins.eyes.LeftEyeLocator', override)
+
+    def test_every_frame_is_searched(self):
+        import cv2
+        import numpy
+        from mousetrap.image import Image
+        from mousetrap.vision import CascadeBackend
+        from .test_vision import draw_face
+        config = Config().load_default()
+        config.load_dict({
+            'temporal_reuse': {'enabled': True},
+            'search_guide': {'enabled': True},
+        })
+        image_cv = numpy.full((480, 640), 120, dtype=numpy.uint8)
+        draw_face(image_cv, 400, 240, 100)
+        image_cv = cv2.GaussianBlur(image_cv, (5, 5), 0)
+        images = [
+            Image(config, image_cv, is_grayscale=True, timestamp=frame / 30.0)
+            for frame in range(6)
+        ]
+        tuner = Tuner(config, 'face', [1.2], [3], [1.0])
+
+        with mock.patch.object(
+                CascadeBackend, 'detect', autospec=True,
+                side_effect=CascadeBackend.detect) as detect:
+            self.assertEqual(6, tuner.run(images))
+
+        self.assertEqual(6, detect.call_count)
+        self.assertEqual(1.0, tuner.candidates[0].get_accuracy())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,5 +13,500 @@ class test_camera(unittest.TestCase):
         self.camera = Camera(Config().load_default())
 
 
+class FakeDevice(object):
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.released = False
+
+    def set(self, prop, value):
+        pass
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        return True, self.frames.pop(0)
+
+    def release(self):
+        self.released = True
+
+
+class test_camera_reconnect(unittest.TestCase):
+
+    def setUp(self):
+        import numpy
+        from .patches import mock
+        self.frame = numpy.zeros((4, 4, 3), dtype=numpy.uint8)
+        self.devices = [FakeDevice([self.frame]), FakeDevice([self.frame])]
+        patcher = mock.patch.object(
+            Camera, '_new_capture_device',
+            side_effect=lambda index: self.devices.pop(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.config = Config().load_default()
+        self.config.load_dict({'camera': {'reconnect': {
+            'initial_delay': 0.0}}})
+
+    def test_reconnects(self):
+        import time
+        camera = Camera(self.config)
+        self.assertIsNotNone(camera.read_image())
+        self.assertIsNone(camera.read_image())
+        self.assertFalse(camera.is_connected())
+
+        camera._reconnect_thread.join(1.0)
+        time.sleep(0.01)
+        self.assertIsNotNone(camera.read_image())
+        stats = camera.get_stats()
+        self.assertTrue(stats['connected'])
+        self.assertEqual(1, stats['disconnects'])
+
+    def test_reconnect_disabled(self):
+        self.config.load_dict({'camera': {'reconnect': {'enabled': False}}})
+        camera = Camera(self.config)
+        camera.read_image()
+        self.assertRaises(IOError, camera.read_image)
+
+
+class test_DetectorBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.config = Config().load_default()
+
+    def test_defaults_to_haar(self):
+        from mousetrap.vision import DetectorBackend, CascadeBackend
+        backend = DetectorBackend.from_config(self.config, 'face')
+        self.assertIsInstance(backend, CascadeBackend)
+
+    def test_configured_backend(self):
+        from mousetrap.vision import DetectorBackend, CascadeBackend
+        self.config.load_dict({'detectors': {'nose': {
+            'backend': 'haar',
+            'file': 'haars/haarcascade_mcs_nose.xml',
+        }}})
+        backend = DetectorBackend.from_config(self.config, 'nose')
+        self.assertIsInstance(backend, CascadeBackend)
+
+    def test_unknown_backend(self):
+        from mousetrap.vision import DetectorBackend, DetectorBackendError
+        self.config.load_dict({'detectors': {'face': {'backend': 'nope'}}})
+        with self.assertRaises(DetectorBackendError):
+            DetectorBackend.from_config(self.config, 'face')
+
+    def test_lbp_needs_file(self):
+        from mousetrap.vision import DetectorBackend, DetectorBackendError
+        self.config.load_dict({'detectors': {'face': {'backend': 'lbp'}}})
+        with self.assertRaises(DetectorBackendError):
+            DetectorBackend.from_config(self.config, 'face')
+
+
+def draw_face(image_cv, center_x, center_y, size):
+    '''Draw a cartoon face the frontal face cascade finds.'''
+    import cv2
+    cv2.ellipse(image_cv, (center_x, center_y),
+                (int(size * 0.42), int(size * 0.55)), 0, 0, 360, 190, -1)
+    for side in (-1, 1):
+        cv2.ellipse(
+            image_cv,
+            (center_x + side * int(size * 0.18),
+             center_y - int(size * 0.12)),
+            (int(size * 0.09), int(size * 0.045)), 0, 0, 360, 40, -1)
+        cv2.line(
+            image_cv,
+            (center_x + side * int(size * 0.08),
+             center_y - int(size * 0.22)),
+            (center_x + side * int(size * 0.3),
+             center_y - int(size * 0.24)),
+            60, int(size * 0.03))
+    cv2.ellipse(image_cv, (center_x, center_y + int(size * 0.28)),
+                (int(size * 0.15), int(size * 0.04)), 0, 0, 360, 70, -1)
+
+
+class test_CascadePrefilter(unittest.TestCase):
+
+    def setUp(self):
+        import cv2
+        import numpy
+        from mousetrap.vision import HaarLoader
+        self.config = Config().load_default()
+        self.loader = HaarLoader(self.config)
+        image_cv = numpy.full((480, 640), 120, dtype=numpy.uint8)
+        draw_face(image_cv, 400, 240, 100)
+        self.image_cv = cv2.GaussianBlur(image_cv, (5, 5), 0)
+
+    def test_truncated_cascades(self):
+        for file_ in ('haars/haarcascade_frontalface_default.xml',
+                      'haars/haarcascade_mcs_nose.xml'):
+            truncated = self.loader.truncated(file_, 3)
+            self.assertFalse(truncated.empty())
+            self.assertIs(truncated, self.loader.truncated(file_, 3))
+            self.assertIsNot(truncated, self.loader.from_file(file_))
+
+    def test_haar_files_entry_with_prefilter(self):
+        from mousetrap.vision import CascadeBackend
+        self.config.load_dict({'haar_files': {'face': {
+            'file': 'haars/haarcascade_frontalface_default.xml',
+            'prefilter': {'stages': 12},
+        }}})
+        backend = CascadeBackend(self.config, 'face', {}, self.loader)
+        self.assertIsNotNone(backend._prefilter)
+
+        regions = backend._prefilter.get_regions(self.image_cv)
+        self.assertTrue(len(regions) >= 1)
+        rects = backend.detect(self.image_cv, 1.1, 3)
+        self.assertEqual(1, len(rects))
+        x, y, width, height = rects[0]
+        self.assertTrue(x < 400 < x + width and y < 240 < y + height)
+
+    def test_nothing_survives(self):
+        import numpy
+        from mousetrap.vision import CascadeBackend
+        backend = CascadeBackend(self.config, 'face', {
+            'file': 'haars/haarcascade_frontalface_default.xml',
+            'prefilter': {'stages': 12},
+        }, self.loader)
+        blank = numpy.full((480, 640), 120, dtype=numpy.uint8)
+        self.assertEqual([], backend._prefilter.get_regions(blank))
+        self.assertEqual(0, len(backend.detect(blank, 1.1, 3)))
+
+
+class test_DetectionSession(unittest.TestCase):
+
+    def setUp(self):
+        from mousetrap.vision import DetectionSession, FeatureDetector
+        self.config = Config().load_default()
+        self.DetectionSession = DetectionSession
+        self.FeatureDetector = FeatureDetector
+
+    def test_detectors_shared_within_session(self):
+        session = self.DetectionSession()
+        with session.activate():
+            first = self.FeatureDetector.get_detector(self.config, 'face')
+            second = self.FeatureDetector.get_detector(self.config, 'face')
+        self.assertIs(first, second)
+
+    def test_detectors_not_shared_between_sessions(self):
+        session1 = self.DetectionSession()
+        session2 = self.DetectionSession()
+        with session1.activate():
+            first = self.FeatureDetector.get_detector(self.config, 'face')
+        with session2.activate():
+            second = self.FeatureDetector.get_detector(self.config, 'face')
+        self.assertIsNot(first, second)
+
+    def test_default_session_outside_activate(self):
+        session = self.DetectionSession()
+        with session.activate():
+            self.assertIs(session, self.DetectionSession.get_current())
+        self.assertIs(
+            self.DetectionSession.get_default(),
+            self.DetectionSession.get_current(),
+        )
+
+    def test_session_is_per_thread(self):
+        import threading
+        session = self.DetectionSession()
+        seen = []
+
+        def current_in_thread():
+            seen.append(self.DetectionSession.get_current())
+
+        with session.activate():
+            thread = threading.Thread(target=current_in_thread)
+            thread.start()
+            thread.join()
+        self.assertIsNot(session, seen[0])
+
+
+class test_FeatureDetector(unittest.TestCase):
+
+    def setUp(self):
+        import numpy
+        from mousetrap.image import Image
+        from mousetrap.vision import FeatureDetector
+        config = Config().load_default()
+        self.detector = FeatureDetector(config, 'face')
+        self.image = Image(
+            config, numpy.zeros((120, 160), dtype=numpy.uint8),
+            is_grayscale=True)
+
+    def test_find_returns_none_on_miss(self):
+        self.assertIsNone(self.detector.find(self.image))
+        self.assertIsNone(self.detector.find(self.image))
+        self.assertEqual(
+            {'attempts': 1, 'hits': 0, 'reused': 0},
+            self.detector.get_stats())
+        self.assertEqual(
+            [(self.image, None)], self.detector.get_cached_results())
+
+    def test_detect_raises_on_miss(self):
+        from mousetrap.vision import FeatureNotFoundException
+        self.assertRaises(
+            FeatureNotFoundException, self.detector.detect, self.image)
+
+    def test_search_region_maps_back_to_image(self):
+        import cv2
+        import numpy
+        from mousetrap.image import Image
+        from mousetrap.vision import FeatureDetector, SearchRegion
+        config = Config().load_default()
+        config.load_dict({
+            'motion_gate': {'enabled': False},
+            'temporal_reuse': {'enabled': False},
+        })
+        face_cv = numpy.full((480, 640), 120, dtype=numpy.uint8)
+        draw_face(face_cv, 400, 240, 100)
+        image = Image(
+            config, cv2.GaussianBlur(face_cv, (5, 5), 0), is_grayscale=True)
+        detector = FeatureDetector(
+            config, 'face', 1.2, 3,
+            search_region=SearchRegion(0.5, 0.0, 0.5, 1.0))
+
+        found = detector.find(image)
+        self.assertIsNotNone(found)
+        x, y, width, height = found.to_rect()
+        self.assertTrue(x < 400 < x + width, found.to_rect())
+        self.assertTrue(y < 240 < y + height, found.to_rect())
+        self.assertEqual(
+            face_cv[y:y + height, x:x + width].shape,
+            found.image.to_cv_grayscale().shape)
+
+
+class test_SearchRegion(unittest.TestCase):
+
+    def setUp(self):
+        import numpy
+        self.image_cv = numpy.zeros((100, 200), dtype=numpy.uint8)
+
+    def test_full_region_is_whole_image(self):
+        from mousetrap.vision import SearchRegion
+        region_cv, offset = SearchRegion.from_config(None).crop(self.image_cv)
+        self.assertIs(self.image_cv, region_cv)
+        self.assertEqual((0, 0), offset)
+
+    def test_crop(self):
+        from mousetrap.vision import SearchRegion
+        region = SearchRegion.from_config(
+            {'x': 0.25, 'y': 0.5, 'width': 0.5, 'height': 0.25})
+        region_cv, offset = region.crop(self.image_cv)
+        self.assertEqual((25, 100), region_cv.shape)
+        self.assertEqual((50, 50), offset)
+
+
+class test_MotionGate(unittest.TestCase):
+
+    def setUp(self):
+        import numpy
+        from mousetrap.image import Image
+        from mousetrap.vision import MotionGate
+        self.numpy = numpy
+        self.config = Config().load_default()
+        self.config.load_dict({'motion_gate': {
+            'enabled': True, 'threshold': 10, 'max_reuse': 2}})
+        self.gate = MotionGate(self.config)
+        self.Image = Image
+
+    def image(self, value):
+        return self.Image(
+            self.config,
+            self.numpy.full((240, 320), value, dtype=self.numpy.uint8),
+            is_grayscale=True,
+        )
+
+    def test_nothing_to_reuse(self):
+        self.assertFalse(self.gate.is_unchanged(self.image(0)))
+
+    def test_reuses_up_to_max(self):
+        self.gate.analysed(self.image(100), 'result')
+        self.assertTrue(self.gate.is_unchanged(self.image(105)))
+        self.assertEqual('result', self.gate.get_result())
+        self.assertTrue(self.gate.is_unchanged(self.image(105)))
+        self.assertFalse(self.gate.is_unchanged(self.image(105)))
+
+    def test_changed_image(self):
+        self.gate.analysed(self.image(100), 'result')
+        self.assertFalse(self.gate.is_unchanged(self.image(150)))
+
+    def test_disabled(self):
+        self.config.load_dict({'motion_gate': {'enabled': False}})
+        gate = self.gate.__class__(self.config)
+        gate.analysed(self.image(100), 'result')
+        self.assertFalse(gate.is_unchanged(self.image(100)))
+
+
+class test_TemporalReuse(unittest.TestCase):
+
+    def setUp(self):
+        import cv2
+        import numpy
+        from mousetrap.image import Image
+        from mousetrap.vision import FeatureDetector
+        self.config = Config().load_default()
+        self.config.load_dict({
+            'motion_gate': {'enabled': False},
+            'temporal_reuse': {
+                'enabled': True, 'max_frames': 2, 'max_seconds': 1.0},
+        })
+        self.detector = FeatureDetector(self.config, 'face', 1.2, 3)
+        face_cv = numpy.full((480, 640), 120, dtype=numpy.uint8)
+        draw_face(face_cv, 400, 240, 100)
+        self.face_cv = cv2.GaussianBlur(face_cv, (5, 5), 0)
+        self.blank_cv = numpy.full((480, 640), 120, dtype=numpy.uint8)
+        self.Image = Image
+
+    def image(self, image_cv, timestamp):
+        return self.Image(
+            self.config, image_cv, is_grayscale=True, timestamp=timestamp)
+
+    def test_reuses_up_to_max_frames(self):
+        found = self.detector.find(self.image(self.face_cv, 0.0))
+        self.assertIsNotNone(found)
+
+        blank = self.image(self.blank_cv, 0.1)
+        reused = self.detector.find(blank)
+        self.assertEqual(found.to_rect(), reused.to_rect())
+        self.assertEqual(0, reused.image.to_cv_grayscale().std())
+        self.assertIsNotNone(
+            self.detector.find(self.image(self.blank_cv, 0.2)))
+        self.assertIsNone(self.detector.find(self.image(self.blank_cv, 0.3)))
+        self.assertEqual(
+            {'attempts': 4, 'hits': 3, 'reused': 2},
+            self.detector.get_stats())
+
+    def test_max_seconds(self):
+        self.detector.find(self.image(self.face_cv, 0.0))
+        self.assertIsNone(self.detector.find(self.image(self.blank_cv, 1.5)))
+
+    def test_refresh_searches_reused_image(self):
+        face = self.image(self.face_cv, 0.0)
+        found = self.detector.find(face)
+        self.assertIs(found, self.detector.refresh(face))
+
+        blank = self.image(self.blank_cv, 0.1)
+        self.assertIsNotNone(self.detector.find(blank))
+        self.assertIsNone(self.detector.refresh(blank))
+        self.assertIsNone(self.detector.find(blank))
+        self.assertIsNone(self.detector.refresh(blank))
+        self.assertEqual(
+            {'attempts': 2, 'hits': 1, 'reused': 0},
+            self.detector.get_stats())
+
+    def test_motion_gate_reuse_crops_new_image(self):
+        from mousetrap.vision import FeatureDetector
+        self.config.load_dict({
+            'motion_gate': {'enabled': True, 'threshold': 10},
+            'temporal_reuse': {'enabled': False},
+        })
+        detector = FeatureDetector(self.config, 'face', 1.2, 3)
+        found = detector.find(self.image(self.face_cv, 0.0))
+        brighter = self.image(self.face_cv + 5, 0.1)
+
+        reused = detector.find(brighter)
+        self.assertEqual(1, detector.get_stats()['reused'])
+        self.assertEqual(found.to_rect(), reused.to_rect())
+        x, y, width, height = reused.to_rect()
+        crop_cv = brighter.to_cv_grayscale()[y:y + height, x:x + width]
+        self.assertTrue((reused.image.to_cv_grayscale() == crop_cv).all())
+
+
+class test_SearchGuide(unittest.TestCase):
+
+    def setUp(self):
+        import numpy
+        from mousetrap.image import Image
+        from mousetrap.vision import Detection, SearchGuide
+        self.numpy = numpy
+        self.Image = Image
+        self.Detection = Detection
+        self.config = Config().load_default()
+        self.config.load_dict({'search_guide': {
+            'enabled': True, 'mask': 'motion', 'full_scan_every': 3,
+            'margin': 0.0, 'width': 80}})
+        self.guide = SearchGuide(self.config, 'face')
+
+    def image(self, blob=None):
+        image_cv = self.numpy.zeros((120, 160), dtype=self.numpy.uint8)
+        if blob is not None:
+            x, y, width, height = blob
+            image_cv[y:y + height, x:x + width] = 255
+        return self.Image(self.config, image_cv, is_grayscale=True)
+
+    def test_searches_around_motion(self):
+        self.assertIsNone(self.guide.get_regions(self.image()))
+        self.assertEqual([], self.guide.get_regions(self.image()))
+        regions = self.guide.get_regions(self.image((40, 20, 40, 40)))
+        self.assertEqual(1, len(regions))
+        x, y, width, height = regions[0]
+        self.assertTrue(x <= 40 and y <= 20)
+        self.assertTrue(x + width >= 80 and y + height >= 60)
+        self.assertTrue(width * height < 160 * 120 // 4)
+
+    def test_full_scan_periodically_and_when_lost(self):
+        results = [self.guide.get_regions(self.image()) for _i in range(5)]
+        self.assertEqual([None, [], [], [], None], results)
+
+        found = self.Detection(
+            self.config, self.image(), self.numpy.array([[10, 10, 20, 20]]))
+        self.guide.analysed(found)
+        self.assertEqual([(10, 10, 20, 20)],
+                         self.guide.get_regions(self.image()))
+        self.guide.analysed(None)
+        self.assertIsNone(self.guide.get_regions(self.image()))
+
+    def test_only_configured_features(self):
+        from mousetrap.vision import SearchGuide
+        guide = SearchGuide(self.config, 'nose')
+        for _i in range(3):
+            self.assertIsNone(guide.get_regions(self.image()))
+
+    def test_merge_rects(self):
+        from mousetrap.vision import _merge_rects
+        self.assertEqual(
+            [(0, 0, 15, 15), (30, 30, 5, 5)],
+            _merge_rects([(0, 0, 10, 10), (30, 30, 5, 5), (5, 5, 10, 10)]))
+
+
+class test_Detection(unittest.TestCase):
+
+    def setUp(self):
+        import numpy
+        from mousetrap.image import Image
+        from mousetrap.vision import Detection
+        self.config = Config().load_default()
+        image_cv = numpy.arange(100 * 100, dtype=numpy.uint32) \
+            .reshape((100, 100)).astype(numpy.uint8)
+        self.source = Image(self.config, image_cv, is_grayscale=True)
+        self.candidates = numpy.array([
+            [10, 20, 30, 40],
+            [50, 50, 40, 40],
+            [0, 0, 10, 10],
+        ])
+        self.detection = Detection(self.config, self.source, self.candidates)
+
+    def test_first_candidate(self):
+        self.assertEqual((10, 20, 30, 40), self.detection.to_rect())
+        self.assertEqual((25, 40), (
+            self.detection.center_x, self.detection.center_y))
+
+    def test_lazy_shared_crop(self):
+        image = self.detection.image
+        self.assertIs(image, self.detection.image)
+        self.assertEqual((40, 30), image.to_cv_grayscale().shape)
+
+    def test_dict_access(self):
+        self.assertEqual(10, self.detection['x'])
+        self.assertEqual({'x': 25, 'y': 40}, self.detection['center'])
+        self.assertIs(self.detection.image, self.detection['image'])
+        self.assertRaises(KeyError, lambda: self.detection['missing'])
+
+    def test_select(self):
+        self.assertEqual(
+            (50, 50, 40, 40), self.detection.select_largest().to_rect())
+        self.assertEqual(
+            (0, 0, 10, 10), self.detection.select_nearest(3, 3).to_rect())
+        self.assertIs(
+            self.detection, self.detection.select_nearest(25, 40))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,7 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Command line tools for measuring and tuning MouseTrap offline.
+'''
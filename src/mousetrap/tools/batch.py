@@ -0,0 +1,198 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Runs the full assembly headlessly over many recordings in parallel.
+
+    mousetrap-batch --jobs 4 --json report.json recordings/*.avi
+
+Each recording runs in its own worker process at full speed with a
+NullPointer. The report gives, per recording and overall, detector hit
+rates, frames per second and the simulated pointer's trajectory and
+clicks.
+'''
+
+from argparse import ArgumentParser
+import json
+import logging
+import multiprocessing
+import sys
+import traceback
+
+from mousetrap.compat import timer
+from mousetrap.config import Config
+from mousetrap.tools.headless import build_app, run_to_end
+
+
+def run_recording(job):
+    '''Worker: run one recording and return its report as a dict.'''
+    config_paths, path, max_frames = job
+    report = {'recording': path}
+    try:
+        config = Config().load(config_paths)
+        app = build_app(config, [path], max_frames)
+        frames, seconds = run_to_end(app)
+        report.update({
+            'frames': frames,
+            'seconds': seconds,
+            'frames_per_second': frames / seconds if seconds else 0.0,
+            'detectors': _with_hit_rates(app.session.get_stats()),
+            'clicks': [frame for frame, _button in app.pointer.clicks],
+            'trajectory': app.pointer.trajectory,
+        })
+    except Exception:
+        report['error'] = traceback.format_exc()
+    return report
+
+
+def _with_hit_rates(detector_stats):
+    for stats in detector_stats.values():
+        attempts = stats['attempts']
+        stats['hit_rate'] = stats['hits'] / attempts if attempts else 0.0
+    return detector_stats
+
+
+def summarize(reports, wall_seconds):
+    '''Combine per recording reports into overall totals.'''
+    completed = [report for report in reports if 'error' not in report]
+    frames = sum(report['frames'] for report in completed)
+    seconds = sum(report['seconds'] for report in completed)
+    detectors = {}
+    for report in completed:
+        for name, stats in report['detectors'].items():
+            totals = detectors.setdefault(
+                name, {'attempts': 0, 'hits': 0, 'reused': 0})
+            for key in totals:
+                totals[key] += stats[key]
+    return {
+        'recordings': len(reports),
+        'failed': len(reports) - len(completed),
+        'frames': frames,
+        'seconds': seconds,
+        'wall_seconds': wall_seconds,
+        'frames_per_second': frames / seconds if seconds else 0.0,
+        'frames_per_wall_second':
+            frames / wall_seconds if wall_seconds else 0.0,
+        'clicks': sum(len(report['clicks']) for report in completed),
+        'detectors': _with_hit_rates(detectors),
+    }
+
+
+def format_report(reports, overall):
+    names = sorted(overall['detectors'])
+    header = '%-40s %7s %8s %7s ' % ('recording', 'frames', 'fps', 'clicks')
+    lines = [header + ' '.join('%9s' % name for name in names)]
+    for report in reports:
+        if 'error' in report:
+            lines.append('%-40s FAILED' % report['recording'])
+            continue
+        totals = '%-40s %7d %8.1f %7d ' % (
+            report['recording'][-40:],
+            report['frames'],
+            report['frames_per_second'],
+            len(report['clicks']),
+        )
+        hit_rates = ' '.join(
+            '%8.1f%%' % (100.0 * report['detectors'][name]['hit_rate'])
+            if name in report['detectors'] else '%9s' % '-'
+            for name in names
+        )
+        lines.append(totals + hit_rates)
+    totals = '%-40s %7d %8.1f %7d ' % (
+        'overall',
+        overall['frames'],
+        overall['frames_per_second'],
+        overall['clicks'],
+    )
+    hit_rates = ' '.join(
+        '%8.1f%%' % (100.0 * overall['detectors'][name]['hit_rate'])
+        for name in names
+    )
+    lines.append(totals + hit_rates)
+    lines.append(
+        '%d recordings (%d failed) in %.1f s, %.1f frames per second overall'
+        % (
+            overall['recordings'],
+            overall['failed'],
+            overall['wall_seconds'],
+            overall['frames_per_wall_second'],
+        )
+    )
+    return '\n'.join(lines)
+
+
+class CommandLineArguments(object):
+    def __init__(self, argv=None):
+        parser = ArgumentParser(
+            description='Run the assembly over recordings in parallel.')
+        parser.add_argument(
+            'recordings',
+            nargs='+',
+            metavar='PATH',
+            help='Video file, image file or directory of images.'
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help='Number of worker processes. Default: number of CPUs.'
+        )
+        parser.add_argument(
+            '--max-frames',
+            type=int,
+            help='Stop each recording after this many frames.'
+        )
+        parser.add_argument(
+            '--config',
+            metavar='FILE',
+            help='Loads configuration from FILE.'
+        )
+        parser.add_argument(
+            '--json',
+            metavar='FILE',
+            help='Writes the full report, with trajectories, to FILE.'
+        )
+        parser.parse_args(argv, namespace=self)
+
+
+def main(argv=None):
+    args = CommandLineArguments(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    config_paths = [Config.DEFAULT_PATH]
+    if args.config is not None:
+        config_paths.append(args.config)
+
+    jobs = [
+        (config_paths, path, args.max_frames) for path in args.recordings
+    ]
+
+    begin = timer()
+    pool = multiprocessing.Pool(max(1, min(args.jobs, len(jobs))))
+    try:
+        reports = pool.map(run_recording, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    overall = summarize(reports, timer() - begin)
+
+    print(format_report(reports, overall))
+    for report in reports:
+        if 'error' in report:
+            sys.stderr.write('%s:\n%s\n' % (
+                report['recording'], report['error']))
+
+    if args.json is not None:
+        with open(args.json, 'w') as json_file:
+            json.dump(
+                {'recordings': reports, 'overall': overall},
+                json_file,
+                indent=2,
+            )
+
+    return 1 if overall['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
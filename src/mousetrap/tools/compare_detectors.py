@@ -0,0 +1,295 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Compares the speed and hit rate of detector backends on recorded frames.
+
+    mousetrap-compare-detectors --feature face \
+        --backend haar \
+        --backend lbp:lbpcascades/lbpcascade_frontalface.xml \
+        --backend haar@5 \
+        session.avi
+
+For secondary features, --within face runs each backend inside the face
+found with the face backend of the configuration, at --within-scale-factor
+and --within-min-neighbors, as the locators do. Motion gating, temporal
+reuse and search guides are off, so every frame is searched.
+
+A cascade backend followed by @STAGES searches in two stages: a coarse scan
+with the first STAGES stages of the cascade, then the full cascade around
+what it finds (see vision.CascadePrefilter). Recall is the fraction of the
+frames where the first backend found the feature that each backend found it
+in too.
+'''
+
+from argparse import ArgumentParser
+import json
+import sys
+
+from mousetrap.compat import timer
+from mousetrap.config import Config
+from mousetrap.tools.frames import read_frames
+from mousetrap.vision import DetectorBackend, FeatureDetector, HaarLoader
+
+
+MILLISECONDS_PER_SECOND = 1000.0
+
+
+class BackendResult(object):
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.durations = []
+        self.hit_frames = []
+        self.hits = 0
+
+    def add(self, duration, hit):
+        self.durations.append(duration)
+        self.hit_frames.append(hit)
+        if hit:
+            self.hits += 1
+
+    def get_recall(self, reference):
+        '''Fraction of reference's hits that are hits here too.'''
+        both = sum(
+            1 for hit, reference_hit in zip(
+                self.hit_frames, reference.hit_frames)
+            if hit and reference_hit
+        )
+        return both / reference.hits if reference.hits else 0.0
+
+    def to_dict(self, reference=None):
+        frames = len(self.durations)
+        durations = sorted(self.durations)
+        if reference is None:
+            reference = self
+        return {
+            'backend': self.spec,
+            'frames': frames,
+            'hits': self.hits,
+            'hit_rate': self.hits / frames if frames else 0.0,
+            'recall': self.get_recall(reference),
+            'mean_ms': _milliseconds(sum(durations) / frames)
+            if frames else 0.0,
+            'median_ms': _milliseconds(_percentile(durations, 0.5)),
+            'p95_ms': _milliseconds(_percentile(durations, 0.95)),
+        }
+
+
+class Comparison(object):
+
+    def __init__(self, config, feature, specs, within=None,
+                 scale_factor=1.1, min_neighbors=3,
+                 within_scale_factor=1.5, within_min_neighbors=5):
+        # The within detector must search every frame, not reuse results.
+        config.load_dict({
+            'motion_gate': {'enabled': False},
+            'temporal_reuse': {'enabled': False},
+            'search_guide': {'enabled': False},
+        })
+        self._config = config
+        self._feature = feature
+        self._scale_factor = scale_factor
+        self._min_neighbors = min_neighbors
+        self._backends = [
+            (parse_backend_spec(config, feature, spec), BackendResult(spec))
+            for spec in specs
+        ]
+        self._within_detector = None
+        if within is not None:
+            self._within_detector = FeatureDetector(
+                config,
+                within,
+                scale_factor=within_scale_factor,
+                min_neighbors=within_min_neighbors,
+            )
+        self.skipped_frames = 0
+
+    def add_frame(self, image):
+        search_image = self._get_search_image(image)
+
+        if search_image is None:
+            self.skipped_frames += 1
+            return
+
+        for backend, result in self._backends:
+            begin = timer()
+            rects = backend.detect(
+                search_image, self._scale_factor, self._min_neighbors)
+            result.add(timer() - begin, len(rects) > 0)
+
+    def _get_search_image(self, image):
+        if self._within_detector is None:
+            return image.to_cv_grayscale()
+
+        within = self._within_detector.find(image)
+        if within is None:
+            return None
+        return within.image.to_cv_grayscale()
+
+    def get_results(self):
+        reference = self._backends[0][1]
+        return [
+            result.to_dict(reference) for _backend, result in self._backends
+        ]
+
+
+def parse_backend_spec(config, feature, spec):
+    '''Build a backend from "NAME", "NAME:FILE", "NAME@STAGES" or
+    "NAME:FILE@STAGES".'''
+    settings = {}
+    name_file, _at, stages = spec.partition('@')
+    if ':' in name_file:
+        backend_name, settings['file'] = name_file.split(':', 1)
+    else:
+        backend_name = name_file
+    settings['backend'] = backend_name
+    if stages:
+        if 'file' not in settings:
+            settings['file'] = HaarLoader(config).get_file(feature)
+        settings['prefilter'] = {'stages': int(stages)}
+    return DetectorBackend.create(config, feature, settings)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def _milliseconds(seconds):
+    return seconds * MILLISECONDS_PER_SECOND
+
+
+def format_results(results, skipped_frames=0):
+    lines = [
+        '%-50s %7s %7s %8s %7s %9s %9s %9s' % (
+            'backend', 'frames', 'hits', 'hit rate', 'recall',
+            'mean ms', 'median ms', 'p95 ms'),
+    ]
+    for result in results:
+        lines.append('%-50s %7d %7d %7.1f%% %6.1f%% %9.2f %9.2f %9.2f' % (
+            result['backend'],
+            result['frames'],
+            result['hits'],
+            100.0 * result['hit_rate'],
+            100.0 * result['recall'],
+            result['mean_ms'],
+            result['median_ms'],
+            result['p95_ms'],
+        ))
+    if skipped_frames:
+        lines.append(
+            '(%d frames skipped: reference feature not found)' %
+            skipped_frames)
+    return '\n'.join(lines)
+
+
+class CommandLineArguments(object):
+    def __init__(self, argv=None):
+        parser = ArgumentParser(
+            description='Compare detector backends on recorded frames.')
+        parser.add_argument(
+            'frames',
+            nargs='+',
+            metavar='PATH',
+            help='Video file, image file or directory of images.'
+        )
+        parser.add_argument(
+            '--feature',
+            default='face',
+            help='Feature to detect. Default: face.'
+        )
+        parser.add_argument(
+            '--backend',
+            dest='backends',
+            action='append',
+            metavar='NAME[:FILE][@STAGES]',
+            help=(
+                'Backend to compare, one of %s. May be given more than '
+                'once.' % ', '.join(DetectorBackend.get_names())
+            )
+        )
+        parser.add_argument(
+            '--within',
+            metavar='FEATURE',
+            help='Search inside FEATURE, found with its configured backend '
+                 'at --within-scale-factor and --within-min-neighbors.'
+        )
+        parser.add_argument(
+            '--within-scale-factor',
+            type=float,
+            default=1.5,
+            help='Scale factor for finding FEATURE. Default: 1.5.'
+        )
+        parser.add_argument(
+            '--within-min-neighbors',
+            type=int,
+            default=5,
+            help='Minimum neighbors for finding FEATURE. Default: 5.'
+        )
+        parser.add_argument(
+            '--scale-factor',
+            type=float,
+            default=1.1,
+        )
+        parser.add_argument(
+            '--min-neighbors',
+            type=int,
+            default=3,
+        )
+        parser.add_argument(
+            '--max-frames',
+            type=int,
+        )
+        parser.add_argument(
+            '--config',
+            metavar='FILE',
+            help='Loads configuration from FILE.'
+        )
+        parser.add_argument(
+            '--json',
+            metavar='FILE',
+            help='Also writes the results to FILE as JSON.'
+        )
+        parser.parse_args(argv, namespace=self)
+
+
+def load_config(config_path=None):
+    config = Config().load_default()
+    if config_path is not None:
+        config.load_path(config_path)
+    return config
+
+
+def main(argv=None):
+    args = CommandLineArguments(argv)
+    config = load_config(args.config)
+    comparison = Comparison(
+        config,
+        args.feature,
+        args.backends or ['haar'],
+        within=args.within,
+        scale_factor=args.scale_factor,
+        min_neighbors=args.min_neighbors,
+        within_scale_factor=args.within_scale_factor,
+        within_min_neighbors=args.within_min_neighbors,
+    )
+
+    for image in read_frames(config, args.frames, args.max_frames):
+        comparison.add_frame(image)
+
+    results = comparison.get_results()
+    print(format_results(results, comparison.skipped_frames))
+
+    if args.json is not None:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Queries and tunes a running MouseTrap through its ControlPlugin.
+
+    mousetrap-control stats
+    mousetrap-control set-loops-per-second 5
+    mousetrap-control set-detector face --scale-factor 1.3 --min-neighbors 4
+    mousetrap-control disable EyesPlugin
+'''
+
+from argparse import ArgumentParser
+import json
+import socket
+import sys
+
+from mousetrap.control import get_default_socket_path, send_request
+
+
+class CommandLineArguments(object):
+    def __init__(self, argv=None):
+        parser = ArgumentParser(
+            description='Query and tune a running MouseTrap.')
+        parser.add_argument(
+            '--socket',
+            default=get_default_socket_path(),
+            help='Control socket. Default: %(default)s.'
+        )
+        commands = parser.add_subparsers(dest='command')
+        commands.required = True
+
+        commands.add_parser(
+            'stats', help='Loop rate, plugin timings, detector hit rates.')
+
+        rate = commands.add_parser(
+            'set-loops-per-second',
+            help='Change the base loop rate, which power modes scale from.')
+        rate.add_argument('value', type=float)
+
+        detector = commands.add_parser(
+            'set-detector', help='Change the detectors of a feature.')
+        detector.add_argument('feature')
+        detector.add_argument('--scale-factor', type=float)
+        detector.add_argument('--min-neighbors', type=int)
+        detector.add_argument('--scale', type=float)
+
+        for name in ('enable', 'disable'):
+            plugin = commands.add_parser(
+                name, help='%s a plugin.' % name.capitalize())
+            plugin.add_argument(
+                'name', help='Plugin class path or class name.')
+
+        parser.parse_args(argv, namespace=self)
+
+    def to_request(self):
+        if self.command == 'stats':
+            return {'command': 'stats'}
+        if self.command == 'set-loops-per-second':
+            return {'command': 'set_loops_per_second', 'value': self.value}
+        if self.command == 'set-detector':
+            return {
+                'command': 'set_detector',
+                'feature': self.feature,
+                'scale_factor': self.scale_factor,
+                'min_neighbors': self.min_neighbors,
+                'scale': self.scale,
+            }
+        return {'command': self.command + '_plugin', 'name': self.name}
+
+
+def main(argv=None):
+    args = CommandLineArguments(argv)
+    try:
+        response = send_request(args.socket, args.to_request())
+    except socket.error as error:
+        print('Could not reach MouseTrap at %s: %s. Is ControlPlugin in '
+              'the assembly?' % (args.socket, error), file=sys.stderr)
+        return 2
+
+    if not response.get('ok'):
+        print(response.get('error'), file=sys.stderr)
+        return 1
+
+    print(json.dumps(response['result'], indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Runs a detection server for the MouseTrap instances of this machine to
+share. Set detect_server's client to true in their configuration.
+
+    mousetrap-detect-server --workers 2
+'''
+
+from argparse import ArgumentParser
+import logging
+import signal
+import sys
+
+from mousetrap.config import Config
+from mousetrap.detectserver import DetectServer, get_default_socket_path
+
+
+class CommandLineArguments(object):
+    def __init__(self, argv=None):
+        parser = ArgumentParser(
+            description='Run a detection server for MouseTrap instances to '
+                        'share.')
+        parser.add_argument(
+            '--socket',
+            help="Socket to listen on. Default: detect_server's path, or "
+                 "%s (%s if shared)." % (
+                     get_default_socket_path(), get_default_socket_path(True))
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help="Worker threads. Default: detect_server's workers."
+        )
+        parser.add_argument(
+            '--max-batch',
+            type=int,
+            help="Requests a worker takes at a time. Default: "
+                 "detect_server's max_batch."
+        )
+        parser.add_argument(
+            '--shared',
+            action='store_true',
+            default=None,
+            help='Let other users connect.'
+        )
+        parser.add_argument(
+            '--config',
+            metavar='FILE',
+            help='Loads configuration from FILE.'
+        )
+        parser.parse_args(argv, namespace=self)
+
+    def get_overrides(self):
+        overrides = {
+            'path': self.socket,
+            'workers': self.workers,
+            'max_batch': self.max_batch,
+            'shared': self.shared,
+        }
+        return dict(
+            (key, value) for key, value in overrides.items()
+            if value is not None
+        )
+
+
+def main(argv=None):
+    args = CommandLineArguments(argv)
+
+    config_paths = [Config.DEFAULT_PATH]
+    if args.config is not None:
+        config_paths.append(args.config)
+    config = Config().load(config_paths)
+    config.load_dict({'detect_server': args.get_overrides()})
+    logging.basicConfig(level=logging.INFO)
+
+    server_config = config['detect_server']
+    path = server_config.get('path') or get_default_socket_path(
+        server_config.get('shared', False))
+    server = DetectServer(config, path)
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(
+            signal_number, lambda signal_number, frame: server.stop())
+    print('Listening on %s' % path)
+    try:
+        server.wait()
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Reading recorded frames for the offline tools.
+'''
+
+import itertools
+import os
+
+import cv2
+
+from mousetrap.image import Image
+from mousetrap.recording import RecordingReader, is_recording
+from mousetrap.trace import get_tracer
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.pgm', '.ppm')
+
+
+def read_frames(config, paths, max_frames=None):
+    '''
+    Yield an Image for each frame found in paths. A path may be a session
+    recording, a video file, an image file or a directory of image files
+    (read in name order).
+
+    Image timestamps are the frames' times in the recording, not when they
+    were read, so replays decide as the live loop did: they come from the
+    session recording, from the video's frame rate or, for images, from
+    loops_per_second. Each path follows on from the one before.
+    '''
+    period = 1.0 / config['loops_per_second']
+    start = 0.0
+    count = 0
+    for path in paths:
+        timestamp = None
+        for index, (seconds, image_cv) in enumerate(_read_path(path)):
+            if max_frames is not None and count >= max_frames:
+                return
+            count += 1
+            if seconds is None:
+                seconds = index * period
+            timestamp = start + seconds
+            yield Image(
+                config, image_cv, is_grayscale=image_cv.ndim == 2,
+                timestamp=timestamp,
+            )
+        if timestamp is not None:
+            start = timestamp + period
+
+
+class ReplayCamera(object):
+    '''
+    Stands in for vision.Camera, replaying recorded frames as fast as they
+    are read. Raises EndOfReplay after the last frame.
+    '''
+
+    def __init__(self, config, paths, max_frames=None):
+        self._config = config
+        self._frames = read_frames(config, paths, max_frames)
+        self.frame_count = 0
+
+    def set_dimensions(self, width, height):
+        pass
+
+    def reduce_dimensions(self, requester, width, height):
+        pass
+
+    def restore_dimensions(self, requester):
+        pass
+
+    def read_image(self):
+        try:
+            image = next(self._frames)
+        except StopIteration:
+            raise EndOfReplay()
+
+        image.trace = get_tracer().new_frame()
+        self.frame_count += 1
+
+        return image
+
+
+class EndOfReplay(Exception):
+    pass
+
+
+def _read_path(path):
+    '''
+    Yield (seconds, image_cv) for each frame of path. seconds is the time
+    of the frame from the first, or None if path does not say.
+    '''
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if _is_image_file(name):
+                for image_cv in _read_image_file(os.path.join(path, name)):
+                    yield None, image_cv
+    elif _is_image_file(path):
+        for image_cv in _read_image_file(path):
+            yield None, image_cv
+    elif is_recording(path):
+        for frame in _read_recording(path):
+            yield frame
+    else:
+        for frame in _read_video_file(path):
+            yield frame
+
+
+def _is_image_file(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _read_image_file(path):
+    image_cv = cv2.imread(path)
+    if image_cv is None:
+        raise IOError('Could not read image: %s' % path)
+    yield image_cv
+
+
+def _read_video_file(path):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError('Could not open video: %s' % path)
+    frames_per_second = capture.get(cv2.CAP_PROP_FPS)
+    try:
+        for index in itertools.count():
+            ret, image_cv = capture.read()
+            if not ret:
+                break
+            if frames_per_second > 0:
+                yield index / frames_per_second, image_cv
+            else:
+                yield None, image_cv
+    finally:
+        capture.release()
+
+
+def _read_recording(path):
+    with RecordingReader(path) as reader:
+        first = None
+        for index in range(len(reader)):
+            timestamp, image_cv = _copy_frame(reader, index)
+            if first is None:
+                first = timestamp
+            yield timestamp - first, image_cv
+
+
+def _copy_frame(reader, index):
+    # Copied: frames must outlive the reader's memory map.
+    _sequence, timestamp, image_cv = reader.get_frame(index)
+    return timestamp, image_cv.copy()
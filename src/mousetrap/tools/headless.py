@@ -0,0 +1,43 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Running the full assembly over recorded frames, without a display.
+'''
+
+from mousetrap.compat import timer
+from mousetrap.core import App
+from mousetrap.gui import NullGui, NullPointer
+from mousetrap.tools.frames import EndOfReplay, ReplayCamera
+
+
+def build_app(config, paths, max_frames=None):
+    '''
+    Build an App that reads its frames from paths and moves a NullPointer.
+    '''
+    return App(
+        config,
+        camera=ReplayCamera(config, paths, max_frames),
+        pointer=NullPointer(config),
+        gui=NullGui(config),
+    )
+
+
+def run_to_end(app, on_pass=None):
+    '''
+    Run passes of app's loop as fast as possible until its frames run out.
+    on_pass, if given, is called with the number of passes run so far after
+    each pass. Return the number of frames read and the seconds taken.
+    '''
+    passes = 0
+    begin = timer()
+    try:
+        while True:
+            app.loop.step()
+            passes += 1
+            if on_pass is not None:
+                on_pass(passes)
+    except EndOfReplay:
+        pass
+    return app.camera.frame_count, timer() - begin
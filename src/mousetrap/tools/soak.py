@@ -0,0 +1,452 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Soak test: runs the full assembly over recorded frames, over and over, for a
+long time at full speed, and watches memory for leaks.
+
+    mousetrap-soak --duration 3600 --json soak.json session.avi
+
+The recorded frames are decoded once and replayed in a cycle, each wrapped
+in a new Image as the camera would, and the pointer does not keep its
+trajectory. Every --sample-every seconds the process's resident set size,
+the memory traced by tracemalloc (Python 3, leaving out the soak test's own)
+and the number of live objects of the types in TRACKED_TYPES are sampled.
+
+Samples taken during --warmup seconds are left out while caches fill. A
+line is fitted through the rest: the soak fails if resident or traced
+memory grows faster than --max-rss-growth or --max-traced-growth KiB per
+minute, or if the number of live objects of a tracked type grows by more
+than --max-object-growth. The report lists the call sites that allocated
+the most memory after the warmup.
+'''
+
+from argparse import ArgumentParser
+import gc
+import itertools
+import json
+import logging
+import os
+import sys
+
+from mousetrap.compat import timer
+from mousetrap.config import Config
+from mousetrap.core import App
+from mousetrap.gui import NullGui, NullPointer
+from mousetrap.image import Image
+from mousetrap.tools.frames import EndOfReplay, read_frames
+from mousetrap.tools.headless import run_to_end
+from mousetrap.trace import get_tracer
+from mousetrap.vision import Detection, FeatureNotFoundException
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+KIB = 1024
+SECONDS_PER_MINUTE = 60.0
+TRACKED_TYPES = (Image, Detection, FeatureNotFoundException)
+
+
+class SoakCamera(object):
+    '''
+    Stands in for vision.Camera, cycling through frames until duration
+    seconds have passed, then raises EndOfReplay.
+    '''
+
+    def __init__(self, config, frames_cv, duration):
+        self._config = config
+        self._frames_cv = itertools.cycle(frames_cv)
+        self._end = timer() + duration
+        self.frame_count = 0
+
+    def set_dimensions(self, width, height):
+        pass
+
+    def reduce_dimensions(self, requester, width, height):
+        pass
+
+    def restore_dimensions(self, requester):
+        pass
+
+    def read_image(self):
+        if timer() >= self._end:
+            raise EndOfReplay()
+
+        image_cv = next(self._frames_cv)
+        image = Image(
+            self._config, image_cv, is_grayscale=image_cv.ndim == 2,
+            trace=get_tracer().new_frame(),
+        )
+        self.frame_count += 1
+
+        return image
+
+
+def get_rss_bytes():
+    '''Resident set size of this process, or None where unknown.'''
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf(str('SC_PAGE_SIZE'))
+
+
+def count_objects(types=TRACKED_TYPES):
+    '''Number of live objects of each of types, by type name.'''
+    counts = dict((type_.__name__, 0) for type_ in types)
+    for obj in gc.get_objects():
+        if isinstance(obj, types):
+            counts[type(obj).__name__] = \
+                counts.get(type(obj).__name__, 0) + 1
+    return counts
+
+
+def fit_slope(points):
+    '''Least squares slope of y over x through points [(x, y), ...].'''
+    if len(points) < 2:
+        return 0.0
+    count = len(points)
+    mean_x = sum(x for x, _y in points) / count
+    mean_y = sum(y for _x, y in points) / count
+    variance = sum((x - mean_x) ** 2 for x, _y in points)
+    if variance == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+class Sample(object):
+
+    def __init__(self, seconds, frames, rss, traced, objects):
+        self.seconds = seconds
+        self.frames = frames
+        self.rss = rss
+        self.traced = traced
+        self.objects = objects
+
+    def to_dict(self):
+        return {
+            'seconds': self.seconds,
+            'frames': self.frames,
+            'rss': self.rss,
+            'traced': self.traced,
+            'objects': self.objects,
+        }
+
+
+class SoakMonitor(object):
+    '''Takes memory samples and decides whether memory keeps growing.'''
+
+    def __init__(self, warmup, trace_frames=10, types=TRACKED_TYPES):
+        '''
+        warmup - seconds from start before samples count towards growth.
+        trace_frames - frames of stack tracemalloc keeps per allocation, 0
+                       not to use tracemalloc.
+        '''
+        self._warmup = warmup
+        self._types = types
+        self._trace = tracemalloc is not None and trace_frames > 0
+        self._trace_frames = trace_frames
+        self._started_tracing = False
+        self._begin = None
+        self._warmup_snapshot = None
+        self._final_snapshot = None
+        self.samples = []
+
+    def start(self):
+        if self._trace and not tracemalloc.is_tracing():
+            tracemalloc.start(self._trace_frames)
+            self._started_tracing = True
+        self._begin = timer()
+        self.sample(0)
+
+    def stop(self):
+        if self._warmup_snapshot is not None:
+            self._final_snapshot = self._take_snapshot()
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    def sample(self, frames):
+        seconds = timer() - self._begin
+        gc.collect()
+        snapshot = traced = None
+        if self._trace:
+            snapshot = self._take_snapshot()
+            traced = sum(
+                statistic.size
+                for statistic in snapshot.statistics('filename'))
+        self.samples.append(Sample(
+            seconds, frames, get_rss_bytes(), traced,
+            count_objects(self._types),
+        ))
+        if snapshot is not None and self._warmup_snapshot is None and \
+                seconds >= self._warmup:
+            self._warmup_snapshot = snapshot
+
+    def get_steady_samples(self):
+        return [
+            sample for sample in self.samples
+            if sample.seconds >= self._warmup
+        ]
+
+    def get_growth(self):
+        '''
+        Growth after the warmup: rss and traced in bytes per minute (None
+        if not measured), objects as the change in count per type.
+        '''
+        steady = self.get_steady_samples()
+        growth = {'rss': None, 'traced': None, 'objects': {}}
+        for key in ('rss', 'traced'):
+            points = [
+                (sample.seconds / SECONDS_PER_MINUTE, getattr(sample, key))
+                for sample in steady if getattr(sample, key) is not None
+            ]
+            if len(points) >= 2:
+                growth[key] = fit_slope(points)
+        if len(steady) >= 2:
+            first, last = steady[0].objects, steady[-1].objects
+            growth['objects'] = dict(
+                (name, last.get(name, 0) - first.get(name, 0))
+                for name in last
+            )
+        return growth
+
+    def get_failures(self, max_rss_growth, max_traced_growth,
+                     max_object_growth):
+        '''
+        Messages for each limit exceeded after the warmup. Growth limits
+        are in bytes per minute; None disables a limit.
+        '''
+        growth = self.get_growth()
+        failures = []
+        for key, limit in (('rss', max_rss_growth),
+                           ('traced', max_traced_growth)):
+            if limit is not None and growth[key] is not None and \
+                    growth[key] > limit:
+                failures.append(
+                    '%s memory grew %.1f KiB/min (limit %.1f)' % (
+                        key, growth[key] / KIB, limit / KIB))
+        if max_object_growth is not None:
+            for name, count in sorted(growth['objects'].items()):
+                if count > max_object_growth:
+                    failures.append(
+                        '%d more live %s objects (limit %d)' % (
+                            count, name, max_object_growth))
+        if len(self.get_steady_samples()) < 2:
+            failures.append('too few samples after the warmup to judge')
+        return failures
+
+    def get_top_allocations(self, limit=10):
+        '''
+        The limit call sites whose allocated memory grew most since the
+        warmup until stop, as (site, size difference in bytes, count
+        difference).
+        '''
+        if self._final_snapshot is None:
+            return []
+        statistics = self._final_snapshot.compare_to(
+            self._warmup_snapshot, 'lineno')
+        return [
+            (str(statistic.traceback), statistic.size_diff,
+             statistic.count_diff)
+            for statistic in statistics[:limit]
+        ]
+
+    def _take_snapshot(self):
+        # Leaves out the monitor's own samples.
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+
+
+def run_soak(config, frames_cv, duration, monitor, sample_every):
+    '''
+    Run the assembly over frames_cv for duration seconds, sampling with
+    monitor every sample_every seconds. Return the number of frames run.
+    '''
+    app = App(
+        config,
+        camera=SoakCamera(config, frames_cv, duration),
+        pointer=NullPointer(config, keep_trajectory=False),
+        gui=NullGui(config),
+    )
+    state = {'next_sample': timer() + sample_every}
+
+    def on_pass(passes):
+        if timer() >= state['next_sample']:
+            monitor.sample(passes)
+            state['next_sample'] = timer() + sample_every
+
+    monitor.start()
+    try:
+        frames, _seconds = run_to_end(app, on_pass)
+        monitor.sample(frames)
+    finally:
+        monitor.stop()
+    return frames
+
+
+def format_report(monitor, frames, failures, top_allocations):
+    growth = monitor.get_growth()
+    last = monitor.samples[-1]
+    lines = [
+        '%d frames in %.0f s, %d samples (%d after the warmup)' % (
+            frames, last.seconds, len(monitor.samples),
+            len(monitor.get_steady_samples())),
+    ]
+    for key in ('rss', 'traced'):
+        if growth[key] is None:
+            lines.append('%-7s not measured' % key)
+        else:
+            lines.append('%-7s %10.1f KiB now, %+8.1f KiB/min' % (
+                key, getattr(last, key) / KIB, growth[key] / KIB))
+    for name, count in sorted(last.objects.items()):
+        lines.append('%-26s %8d live, %+6d after the warmup' % (
+            name, count, growth['objects'].get(name, 0)))
+    if top_allocations:
+        lines.append('Top allocations after the warmup:')
+        for site, size_diff, count_diff in top_allocations:
+            lines.append('  %+10.1f KiB %+8d  %s' % (
+                size_diff / KIB, count_diff, site))
+    for failure in failures:
+        lines.append('FAIL: %s' % failure)
+    if not failures:
+        lines.append('OK')
+    return '\n'.join(lines)
+
+
+class CommandLineArguments(object):
+    def __init__(self, argv=None):
+        parser = ArgumentParser(
+            description='Replay recordings through the assembly for a long '
+                        'time and check memory for leaks.')
+        parser.add_argument(
+            'recordings',
+            nargs='+',
+            metavar='PATH',
+            help='Recording, video file, image file or directory of images.'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=600.0,
+            help='Seconds to run for. Default: 600.'
+        )
+        parser.add_argument(
+            '--max-frames',
+            type=int,
+            help='Replay only the first this many recorded frames.'
+        )
+        parser.add_argument(
+            '--sample-every',
+            type=float,
+            default=5.0,
+            help='Seconds between memory samples. Default: 5.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=float,
+            default=60.0,
+            help='Seconds before growth is measured. Default: 60.'
+        )
+        parser.add_argument(
+            '--max-rss-growth',
+            type=float,
+            default=256.0,
+            help='Resident memory growth limit in KiB per minute. '
+                 'Default: 256.'
+        )
+        parser.add_argument(
+            '--max-traced-growth',
+            type=float,
+            default=64.0,
+            help='Traced memory growth limit in KiB per minute. Default: 64.'
+        )
+        parser.add_argument(
+            '--max-object-growth',
+            type=int,
+            default=100,
+            help='Limit on the growth in live objects of each tracked type. '
+                 'Default: 100.'
+        )
+        parser.add_argument(
+            '--trace-frames',
+            type=int,
+            default=10,
+            help='Stack frames tracemalloc keeps per allocation, 0 to not '
+                 'trace allocations. Default: 10.'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Number of allocation sites to report. Default: 10.'
+        )
+        parser.add_argument(
+            '--config',
+            metavar='FILE',
+            help='Loads configuration from FILE.'
+        )
+        parser.add_argument(
+            '--json',
+            metavar='FILE',
+            help='Writes the samples and the report to FILE.'
+        )
+        parser.parse_args(argv, namespace=self)
+
+
+def main(argv=None):
+    args = CommandLineArguments(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    config_paths = [Config.DEFAULT_PATH]
+    if args.config is not None:
+        config_paths.append(args.config)
+    config = Config().load(config_paths)
+
+    frames_cv = [
+        image.to_cv()
+        for image in read_frames(config, args.recordings, args.max_frames)
+    ]
+    if not frames_cv:
+        sys.stderr.write('No frames in %s\n' % ', '.join(args.recordings))
+        return 2
+
+    monitor = SoakMonitor(args.warmup, args.trace_frames)
+    frames = run_soak(
+        config, frames_cv, args.duration, monitor, args.sample_every)
+    failures = monitor.get_failures(
+        args.max_rss_growth * KIB,
+        args.max_traced_growth * KIB,
+        args.max_object_growth,
+    )
+    top_allocations = monitor.get_top_allocations(args.top)
+
+    print(format_report(monitor, frames, failures, top_allocations))
+
+    if args.json is not None:
+        with open(args.json, 'w') as json_file:
+            json.dump(
+                {
+                    'frames': frames,
+                    'samples': [
+                        sample.to_dict() for sample in monitor.samples],
+                    'growth': monitor.get_growth(),
+                    'top_allocations': top_allocations,
+                    'failures': failures,
+                },
+                json_file,
+                indent=2,
+            )
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
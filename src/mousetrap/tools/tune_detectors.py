@@ -0,0 +1,415 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Sweeps detector parameters over recorded frames and reports the trade-off
+between detection time and accuracy.
+
+    mousetrap-tune-detectors --feature face --output tuned.yaml session.avi
+    mousetrap --config tuned.yaml
+
+Every combination of --scale-factors, --min-neighbors and --scales is run
+on every frame. Secondary features (nose, left_eye, open_eye) are searched
+inside the face found by the configured face detector, as the locators do.
+
+Without labels, accuracy is the hit rate. With --labels FILE, a JSON object
+mapping frame numbers (from 0) to {feature: [x, y, width, height] or null}
+in frame coordinates, accuracy is the fraction of labelled frames where the
+detector agrees with the label: it finds nothing where the label is null,
+or finds a rect overlapping the label by at least --min-overlap
+(intersection over union).
+
+The settings chosen from the Pareto front are written as a configuration
+file for --config: by default the most accurate, or with --max-ms the most
+accurate within that mean time, or with --min-accuracy the fastest at
+least that accurate.
+'''
+
+from argparse import ArgumentParser
+import itertools
+import json
+import sys
+
+import yaml
+
+from mousetrap.compat import timer
+from mousetrap.tools.compare_detectors import load_config
+from mousetrap.tools.frames import read_frames
+from mousetrap.vision import FeatureDetector, SearchRegion
+
+
+MILLISECONDS_PER_SECOND = 1000.0
+
+NOSE_LOCATOR = 'mousetrap.plugins.nose.NoseLocator'
+LEFT_EYE_LOCATOR = 'mousetrap.plugins.eyes.LeftEyeLocator'
+
+# feature -> (configurations it is used by, feature it is searched within)
+TUNABLE_FEATURES = {
+    'face': (
+        [(NOSE_LOCATOR, 'face_detector'),
+         (LEFT_EYE_LOCATOR, 'face_detector')],
+        None,
+    ),
+    'nose': ([(NOSE_LOCATOR, 'nose_detector')], 'face'),
+    'left_eye': ([(LEFT_EYE_LOCATOR, 'left_eye_detector')], 'face'),
+    'open_eye': ([(LEFT_EYE_LOCATOR, 'open_eye_detector')], 'face'),
+}
+
+DEFAULT_SCALE_FACTORS = [1.05, 1.1, 1.2, 1.3, 1.5]
+DEFAULT_MIN_NEIGHBORS = [2, 3, 5, 7, 10]
+DEFAULT_SCALES = [1.0, 0.75, 0.5]
+
+
+class Candidate(object):
+    '''One combination of detector parameters and how it did.'''
+
+    def __init__(self, scale_factor, min_neighbors, scale):
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.scale = scale
+        self.durations = []
+        self.agreements = 0
+        self.judged = 0
+
+    def add(self, duration, agrees):
+        '''agrees - True or False, or None if the frame is not judged.'''
+        self.durations.append(duration)
+        if agrees is not None:
+            self.judged += 1
+            if agrees:
+                self.agreements += 1
+
+    def get_mean_ms(self):
+        if not self.durations:
+            return 0.0
+        return MILLISECONDS_PER_SECOND * \
+            sum(self.durations) / len(self.durations)
+
+    def get_accuracy(self):
+        return self.agreements / self.judged if self.judged else 0.0
+
+    def dominates(self, other):
+        mean_ms, accuracy = self.get_mean_ms(), self.get_accuracy()
+        other_ms, other_accuracy = other.get_mean_ms(), other.get_accuracy()
+        return mean_ms <= other_ms and accuracy >= other_accuracy and \
+            (mean_ms < other_ms or accuracy > other_accuracy)
+
+    def get_settings(self):
+        return {
+            'scale_factor': self.scale_factor,
+            'min_neighbors': self.min_neighbors,
+            'scale': self.scale,
+        }
+
+    def to_dict(self):
+        result = self.get_settings()
+        result.update({
+            'frames': len(self.durations),
+            'judged': self.judged,
+            'accuracy': self.get_accuracy(),
+            'mean_ms': self.get_mean_ms(),
+        })
+        return result
+
+
+class Tuner(object):
+
+    def __init__(self, config, feature, scale_factors, min_neighbors, scales,
+                 labels=None, min_overlap=0.5):
+        if feature not in TUNABLE_FEATURES:
+            raise ValueError('Cannot tune %s, only %s' % (
+                feature, ', '.join(sorted(TUNABLE_FEATURES))))
+        # Reused or guided searches would hide the cost of detecting.
+        config.load_dict({
+            'motion_gate': {'enabled': False},
+            'temporal_reuse': {'enabled': False},
+            'search_guide': {'enabled': False},
+        })
+        self._config = config
+        self._feature = feature
+        self._labels = labels
+        self._min_overlap = min_overlap
+        self._targets, within = TUNABLE_FEATURES[feature]
+        detector_config = self.get_current_settings()
+        self._search_region = SearchRegion.from_config(
+            detector_config.get('search_region'))
+        self._within_detector = None
+        if within is not None:
+            self._within_detector = FeatureDetector.from_config(
+                config, within,
+                config['classes'][self._targets[0][0]][within + '_detector'],
+            )
+        self.candidates = [
+            Candidate(scale_factor, neighbors, scale)
+            for scale_factor, neighbors, scale in itertools.product(
+                scale_factors, min_neighbors, scales)
+        ]
+        self.skipped_frames = 0
+
+    def get_current_settings(self):
+        class_name, key = self._targets[0]
+        return self._config['classes'][class_name][key]
+
+    def run(self, images):
+        '''Return the number of frames searched.'''
+        searches = []
+        for frame, image in enumerate(images):
+            search = self._get_search(image)
+            if search is None:
+                self.skipped_frames += 1
+            else:
+                searches.append((frame,) + search)
+
+        for candidate in self.candidates:
+            # A detector of its own each, so no cache or state is shared.
+            detector = FeatureDetector(
+                self._config,
+                self._feature,
+                scale_factor=candidate.scale_factor,
+                min_neighbors=candidate.min_neighbors,
+                search_region=self._search_region,
+                scale=candidate.scale,
+            )
+            for frame, search_image, offset in searches:
+                begin = timer()
+                detection = detector.find(search_image)
+                duration = timer() - begin
+                rect = None
+                if detection is not None:
+                    x, y, width, height = detection.to_rect()
+                    rect = (x + offset[0], y + offset[1], width, height)
+                candidate.add(duration, self._agrees(frame, rect))
+
+        return len(searches)
+
+    def _get_search(self, image):
+        if self._within_detector is None:
+            return image, (0, 0)
+
+        within = self._within_detector.find(image)
+        if within is None:
+            return None
+        return within.image, (within.x, within.y)
+
+    def _agrees(self, frame, rect):
+        if self._labels is None:
+            return rect is not None
+
+        frame_labels = self._labels.get(str(frame))
+        if frame_labels is None or self._feature not in frame_labels:
+            return None
+
+        label = frame_labels[self._feature]
+        if label is None or rect is None:
+            return label is None and rect is None
+        return overlap(rect, label) >= self._min_overlap
+
+    def get_pareto_front(self):
+        '''Candidates no other candidate beats on both time and accuracy.'''
+        front = [
+            candidate for candidate in self.candidates
+            if not any(other.dominates(candidate)
+                       for other in self.candidates)
+        ]
+        return sorted(front, key=lambda candidate: candidate.get_mean_ms())
+
+    def choose(self, max_ms=None, min_accuracy=None):
+        '''Pick from the Pareto front, or return None if nothing fits.'''
+        front = self.get_pareto_front()
+        if min_accuracy is not None:
+            fitting = [
+                candidate for candidate in front
+                if candidate.get_accuracy() >= min_accuracy
+            ]
+            return fitting[0] if fitting else None
+        if max_ms is not None:
+            front = [
+                candidate for candidate in front
+                if candidate.get_mean_ms() <= max_ms
+            ]
+        return front[-1] if front else None
+
+    def get_override(self, candidate):
+        '''Configuration applying candidate wherever the feature is used.'''
+        classes = {}
+        for class_name, key in self._targets:
+            classes.setdefault(class_name, {})[key] = candidate.get_settings()
+        return {'classes': classes}
+
+
+def overlap(rect, other):
+    '''Intersection over union of two (x, y, width, height) rects.'''
+    x, y, width, height = rect
+    other_x, other_y, other_width, other_height = other
+    intersection_width = max(
+        0, min(x + width, other_x + other_width) - max(x, other_x))
+    intersection_height = max(
+        0, min(y + height, other_y + other_height) - max(y, other_y))
+    intersection = intersection_width * intersection_height
+    union = width * height + other_width * other_height - intersection
+    return intersection / union if union else 0.0
+
+
+def format_candidates(candidates, chosen=None):
+    lines = [
+        '%-2s %12s %13s %5s %8s %9s' % (
+            '', 'scale_factor', 'min_neighbors', 'scale', 'accuracy',
+            'mean ms'),
+    ]
+    for candidate in candidates:
+        lines.append('%-2s %12.2f %13d %5.2f %7.1f%% %9.2f' % (
+            '*' if candidate is chosen else '',
+            candidate.scale_factor,
+            candidate.min_neighbors,
+            candidate.scale,
+            100.0 * candidate.get_accuracy(),
+            candidate.get_mean_ms(),
+        ))
+    return '\n'.join(lines)
+
+
+def _parse_list(type_):
+    def parse(text):
+        return [type_(value) for value in text.split(',')]
+    return parse
+
+
+class CommandLineArguments(object):
+    def __init__(self, argv=None):
+        parser = ArgumentParser(
+            description='Tune detector parameters on recorded frames.')
+        parser.add_argument(
+            'frames',
+            nargs='+',
+            metavar='PATH',
+            help='Recording, video file, image file or directory of images.'
+        )
+        parser.add_argument(
+            '--feature',
+            default='face',
+            choices=sorted(TUNABLE_FEATURES),
+            help='Feature to tune. Default: face.'
+        )
+        parser.add_argument(
+            '--scale-factors',
+            type=_parse_list(float),
+            default=DEFAULT_SCALE_FACTORS,
+            metavar='LIST',
+            help='Comma separated scale_factor values to try.'
+        )
+        parser.add_argument(
+            '--min-neighbors',
+            type=_parse_list(int),
+            default=DEFAULT_MIN_NEIGHBORS,
+            metavar='LIST',
+            help='Comma separated min_neighbors values to try.'
+        )
+        parser.add_argument(
+            '--scales',
+            type=_parse_list(float),
+            default=DEFAULT_SCALES,
+            metavar='LIST',
+            help='Comma separated detection scales to try.'
+        )
+        parser.add_argument(
+            '--labels',
+            metavar='FILE',
+            help='JSON file of expected rects per frame.'
+        )
+        parser.add_argument(
+            '--min-overlap',
+            type=float,
+            default=0.5,
+        )
+        parser.add_argument(
+            '--max-ms',
+            type=float,
+            help='Choose the most accurate settings within this mean time.'
+        )
+        parser.add_argument(
+            '--min-accuracy',
+            type=float,
+            help='Choose the fastest settings at least this accurate (0-1).'
+        )
+        parser.add_argument(
+            '--max-frames',
+            type=int,
+        )
+        parser.add_argument(
+            '--config',
+            metavar='FILE',
+            help='Loads configuration from FILE.'
+        )
+        parser.add_argument(
+            '--output',
+            metavar='FILE',
+            help='Writes the chosen settings to FILE, for --config.'
+        )
+        parser.add_argument(
+            '--json',
+            metavar='FILE',
+            help='Also writes all results to FILE as JSON.'
+        )
+        parser.parse_args(argv, namespace=self)
+
+
+def main(argv=None):
+    args = CommandLineArguments(argv)
+    config = load_config(args.config)
+
+    labels = None
+    if args.labels is not None:
+        with open(args.labels) as labels_file:
+            labels = json.load(labels_file)
+
+    tuner = Tuner(
+        config,
+        args.feature,
+        args.scale_factors,
+        args.min_neighbors,
+        args.scales,
+        labels=labels,
+        min_overlap=args.min_overlap,
+    )
+    searched = tuner.run(
+        list(read_frames(config, args.frames, args.max_frames)))
+    if not searched:
+        print('No frames to tune on.')
+        return 1
+
+    chosen = tuner.choose(max_ms=args.max_ms, min_accuracy=args.min_accuracy)
+    print('Current: %s' % json.dumps(tuner.get_current_settings()))
+    print('Pareto front:')
+    print(format_candidates(tuner.get_pareto_front(), chosen))
+    if tuner.skipped_frames:
+        print('(%d frames skipped: face not found)' % tuner.skipped_frames)
+
+    if args.json is not None:
+        with open(args.json, 'w') as json_file:
+            json.dump({
+                'feature': args.feature,
+                'candidates': [
+                    candidate.to_dict() for candidate in tuner.candidates],
+                'pareto_front': [
+                    candidate.to_dict()
+                    for candidate in tuner.get_pareto_front()],
+                'chosen': chosen.to_dict() if chosen is not None else None,
+            }, json_file, indent=2)
+
+    if chosen is None:
+        print('No settings meet the requirements.')
+        return 1
+
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            yaml.safe_dump(
+                tuner.get_override(chosen), output_file,
+                default_flow_style=False)
+        print('Wrote %s' % args.output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+'''
+Per-frame tracing.
+
+Each captured frame gets a FrameTrace that travels with its Image. Stages
+record spans against it and a background thread writes them to a file in
+Chrome's trace-event format (load it in chrome://tracing or Perfetto).
+'''
+
+from io import open
+import itertools
+import json
+import os
+import threading
+
+from mousetrap.compat import queue, timer
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+MICROSECONDS_PER_SECOND = 1000000.0
+FRAMES_THREAD_NAME = 'frames'
+
+
+class Tracer(object):
+
+    def __init__(self, path):
+        LOGGER.info("Tracing to %s", path)
+        self._origin = timer()
+        self._pid = os.getpid()
+        self._frame_ids = itertools.count(1)
+        self._thread_ids = {}
+        self._current_frame = NULL_FRAME_TRACE
+        self._writer = _TraceWriter(path)
+        self._writer.start()
+        self._name_thread(FRAMES_THREAD_NAME)
+
+    def new_frame(self, capture_time=None):
+        '''Start tracing a new frame. capture_time defaults to now.'''
+        if capture_time is None:
+            capture_time = timer()
+        self._current_frame = FrameTrace(
+            self, next(self._frame_ids), capture_time)
+        return self._current_frame
+
+    def current_frame(self):
+        '''Frame most recently started on this tracer.'''
+        return self._current_frame
+
+    def end_frame(self):
+        '''Finish the current frame, if any.'''
+        frame = self._current_frame
+        self._current_frame = NULL_FRAME_TRACE
+        frame.finish()
+
+    def emit_complete(self, name, begin, end, thread_name=None, args=None):
+        event = {
+            'name': name,
+            'cat': 'mousetrap',
+            'ph': 'X',
+            'ts': self._to_microseconds(begin),
+            'dur': (end - begin) * MICROSECONDS_PER_SECOND,
+            'pid': self._pid,
+            'tid': self._thread_id(thread_name),
+        }
+        if args:
+            event['args'] = args
+        self._writer.put(event)
+
+    def close(self):
+        self.end_frame()
+        self._writer.close()
+
+    def _to_microseconds(self, time_):
+        return (time_ - self._origin) * MICROSECONDS_PER_SECOND
+
+    def _thread_id(self, thread_name=None):
+        if thread_name is None:
+            thread_name = threading.current_thread().name
+        if thread_name not in self._thread_ids:
+            self._name_thread(thread_name)
+        return self._thread_ids[thread_name]
+
+    def _name_thread(self, thread_name):
+        tid = self._thread_ids.setdefault(
+            thread_name, len(self._thread_ids) + 1)
+        self._writer.put({
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': self._pid,
+            'tid': tid,
+            'args': {'name': thread_name},
+        })
+
+
+class NullTracer(object):
+    '''Tracer used when tracing is off. Does nothing, cheaply.'''
+
+    def new_frame(self, capture_time=None):
+        return NULL_FRAME_TRACE
+
+    def current_frame(self):
+        return NULL_FRAME_TRACE
+
+    def end_frame(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FrameTrace(object):
+
+    def __init__(self, tracer, frame_id, capture_time):
+        self._tracer = tracer
+        self._finished = False
+        self.frame_id = frame_id
+        self.capture_time = capture_time
+
+    def span(self, name, **args):
+        '''Context manager recording a span named name for this frame.'''
+        return _Span(self, name, args)
+
+    def add_span(self, name, begin, end, **args):
+        args['frame'] = self.frame_id
+        self._tracer.emit_complete(name, begin, end, args=args)
+
+    def finish(self):
+        '''Record the frame itself, from capture until now.'''
+        if self._finished:
+            return
+        self._finished = True
+        self._tracer.emit_complete(
+            'frame %d' % self.frame_id,
+            self.capture_time,
+            timer(),
+            thread_name=FRAMES_THREAD_NAME,
+            args={'frame': self.frame_id},
+        )
+
+
+class NullFrameTrace(object):
+
+    frame_id = None
+    capture_time = None
+
+    def span(self, name, **args):
+        return _NULL_SPAN
+
+    def add_span(self, name, begin, end, **args):
+        pass
+
+    def finish(self):
+        pass
+
+
+class _Span(object):
+
+    def __init__(self, frame, name, args):
+        self._frame = frame
+        self._name = name
+        self._args = args
+        self._begin = None
+
+    def __enter__(self):
+        self._begin = timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._frame.add_span(self._name, self._begin, timer(), **self._args)
+        return False
+
+
+class _NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class _TraceWriter(threading.Thread):
+    '''Writes events in the background so tracing never blocks the loop.'''
+
+    _STOP = object()
+
+    def __init__(self, path):
+        super(_TraceWriter, self).__init__(name='mousetrap-trace-writer')
+        self.daemon = True
+        self._path = path
+        self._queue = queue.Queue()
+
+    def put(self, event):
+        self._queue.put(event)
+
+    def close(self):
+        self._queue.put(self._STOP)
+        self.join()
+
+    def run(self):
+        with open(self._path, 'w') as trace_file:
+            trace_file.write('[\n')
+            separator = ''
+            while True:
+                event = self._queue.get()
+                if event is self._STOP:
+                    break
+                trace_file.write(separator + json.dumps(event))
+                separator = ',\n'
+                if self._queue.empty():
+                    trace_file.flush()
+            trace_file.write('\n]\n')
+
+
+NULL_FRAME_TRACE = NullFrameTrace()
+_NULL_SPAN = _NullSpan()
+
+_tracer = NullTracer()
+
+
+def get_tracer():
+    return _tracer
+
+
+def set_tracer(tracer):
+    '''Install tracer process-wide. Pass None to turn tracing off.'''
+    global _tracer
+
+    if tracer is None:
+        tracer = NullTracer()
+
+    _tracer = tracer
@@ -7,20 +7,51 @@ from __future__ import division
 All things computer vision.
 '''
 
+from contextlib import contextmanager
+from io import open
+import math
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
 import cv2
+import numpy
 from mousetrap.i18n import _
 from mousetrap.image import Image
 import mousetrap.plugins.interface as interface
+from mousetrap.compat import string_types, timer
+from mousetrap.framebus import FrameBusWriter
+from mousetrap.log import RateLimitedLog
+from mousetrap.trace import get_tracer
 
 import logging
 LOGGER = logging.getLogger(__name__)
+PASS_LOG = RateLimitedLog(LOGGER)
 
 
 FRAME_WIDTH = 3
 FRAME_HEIGHT = 4
 
+SELECT_FIRST = 'first'
+SELECT_LARGEST = 'largest'
+SELECT_NEAREST = 'nearest'
+
+MASK_MOTION = 'motion'
+MASK_SKIN = 'skin'
+MASK_BOTH = 'both'
+
 
 class Camera(object):
+    '''
+    Reads images from a capture device. If the device fails while reading,
+    the camera reopens it on a background thread, waiting longer after each
+    failed attempt, and read_image returns None until it is back.
+    '''
+
     S_CAPTURE_OPEN_ERROR = _(
         'Device #%d does not support video capture interface'
     )
@@ -30,9 +61,16 @@ class Camera(object):
 
     def __init__(self, config):
         self._config = config
-        self._device = self._new_capture_device(
-            config['camera']['device_index']
-        )
+        self._device_index = config['camera']['device_index']
+        self._reconnect_config = config['camera'].get('reconnect') or {}
+        self._device = self._new_capture_device(self._device_index)
+        self._lock = threading.Lock()
+        self._reconnected_device = None
+        self._reconnect_thread = None
+        self._disconnected_at = None
+        self._disconnect_count = 0
+        self._downtime = 0.0
+        self._reductions = {}
         self.set_dimensions(
             config['camera']['width'],
             config['camera']['height'],
@@ -50,19 +88,137 @@ class Camera(object):
         return capture
 
     def set_dimensions(self, width, height):
-        self._device.set(FRAME_WIDTH, width)
-        self._device.set(FRAME_HEIGHT, height)
+        '''Set the dimensions to capture at while no reduction is asked.'''
+        self._width = width
+        self._height = height
+        self._update_dimensions()
+
+    def reduce_dimensions(self, requester, width, height):
+        '''
+        Capture at width x height until requester restores the dimensions.
+        With several reductions, the smallest wins, so power saving and
+        CPU budget plugins do not undo each other.
+        '''
+        self._reductions[requester] = (width, height)
+        self._update_dimensions()
+
+    def restore_dimensions(self, requester):
+        '''Drop requester's reduction, if any.'''
+        if self._reductions.pop(requester, None) is not None:
+            self._update_dimensions()
+
+    def get_dimensions(self):
+        '''The (width, height) asked of the device.'''
+        return self._dimensions
+
+    def _update_dimensions(self):
+        dimensions = [(self._width, self._height)]
+        dimensions.extend(self._reductions.values())
+        self._dimensions = min(
+            dimensions, key=lambda dimensions: dimensions[0] * dimensions[1])
+        if self._device is not None:
+            self._apply_dimensions(self._device)
+
+    def _apply_dimensions(self, device):
+        width, height = self._dimensions
+        device.set(FRAME_WIDTH, width)
+        device.set(FRAME_HEIGHT, height)
+
+    def is_connected(self):
+        return self._device is not None
+
+    def get_stats(self):
+        '''
+        Disconnections so far, and seconds spent disconnected, including
+        the current disconnection.
+        '''
+        downtime = self._downtime
+        if self._disconnected_at is not None:
+            downtime += timer() - self._disconnected_at
+        return {
+            'connected': self.is_connected(),
+            'disconnects': self._disconnect_count,
+            'downtime': downtime,
+        }
 
     def read_image(self):
+        '''
+        Return the next Image, or None while the device is reconnecting.
+        Raises IOError if reading fails and reconnecting is disabled.
+        '''
+        if self._device is None and not self._take_reconnected_device():
+            return None
+
+        begin = timer()
         ret, image = self._device.read()
 
         if not ret:
+            self._disconnected()
+            return None
+
+        trace = get_tracer().new_frame(begin)
+        trace.add_span('Camera.read_image', begin, timer())
+
+        return Image(self._config, image, trace=trace, timestamp=begin)
+
+    def _disconnected(self):
+        if not self._reconnect_config.get('enabled', True):
             raise IOError(self.S_CAPTURE_READ_ERROR)
 
-        return Image(self._config, image)
+        self._device.release()
+        self._device = None
+        self._disconnected_at = timer()
+        self._disconnect_count += 1
+        LOGGER.warning(
+            _('%s Reconnecting (disconnection %d).'),
+            self.S_CAPTURE_READ_ERROR, self._disconnect_count,
+        )
+        self._reconnect_thread = threading.Thread(
+            target=self._reconnect, name='mousetrap-camera-reconnect')
+        self._reconnect_thread.daemon = True
+        self._reconnect_thread.start()
+
+    def _reconnect(self):
+        delay = self._reconnect_config.get('initial_delay', 0.5)
+        max_delay = self._reconnect_config.get('max_delay', 10.0)
+        while True:
+            time.sleep(delay)
+            try:
+                device = self._new_capture_device(self._device_index)
+            except IOError as error:
+                LOGGER.debug("Camera not back yet: %s", error)
+                delay = min(max_delay, delay * 2)
+                continue
+            with self._lock:
+                self._reconnected_device = device
+            return
+
+    def _take_reconnected_device(self):
+        with self._lock:
+            device = self._reconnected_device
+            self._reconnected_device = None
+        if device is None:
+            return False
+
+        self._apply_dimensions(device)
+        self._device = device
+        downtime = timer() - self._disconnected_at
+        self._downtime += downtime
+        self._disconnected_at = None
+        LOGGER.info(
+            _('Camera reconnected after %.1f seconds (%.1f seconds in %d '
+              'disconnections so far).'),
+            downtime, self._downtime, self._disconnect_count,
+        )
+        return True
 
 
 class HaarLoader(object):
+    '''
+    Loads the cascades named in haar_files. An entry is either a file name
+    or a dict with file and, optionally, prefilter settings (see
+    CascadePrefilter).
+    '''
 
     def __init__(self, config):
         self._config = config
@@ -70,62 +226,1082 @@ class HaarLoader(object):
         self._haar_cache = {}
 
     def from_name(self, name):
+        return self.from_file(self.get_file(name))
+
+    def get_file(self, name):
+        return self._get_entry(name)['file']
+
+    def get_prefilter(self, name):
+        '''Prefilter settings of the entry for name, or None.'''
+        return self._get_entry(name).get('prefilter')
+
+    def _get_entry(self, name):
         if name not in self._haar_files:
             raise HaarNameError(name)
 
-        haar_file = self._haar_files[name]
+        entry = self._haar_files[name]
+        if isinstance(entry, string_types):
+            return {'file': entry}
+        return entry
+
+    def from_file(self, file_):
+        '''
+        Load a cascade file. Each file is loaded once per loader; later calls
+        return the same classifier.
+        '''
+        haar_file = self._get_path(file_)
+
+        if haar_file in self._haar_cache:
+            return self._haar_cache[haar_file]
+
+        haar = cv2.CascadeClassifier(haar_file)
+
+        if haar.empty():
+            raise IOError(_('Could not load cascade file: %s') % haar_file)
 
-        haar = self.from_file(haar_file, name)
+        self._haar_cache[haar_file] = haar
 
         return haar
 
-    def from_file(self, file_, cache_name=None):
-        import os
+    def truncated(self, file_, stages):
+        '''
+        Load only the first stages stages of a cascade file: a cascade that
+        rejects fewer windows, but much sooner. Cached like from_file.
+        '''
+        haar_file = self._get_path(file_)
+        key = (haar_file, stages)
+
+        if key not in self._haar_cache:
+            self._haar_cache[key] = _load_truncated_cascade(haar_file, stages)
 
-        if cache_name in self._haar_cache:
-            return self._haar_cache[cache_name]
+        return self._haar_cache[key]
 
+    def _get_path(self, file_):
         current_dir = os.path.dirname(os.path.realpath(__file__))
 
-        haar_file = os.path.join(current_dir, file_)
+        return os.path.join(current_dir, file_)
 
-        haar = cv2.CascadeClassifier(haar_file)
 
-        if cache_name is not None:
-            if cache_name not in self._haar_cache:
-                self._haar_cache[cache_name] = haar
+def _load_truncated_cascade(haar_file, stages):
+    # Cascade files may hold comments that are not well-formed XML, and
+    # OpenCV reads the older format only from files.
+    with open(haar_file, encoding='utf-8') as cascade_file:
+        text = re.sub(r'<!--.*?-->', '', cascade_file.read(), flags=re.S)
+    root = ElementTree.fromstring(re.sub(r'^\s*<\?xml[^>]*\?>', '', text))
+    cascade = root[0]
+    stage_nodes = cascade.find('stages')
+    if stage_nodes is None:
+        raise IOError(_('Could not load cascade file: %s') % haar_file)
 
-        return haar
+    for stage in list(stage_nodes)[stages:]:
+        stage_nodes.remove(stage)
+    if cascade.find('stageNum') is not None:
+        cascade.find('stageNum').text = str(len(stage_nodes))
+
+    handle, path = tempfile.mkstemp(suffix='.xml')
+    try:
+        os.write(handle, b'<?xml version="1.0"?>\n')
+        os.write(handle, ElementTree.tostring(root))
+        os.close(handle)
+        haar = cv2.CascadeClassifier(path)
+    finally:
+        os.unlink(path)
+
+    if haar.empty():
+        raise IOError(_('Could not load cascade file: %s') % haar_file)
+
+    LOGGER.info("Loaded %d stages of %s", len(stage_nodes), haar_file)
+
+    return haar
 
 
 class HaarNameError(Exception):
     pass
 
 
-class FeatureDetector(object):
+class DetectorBackend(object):
+    '''
+    Finds all rectangles containing one named feature in a grayscale image.
 
-    _INSTANCES = {}
+    Backends are registered by name and chosen per feature in the
+    `detectors` section of the configuration.
+    '''
+
+    _REGISTRY = {}
+
+    @classmethod
+    def register(cls, backend_name, backend_class):
+        cls._REGISTRY[backend_name] = backend_class
+
+    @classmethod
+    def get_names(cls):
+        return sorted(cls._REGISTRY.keys())
 
     @classmethod
-    def get_detector(cls, config, name, scale_factor=1.1, min_neighbors=3):
-        key = (name, scale_factor, min_neighbors)
+    def from_config(cls, config, name, loader=None, local=False):
+        '''
+        Build the backend configured for feature name. If detect_server's
+        client is true, build a RemoteBackend in its place, unless local.
+        '''
+        settings = config.get('detectors', {}).get(name)
+        if settings is None:
+            settings = {}
+        server_config = config.get('detect_server') or {}
+        if server_config.get('client', False) and not local and \
+                settings.get('backend') != 'remote':
+            settings = {'backend': 'remote', 'local': settings}
+        return cls.create(config, name, settings, loader)
+
+    @classmethod
+    def create(cls, config, name, settings, loader=None):
+        settings = dict(settings)
+        backend_name = settings.pop('backend', 'haar')
+
+        if backend_name not in cls._REGISTRY:
+            raise DetectorBackendError(backend_name)
+
+        if loader is None:
+            loader = HaarLoader(config)
+
+        LOGGER.info("Using %s backend for %s", backend_name, name)
+
+        return cls._REGISTRY[backend_name](config, name, settings, loader)
+
+    def __init__(self, config, name, settings, loader):
+        '''
+        name - name of the feature to detect
+
+        settings - backend specific settings from the `detectors` section
+
+        loader - HaarLoader to load cascade files with
+        '''
+        self._config = config
+        self._name = name
+        self._settings = settings
+
+    def detect(self, image_grayscale, scale_factor, min_neighbors):
+        '''Return a sequence of (x, y, width, height) rectangles.'''
+        raise NotImplementedError(_('Must implement.'))
+
+
+class CascadeBackend(DetectorBackend):
+    '''
+    OpenCV cascade classifier. Serves both Haar and LBP cascade files;
+    LBP cascades use integer features and are several times faster on CPU.
+    '''
+
+    def __init__(self, config, name, settings, loader):
+        super(CascadeBackend, self).__init__(config, name, settings, loader)
+        if 'file' in settings:
+            file_ = settings['file']
+            prefilter = settings.get('prefilter')
+        else:
+            file_ = loader.get_file(name)
+            prefilter = loader.get_prefilter(name)
+        self._cascade = loader.from_file(file_)
+        self._prefilter = None
+        if prefilter:
+            self._prefilter = CascadePrefilter(
+                loader.truncated(file_, prefilter['stages']), prefilter)
+
+    def detect(self, image_grayscale, scale_factor, min_neighbors):
+        if self._prefilter is not None:
+            regions = self._prefilter.get_regions(image_grayscale)
+            if regions is not None:
+                return self._detect_regions(
+                    image_grayscale, regions, scale_factor, min_neighbors)
+
+        return self._cascade.detectMultiScale(
+            image_grayscale,
+            scale_factor,
+            min_neighbors,
+        )
+
+    def _detect_regions(self, image_grayscale, regions, scale_factor,
+                        min_neighbors):
+        found = []
+        for x, y, width, height in regions:
+            rects = self._cascade.detectMultiScale(
+                image_grayscale[y:y + height, x:x + width],
+                scale_factor,
+                min_neighbors,
+            )
+            if len(rects) > 0:
+                found.append(rects + (x, y, 0, 0))
+        return numpy.concatenate(found) if found else ()
 
-        if key in cls._INSTANCES:
+
+class CascadePrefilter(object):
+    '''
+    First stage of a two-stage cascade search: a fast, coarse scan of the
+    whole image with the first few stages of the cascade, with relaxed
+    settings. The full cascade then searches only around what survives.
+
+    Settings (a haar_files entry's prefilter, or a detectors entry's):
+        stages - how many stages of the cascade to keep.
+        scale - resize the image by this factor for the coarse scan.
+                Default 0.5.
+        scale_factor, min_neighbors - for the coarse scan. Default 1.3, 2.
+        margin - grow survivors by this fraction of their size on each
+                 side. Default 0.2.
+        max_area - search the whole image with the full cascade instead if
+                   the survivors cover more than this fraction of it.
+                   Default 0.5.
+    '''
+
+    def __init__(self, cascade, settings):
+        self._cascade = cascade
+        self._scale = settings.get('scale', 0.5)
+        self._scale_factor = settings.get('scale_factor', 1.3)
+        self._min_neighbors = settings.get('min_neighbors', 2)
+        self._margin = settings.get('margin', 0.2)
+        self._max_area = settings.get('max_area', 0.5)
+
+    def get_regions(self, image_grayscale):
+        '''
+        Return the (x, y, width, height) regions for the full cascade to
+        search, possibly none, or None to search the whole image.
+        '''
+        image_height, image_width = image_grayscale.shape[:2]
+        if self._scale != 1.0:
+            image_grayscale = cv2.resize(
+                image_grayscale, None, fx=self._scale, fy=self._scale,
+                interpolation=cv2.INTER_AREA,
+            )
+        survivors = self._cascade.detectMultiScale(
+            image_grayscale, self._scale_factor, self._min_neighbors)
+        if len(survivors) > 0 and self._scale != 1.0:
+            survivors = survivors / self._scale
+        regions = _merge_rects(
+            _grow_rect(rect, self._margin, image_width, image_height)
+            for rect in survivors
+        )
+
+        area = sum(width * height for _x, _y, width, height in regions)
+        if area > self._max_area * image_width * image_height:
+            return None
+
+        return regions
+
+
+class LbpCascadeBackend(CascadeBackend):
+
+    def __init__(self, config, name, settings, loader):
+        if 'file' not in settings:
+            raise DetectorBackendError(
+                _('LBP backend for %s needs a cascade file') % name
+            )
+        super(LbpCascadeBackend, self).__init__(
+            config, name, settings, loader)
+
+
+class YuNetBackend(DetectorBackend):
+    '''
+    OpenCV's YuNet face detector (OpenCV 4.5.4 or later). file names the
+    .onnx model. scale_factor and min_neighbors do not apply; candidates are
+    filtered by score_threshold instead.
+    '''
+
+    def __init__(self, config, name, settings, loader):
+        super(YuNetBackend, self).__init__(config, name, settings, loader)
+
+        if not hasattr(cv2, 'FaceDetectorYN'):
+            raise DetectorBackendError(
+                _('This OpenCV does not provide FaceDetectorYN')
+            )
+
+        current_dir = os.path.dirname(os.path.realpath(__file__))
+        self._detector = cv2.FaceDetectorYN.create(
+            os.path.join(current_dir, settings['file']),
+            '',
+            (320, 320),
+            settings.get('score_threshold', 0.8),
+            settings.get('nms_threshold', 0.3),
+        )
+
+    def detect(self, image_grayscale, scale_factor, min_neighbors):
+        height, width = image_grayscale.shape[:2]
+        self._detector.setInputSize((width, height))
+        image_bgr = cv2.cvtColor(image_grayscale, cv2.COLOR_GRAY2BGR)
+        _unused, faces = self._detector.detect(image_bgr)
+
+        if faces is None:
+            return ()
+
+        return faces[:, 0:4].astype(int)
+
+
+class RemoteBackend(DetectorBackend):
+    '''
+    Sends searches to a mousetrap-detect-server (see mousetrap.detectserver),
+    which detects with its own configuration. Images go through a frame bus
+    that only this backend and the server can reach.
+
+    While the server cannot be reached, searches run here with the backend
+    in settings' local (by default the haar backend), or find nothing if
+    detect_server's fallback is false. The server is tried again every
+    retry_seconds.
+
+    Servers whose socket belongs to another user than this one, root and
+    detect_server's owner are not used.
+    '''
+
+    def __init__(self, config, name, settings, loader):
+        # detectserver imports this module.
+        from mousetrap.detectserver import get_default_socket_path
+
+        super(RemoteBackend, self).__init__(config, name, settings, loader)
+
+        if not hasattr(socket.socket, 'sendmsg'):
+            raise DetectorBackendError(
+                _('The remote backend needs Python 3.3 or later')
+            )
+
+        server_config = config.get('detect_server') or {}
+        self._path = server_config.get('path') or get_default_socket_path(
+            server_config.get('shared', False))
+        self._owner = server_config.get('owner')
+        self._fallback = server_config.get('fallback', True)
+        self._retry_seconds = server_config.get('retry_seconds', 5.0)
+        self._timeout = server_config.get('timeout', 2.0)
+        self._max_width = server_config.get('max_width', 1920)
+        self._max_height = server_config.get('max_height', 1080)
+        self._loader = loader
+        self._local_settings = settings.get('local') or {}
+        self._local = None
+        self._channel = None
+        self._bus = None
+        self._retry_at = 0.0
+
+    def detect(self, image_grayscale, scale_factor, min_neighbors):
+        if self._channel is None and timer() >= self._retry_at:
+            self._connect()
+
+        if self._channel is not None:
+            try:
+                rects = self._detect_remote(
+                    image_grayscale, scale_factor, min_neighbors)
+                if rects is not None:
+                    return rects
+            except (socket.error, ValueError, DetectorBackendError) as error:
+                LOGGER.warning(_('Detection server failed: %s'), error)
+                self._disconnect()
+
+        return self._detect_local(image_grayscale, scale_factor, min_neighbors)
+
+    def close(self):
+        if self._channel is not None:
+            self._disconnect()
+
+    def _detect_remote(self, image_grayscale, scale_factor, min_neighbors):
+        sequence = self._bus.publish(timer(), image_grayscale)
+        if sequence is None:
+            return None
+
+        self._channel.send({
+            'command': 'detect',
+            'sequence': sequence,
+            'scale_factor': scale_factor,
+            'min_neighbors': min_neighbors,
+        })
+        response = self._channel.receive()
+        if response is None:
+            raise DetectorBackendError(_('The server closed the connection'))
+        if not response.get('ok'):
+            raise DetectorBackendError(response.get('error'))
+
+        if not response['rects']:
+            return ()
+        return numpy.array(response['rects'], dtype=numpy.int32)
+
+    def _detect_local(self, image_grayscale, scale_factor, min_neighbors):
+        if not self._fallback:
+            return ()
+
+        if self._local is None:
+            self._local = DetectorBackend.create(
+                self._config, self._name, self._local_settings, self._loader)
+
+        return self._local.detect(image_grayscale, scale_factor, min_neighbors)
+
+    def _connect(self):
+        # detectserver imports this module.
+        from mousetrap.detectserver import Channel, check_socket_owner
+
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(self._timeout)
+        channel = Channel(connection)
+        bus = None
+        try:
+            check_socket_owner(self._path, self._owner)
+            connection.connect(self._path)
+            bus = self._open_bus()
+            channel.send({
+                'command': 'hello',
+                'client': str(os.getpid()),
+                'feature': self._name,
+            }, fds=[bus.fileno()])
+            response = channel.receive()
+            if response is None or not response.get('ok'):
+                raise DetectorBackendError(
+                    response and response.get('error'))
+        except (socket.error, KeyError, ValueError,
+                DetectorBackendError) as error:
+            LOGGER.warning(
+                _('Could not use the detection server at %s: %s'),
+                self._path, error)
+            channel.close()
+            if bus is not None:
+                bus.close(unlink=False)
+            self._retry_at = timer() + self._retry_seconds
+            return
+
+        LOGGER.info(
+            _('Detecting %s with the server at %s'), self._name, self._path)
+        self._channel = channel
+        self._bus = bus
+
+    def _open_bus(self):
+        directory = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        handle, path = tempfile.mkstemp(
+            prefix='mousetrap-detect-', dir=directory)
+        os.close(handle)
+        try:
+            return FrameBusWriter(
+                path, slot_count=1, max_width=self._max_width,
+                max_height=self._max_height, max_channels=1,
+                metadata_size=16,
+            )
+        finally:
+            # Only this process and the server, through the descriptor it
+            # is sent, can reach the bus.
+            os.unlink(path)
+
+    def _disconnect(self):
+        self._channel.close()
+        self._bus.close(unlink=False)
+        self._channel = None
+        self._bus = None
+        self._retry_at = timer() + self._retry_seconds
+
+
+DetectorBackend.register('haar', CascadeBackend)
+DetectorBackend.register('lbp', LbpCascadeBackend)
+DetectorBackend.register('remote', RemoteBackend)
+DetectorBackend.register('yunet', YuNetBackend)
+
+
+class DetectorBackendError(Exception):
+    pass
+
+
+class SearchRegion(object):
+    '''
+    Part of an image to search, as fractions of the image's width and
+    height. For example, eyes are only ever in the upper part of a face.
+    '''
+
+    def __init__(self, x=0.0, y=0.0, width=1.0, height=1.0):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_config(cls, region_config):
+        '''region_config - dict of x, y, width, height, or None for all.'''
+        if region_config is None:
+            return FULL_SEARCH_REGION
+        return cls(**region_config)
+
+    def is_full(self):
+        return self.to_tuple() == (0.0, 0.0, 1.0, 1.0)
+
+    def to_tuple(self):
+        return (self.x, self.y, self.width, self.height)
+
+    def get_bounds(self, image_cv):
+        '''Return (from_x, from_y, to_x, to_y) of this region in image_cv.'''
+        image_height, image_width = image_cv.shape[:2]
+        if self.is_full():
+            return 0, 0, image_width, image_height
+
+        return (
+            int(round(self.x * image_width)),
+            int(round(self.y * image_height)),
+            int(round((self.x + self.width) * image_width)),
+            int(round((self.y + self.height) * image_height)),
+        )
+
+    def crop(self, image_cv):
+        '''
+        Return the part of image_cv inside this region, and the (x, y)
+        offset of that part within image_cv.
+        '''
+        if self.is_full():
+            return image_cv, (0, 0)
+
+        from_x, from_y, to_x, to_y = self.get_bounds(image_cv)
+
+        return image_cv[from_y:to_y, from_x:to_x], (from_x, from_y)
+
+
+FULL_SEARCH_REGION = SearchRegion()
+
+
+class MotionGate(object):
+    '''
+    Decides whether an image is close enough to the last image a detector
+    analysed that the detector may reuse that result instead of searching
+    again. Images are compared as small grayscale thumbnails; the largest
+    difference of any thumbnail pixel must be within the threshold.
+    '''
+
+    def __init__(self, config):
+        gate_config = config.get('motion_gate') or {}
+        self._enabled = gate_config.get('enabled', False)
+        self._threshold = gate_config.get('threshold', 10)
+        self._max_reuse = gate_config.get('max_reuse', 5)
+        self._size = (
+            gate_config.get('width', 32),
+            gate_config.get('height', 24),
+        )
+        self._last_thumbnail = None
+        self._last_result = None
+        self._reuse_count = 0
+
+    def is_unchanged(self, image):
+        '''
+        True if the result for the last analysed image may stand in for
+        image. Each True counts towards max_reuse.
+        '''
+        if not self._enabled or self._last_thumbnail is None:
+            return False
+
+        if self._reuse_count >= self._max_reuse:
+            return False
+
+        difference = cv2.absdiff(
+            image.get_thumbnail(self._size),
+            self._last_thumbnail,
+        ).max()
+
+        if difference > self._threshold:
+            return False
+
+        self._reuse_count += 1
+
+        return True
+
+    def get_result(self):
+        return self._last_result
+
+    def analysed(self, image, result):
+        '''Remember result as the outcome of analysing image.'''
+        if not self._enabled:
+            return
+
+        self._last_thumbnail = image.get_thumbnail(self._size)
+        self._last_result = result
+        self._reuse_count = 0
+
+
+class TemporalReuse(object):
+    '''
+    Lets a detector reuse where it last found its feature, in the frames
+    that follow, without searching them: a face moves slowly, and secondary
+    features searched inside the reused box tell when it has moved out of
+    it (see FeatureDetector.refresh). Only a found feature is reused, for at
+    most max_frames frames and max_seconds seconds after the last search.
+    '''
+
+    def __init__(self, config, name):
+        reuse_config = config.get('temporal_reuse') or {}
+        self._enabled = reuse_config.get('enabled', False) and \
+            name in reuse_config.get('features', ['face'])
+        self._max_frames = reuse_config.get('max_frames', 5)
+        self._max_seconds = reuse_config.get('max_seconds', 0.25)
+        self._last_result = None
+        self._last_timestamp = None
+        self._reuse_count = 0
+
+    def get_result(self, image):
+        '''
+        Return the last detection, moved to image, if it may stand in for a
+        search of image, otherwise None. Each reuse counts towards
+        max_frames.
+        '''
+        if not self._enabled or self._last_result is None:
+            return None
+
+        if self._reuse_count >= self._max_frames or \
+                image.timestamp - self._last_timestamp > self._max_seconds:
+            return None
+
+        self._reuse_count += 1
+
+        return self._last_result.for_image(image)
+
+    def analysed(self, image, result):
+        '''Remember result, a detection or None, found by searching image.'''
+        if not self._enabled:
+            return
+
+        self._last_result = result
+        self._last_timestamp = image.timestamp
+        self._reuse_count = 0
+
+
+class SearchGuide(object):
+    '''
+    Tells a detector where in an image its feature can be, so that it
+    searches only there: where a cheap mask of a small copy of the image
+    shows motion (against a running average background) or skin colour,
+    and around where the feature was last found. The whole image is
+    searched every full_scan_every searches, after the feature is lost, and
+    whenever the regions would not save much.
+    '''
+
+    def __init__(self, config, name):
+        guide_config = config.get('search_guide') or {}
+        self._enabled = guide_config.get('enabled', False) and \
+            name in guide_config.get('features', ['face'])
+        self._mask = guide_config.get('mask', MASK_BOTH)
+        self._width = guide_config.get('width', 80)
+        self._full_scan_every = guide_config.get('full_scan_every', 10)
+        self._margin = guide_config.get('margin', 0.25)
+        self._min_area = guide_config.get('min_area', 0.01)
+        self._max_area = guide_config.get('max_area', 0.6)
+        self._max_regions = guide_config.get('max_regions', 4)
+        self._motion_threshold = guide_config.get('motion_threshold', 20)
+        self._learning_rate = guide_config.get('learning_rate', 0.05)
+        skin = guide_config.get('skin') or {}
+        self._skin_low = (
+            0, skin.get('cr_min', 133), skin.get('cb_min', 77))
+        self._skin_high = (
+            255, skin.get('cr_max', 173), skin.get('cb_max', 127))
+        self._background = None
+        self._last_rect = None
+        self._until_full_scan = 0
+
+    def get_regions(self, image):
+        '''
+        Return a list of (x, y, width, height) regions of image to search,
+        possibly empty, or None to search the whole image.
+        '''
+        if not self._enabled:
+            return None
+
+        mask = self._get_mask(image)
+
+        if self._until_full_scan <= 0 or mask is None:
+            self._until_full_scan = self._full_scan_every
+            return None
+        self._until_full_scan -= 1
+
+        image_height, image_width = image.to_cv_grayscale().shape[:2]
+        regions = self._get_mask_regions(mask, image_width, image_height)
+        if self._last_rect is not None:
+            regions.append(_grow_rect(
+                self._last_rect, self._margin, image_width, image_height))
+        regions = _merge_rects(regions)
+
+        area = sum(width * height for _x, _y, width, height in regions)
+        if len(regions) > self._max_regions or \
+                area > self._max_area * image_width * image_height:
+            return None
+
+        return regions
+
+    def analysed(self, result):
+        '''Remember where result, a detection or None, found the feature.'''
+        if not self._enabled:
+            return
+
+        if result is None:
+            if self._last_rect is not None:
+                self._until_full_scan = 0
+            self._last_rect = None
+        else:
+            self._last_rect = result.to_rect()
+
+    def _get_size(self, image):
+        image_height, image_width = image.to_cv().shape[:2]
+        return (
+            self._width,
+            max(1, int(round(self._width * image_height / image_width))),
+        )
+
+    def _get_mask(self, image):
+        size = self._get_size(image)
+        masks = []
+        if self._mask in (MASK_MOTION, MASK_BOTH):
+            masks.append(self._get_motion_mask(image.get_thumbnail(size)))
+        if self._mask in (MASK_SKIN, MASK_BOTH):
+            masks.append(self._get_skin_mask(image.to_cv(), size))
+        if any(mask is None for mask in masks):
+            return None
+
+        mask = masks[0]
+        for other in masks[1:]:
+            mask = cv2.bitwise_or(mask, other)
+        return cv2.dilate(mask, None, iterations=2)
+
+    def _get_motion_mask(self, thumbnail):
+        # The background is learnt on every frame, full scans included.
+        if self._background is None or \
+                self._background.shape != thumbnail.shape:
+            self._background = thumbnail.astype(numpy.float32)
+            return None
+
+        difference = cv2.absdiff(
+            thumbnail, cv2.convertScaleAbs(self._background))
+        cv2.accumulateWeighted(
+            thumbnail, self._background, self._learning_rate)
+        return cv2.threshold(
+            difference, self._motion_threshold, 255, cv2.THRESH_BINARY)[1]
+
+    def _get_skin_mask(self, image_cv, size):
+        if image_cv.ndim == 2:
+            return None
+
+        small = cv2.resize(image_cv, size, interpolation=cv2.INTER_AREA)
+        return cv2.inRange(
+            cv2.cvtColor(small, cv2.COLOR_BGR2YCrCb),
+            numpy.array(self._skin_low, numpy.uint8),
+            numpy.array(self._skin_high, numpy.uint8),
+        )
+
+    def _get_mask_regions(self, mask, image_width, image_height):
+        mask_height, mask_width = mask.shape[:2]
+        scale_x = image_width / mask_width
+        scale_y = image_height / mask_height
+        min_area = self._min_area * mask_width * mask_height
+        count, _labels, stats, _centroids = \
+            cv2.connectedComponentsWithStats(mask)
+
+        regions = []
+        for label in range(1, count):
+            x, y, width, height, area = stats[label]
+            if area < min_area:
+                continue
+            regions.append(_grow_rect(
+                (x * scale_x, y * scale_y, width * scale_x, height * scale_y),
+                self._margin, image_width, image_height,
+            ))
+        return regions
+
+
+def _grow_rect(rect, margin, image_width, image_height):
+    '''
+    Grow (x, y, width, height) by margin of its size on each side, within
+    the image.
+    '''
+    x, y, width, height = rect
+    margin_x = width * margin
+    margin_y = height * margin
+    from_x = max(0, int(x - margin_x))
+    from_y = max(0, int(y - margin_y))
+    to_x = min(image_width, int(math.ceil(x + width + margin_x)))
+    to_y = min(image_height, int(math.ceil(y + height + margin_y)))
+    return (from_x, from_y, to_x - from_x, to_y - from_y)
+
+
+def _merge_rects(rects):
+    '''Replace overlapping (x, y, width, height) rects by their union.'''
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        for first in range(len(rects)):
+            for second in range(first + 1, len(rects)):
+                if _overlaps(rects[first], rects[second]):
+                    rects[first] = _union(rects[first], rects[second])
+                    del rects[second]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+def _overlaps(first, second):
+    return first[0] < second[0] + second[2] and \
+        second[0] < first[0] + first[2] and \
+        first[1] < second[1] + second[3] and \
+        second[1] < first[1] + first[3]
+
+
+def _union(first, second):
+    from_x = min(first[0], second[0])
+    from_y = min(first[1], second[1])
+    to_x = max(first[0] + first[2], second[0] + second[2])
+    to_y = max(first[1] + first[3], second[1] + second[3])
+    return (from_x, from_y, to_x - from_x, to_y - from_y)
+
+
+class Detection(object):
+    '''
+    A feature found in an image: the chosen rect, its centre and all the
+    candidate rects the backend returned, as an N x 4 array of x, y, width,
+    height in the coordinates of the searched image.
+
+    The crop of the searched image (image) is made on first use, and is the
+    same Image on every use, so detectors searching it share their caches.
+
+    For older code, a detection can also be read like the dict detectors
+    used to return: detection['x'], detection['center']['x'],
+    detection['image'].
+    '''
+
+    __slots__ = (
+        'x', 'y', 'width', 'height', 'candidates', '_config', '_source',
+        '_image', '_index',
+    )
+
+    _KEYS = ('x', 'y', 'width', 'height', 'center', 'image')
+
+    def __init__(self, config, source, candidates, index=0):
+        '''
+        source - Image the candidates were found in.
+
+        candidates - N x 4 array of candidate rects.
+
+        index - the candidate to choose.
+        '''
+        self._config = config
+        self._source = source
+        self._image = None
+        self.candidates = candidates
+        self._index = index
+        x, y, width, height = candidates[index]
+        self.x = int(x)
+        self.y = int(y)
+        self.width = int(width)
+        self.height = int(height)
+
+    @property
+    def center_x(self):
+        return self.x + self.width // 2
+
+    @property
+    def center_y(self):
+        return self.y + self.height // 2
+
+    @property
+    def image(self):
+        if self._image is None:
+            image_cv_grayscale = self._source.to_cv_grayscale()
+            self._image = Image(
+                self._config,
+                image_cv_grayscale[
+                    self.y:self.y + self.height,
+                    self.x:self.x + self.width,
+                ],
+                is_grayscale=True,
+                trace=self._source.trace,
+                timestamp=self._source.timestamp,
+            )
+        return self._image
+
+    def to_rect(self):
+        return (self.x, self.y, self.width, self.height)
+
+    def for_image(self, source):
+        '''Return this detection in source, another image of the same size.'''
+        return Detection(self._config, source, self.candidates, self._index)
+
+    def select_largest(self):
+        '''Return the detection of the candidate with the largest area.'''
+        areas = self.candidates[:, 2] * self.candidates[:, 3]
+        return self._select(int(areas.argmax()))
+
+    def select_nearest(self, x, y):
+        '''Return the detection of the candidate centred nearest (x, y).'''
+        centers_x = self.candidates[:, 0] + self.candidates[:, 2] // 2
+        centers_y = self.candidates[:, 1] + self.candidates[:, 3] // 2
+        distances = (centers_x - x) ** 2 + (centers_y - y) ** 2
+        return self._select(int(distances.argmin()))
+
+    def _select(self, index):
+        if tuple(self.candidates[index]) == self.to_rect():
+            return self
+        return Detection(self._config, self._source, self.candidates, index)
+
+    def __getitem__(self, key):
+        if key == 'center':
+            return {'x': self.center_x, 'y': self.center_y}
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __repr__(self):
+        return 'Detection(x=%d, y=%d, width=%d, height=%d, candidates=%d)' % (
+            self.x, self.y, self.width, self.height, len(self.candidates))
+
+
+class DetectionSession(object):
+    '''
+    The detectors of one pipeline, with their caches and loaded cascades.
+
+    Each App has its own session, so several pipelines can run in one
+    process, each on its own thread. Detectors requested through
+    FeatureDetector.get_detector while a session is active (see activate)
+    belong to that session; otherwise they belong to the default session.
+
+    Detectors of a session share its cascades. Cascades are not shared
+    between sessions: OpenCV's CascadeClassifier keeps per-image state
+    while detecting, so one classifier must not be used by two threads at
+    once.
+    '''
+
+    _local = threading.local()
+    _default = None
+    _default_lock = threading.Lock()
+
+    @classmethod
+    def get_current(cls):
+        session = getattr(cls._local, 'session', None)
+        if session is None:
+            session = cls.get_default()
+        return session
+
+    @classmethod
+    def get_default(cls):
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def __init__(self):
+        self._detectors = {}
+        self._loader = None
+
+    @contextmanager
+    def activate(self):
+        '''Make this the current session of this thread while in context.'''
+        previous = getattr(self._local, 'session', None)
+        self._local.session = self
+        try:
+            yield self
+        finally:
+            self._local.session = previous
+
+    def get_detector(self, config, name, scale_factor=1.1, min_neighbors=3,
+                     search_region=None, select=SELECT_FIRST, scale=1.0):
+        if search_region is None:
+            search_region = FULL_SEARCH_REGION
+
+        key = (
+            name, scale_factor, min_neighbors, search_region.to_tuple(),
+            select, scale,
+        )
+
+        if key in self._detectors:
             LOGGER.info("Reusing %s detector.", key)
-            return cls._INSTANCES[key]
+            return self._detectors[key]
+
+        if self._loader is None:
+            self._loader = HaarLoader(config)
 
-        cls._INSTANCES[key] = FeatureDetector(
-            config, name, scale_factor, min_neighbors
+        self._detectors[key] = FeatureDetector(
+            config, name, scale_factor, min_neighbors, search_region,
+            loader=self._loader, select=select, scale=scale,
         )
 
-        return cls._INSTANCES[key]
+        return self._detectors[key]
+
+    def get_detectors(self):
+        '''Return a dict of detectors keyed by their parameters.'''
+        return dict(self._detectors)
+
+    def is_detected(self, name):
+        '''True if any detector of name found it on its last search.'''
+        return any(
+            detector.is_last_attempt_successful()
+            for key, detector in self._detectors.items()
+            if key[0] == name
+        )
+
+    def clear_all_detection_caches(self):
+        for detector in self._detectors.values():
+            detector.clear_cache()
+
+    def get_detections(self, image):
+        '''
+        Describe what the detectors found since their caches were last
+        cleared: a list of dicts with feature, rect ([x, y, width, height] or
+        None if not found) and in_image (False if the search was inside
+        another feature, so rect is relative to that feature).
+        '''
+        detections = []
+        for detector in self._detectors.values():
+            for searched, result in detector.get_cached_results():
+                if result is None:
+                    rect = None
+                else:
+                    rect = list(result.to_rect())
+                detections.append({
+                    'feature': detector.get_name(),
+                    'rect': rect,
+                    'in_image': searched is image,
+                })
+        return detections
+
+    def get_stats(self):
+        '''Detector stats (see FeatureDetector.get_stats) summed by name.'''
+        stats = {}
+        for detector in self._detectors.values():
+            totals = stats.setdefault(
+                detector.get_name(),
+                {'attempts': 0, 'hits': 0, 'reused': 0},
+            )
+            for key, value in detector.get_stats().items():
+                totals[key] += value
+        return stats
+
+
+class FeatureDetector(object):
+
+    @classmethod
+    def get_detector(cls, config, name, scale_factor=1.1, min_neighbors=3,
+                     search_region=None, select=SELECT_FIRST, scale=1.0):
+        '''Get a shared detector from the current DetectionSession.'''
+        return DetectionSession.get_current().get_detector(
+            config, name, scale_factor, min_neighbors, search_region, select,
+            scale,
+        )
+
+    @classmethod
+    def from_config(cls, config, name, detector_config):
+        '''
+        Get the detector for name configured by detector_config, a dict
+        with scale_factor, min_neighbors and optionally search_region,
+        select and scale.
+        '''
+        return cls.get_detector(
+            config,
+            name,
+            scale_factor=detector_config['scale_factor'],
+            min_neighbors=detector_config['min_neighbors'],
+            search_region=SearchRegion.from_config(
+                detector_config.get('search_region')
+            ),
+            select=detector_config.get('select', SELECT_FIRST),
+            scale=detector_config.get('scale', 1.0),
+        )
+
+    @classmethod
+    def is_detected(cls, name):
+        return DetectionSession.get_current().is_detected(name)
 
     @classmethod
     def clear_all_detection_caches(cls):
-        for instance in cls._INSTANCES.values():
-            instance.clear_cache()
+        DetectionSession.get_current().clear_all_detection_caches()
 
-    def __init__(self, config, name, scale_factor=1.1, min_neighbors=3):
+    def __init__(self, config, name, scale_factor=1.1, min_neighbors=3,
+                 search_region=None, loader=None, select=SELECT_FIRST,
+                 scale=1.0):
         '''
         name - name of feature to detect
 
@@ -134,10 +1310,29 @@ class FeatureDetector(object):
 
         min_neighbors - how many neighbors each candidate rectangle should have
                 to retain it. Default 3.
+
+        search_region - SearchRegion of each image to search. Detections are
+                still reported in the coordinates of the whole image.
+                Default is the whole image.
+
+        loader - HaarLoader to load cascades with. Default is a new loader.
+
+        select - which candidate to report when several are found: first
+                (as ordered by the backend), largest, or nearest (to the
+                centre of the last detection). Default first. Every
+                Detection also carries all candidates.
+
+        scale - factor to resize the searched image by before detecting,
+                e.g. 0.5 to search at half resolution. Detections are still
+                reported in the coordinates of the image. Default 1.0.
         '''
+        if search_region is None:
+            search_region = FULL_SEARCH_REGION
+
         LOGGER.info(
             "Building detector: %s",
-            (name, scale_factor, min_neighbors)
+            (name, scale_factor, min_neighbors, search_region.to_tuple(),
+             select, scale)
         )
 
         self._config = config
@@ -145,89 +1340,214 @@ class FeatureDetector(object):
         self._single = None
         self._plural = None
         self._image = None
-        self._cascade = HaarLoader(config).from_name(name)
+        self._backend = DetectorBackend.from_config(config, name, loader)
         self._scale_factor = scale_factor
         self._min_neighbors = min_neighbors
+        self._search_region = search_region
+        self._select = select
+        self._scale = scale
+        self._last_center = None
+        self._motion_gate = MotionGate(config)
+        self._temporal_reuse = TemporalReuse(config, name)
+        self._reused_image = None
+        self._search_guide = SearchGuide(config, name)
         self._last_attempt_successful = False
         self._detect_cache = {}
+        self._attempts = 0
+        self._hits = 0
+        self._reuses = 0
+
+    def find(self, image):
+        '''Return the Detection of the feature in image, or None.'''
+        with image.trace.span('FeatureDetector.find', feature=self._name):
+            return self._find(image)
 
     def detect(self, image):
-        if image in self._detect_cache:
-            message = "Detection cache hit: %(image)d -> %(result)s" % {
-                'image': id(image),
-                'result': self._detect_cache[image],
-            }
-            LOGGER.debug(message)
-
-            if isinstance(self._detect_cache[image], FeatureNotFoundException):
-                message = str(self._detect_cache[image])
-                raise FeatureNotFoundException(
-                    message,
-                    cause=self._detect_cache[image]
-                )
+        '''
+        Return the Detection of the feature in image. Raises
+        FeatureNotFoundException if it is not found; find is cheaper where
+        misses are common.
+        '''
+        detection = self.find(image)
+        if detection is None:
+            raise FeatureNotFoundException(
+                _('Feature not detected: %s') % (self._name))
+        return detection
 
-            return self._detect_cache[image]
-        try:
-            self._image = image
-            self._detect_plural()
-            self._exit_if_none_detected()
-            self._unpack_first()
-            self._extract_image()
-            self._calculate_center()
-            self._detect_cache[image] = self._single
+    def refresh(self, image):
+        '''
+        As find, but search image even if find answered with a reused
+        result: for when a search inside that result failed, which suggests
+        the feature has moved.
+        '''
+        if image is not self._reused_image:
+            return self.find(image)
+
+        with image.trace.span('FeatureDetector.refresh', feature=self._name):
+            self._reused_image = None
+            self._reuses -= 1
+            if self._detect_cache.pop(image) is not None:
+                self._hits -= 1
+            PASS_LOG.debug("Searching again for %s", self._name)
+            return self._search(image)
 
+    def _find(self, image):
+        if image not in self._detect_cache:
+            self._attempts += 1
+            self._reuse(image)
+
+        if image in self._detect_cache:
+            PASS_LOG.debug(
+                "Detection cache hit: %d -> %s",
+                id(image), self._detect_cache[image],
+            )
             return self._detect_cache[image]
-        except FeatureNotFoundException as exception:
-            self._detect_cache[image] = exception
 
-            raise
+        return self._search(image)
+
+    def _reuse(self, image):
+        '''Cache a reused result for image, if one may replace a search.'''
+        reused = self._temporal_reuse.get_result(image)
+        if reused is None:
+            if not self._motion_gate.is_unchanged(image):
+                return
+            reused = self._motion_gate.get_result()
+            if reused is not None:
+                reused = reused.for_image(image)
+
+        self._reuses += 1
+        if reused is not None:
+            self._hits += 1
+        self._detect_cache[image] = reused
+        self._reused_image = image
+
+    def _search(self, image):
+        self._image = image
+        self._detect_plural()
+        self._single = None
+        if self._update_last_attempt():
+            self._select_single()
+            self._hits += 1
+        self._detect_cache[image] = self._single
+        self._motion_gate.analysed(image, self._single)
+        self._temporal_reuse.analysed(image, self._single)
+        self._search_guide.analysed(self._single)
+
+        return self._single
 
     def _detect_plural(self):
-        self._plural = self._cascade.detectMultiScale(
-            self._image.to_cv_grayscale(),
+        image_cv = self._image.to_cv_grayscale()
+        guided_regions = self._search_guide.get_regions(self._image)
+
+        if guided_regions is None:
+            region_cv, offset = self._search_region.crop(image_cv)
+            self._plural = self._detect_region(region_cv, offset)
+            return
+
+        bounds = self._search_region.get_bounds(image_cv)
+        found = []
+        for x, y, width, height in guided_regions:
+            from_x, from_y = max(x, bounds[0]), max(y, bounds[1])
+            to_x = min(x + width, bounds[2])
+            to_y = min(y + height, bounds[3])
+            if to_x > from_x and to_y > from_y:
+                plural = self._detect_region(
+                    image_cv[from_y:to_y, from_x:to_x], (from_x, from_y))
+                if len(plural) > 0:
+                    found.append(plural)
+        self._plural = numpy.concatenate(found) if found else ()
+
+    def _detect_region(self, region_cv, offset):
+        '''Return the candidates in region_cv, at offset in the image.'''
+        offset_x, offset_y = offset
+        if self._scale != 1.0:
+            region_cv = cv2.resize(
+                region_cv, None, fx=self._scale, fy=self._scale,
+                interpolation=cv2.INTER_AREA,
+            )
+        plural = self._backend.detect(
+            region_cv,
             self._scale_factor,
             self._min_neighbors,
         )
+        if len(plural) > 0 and self._scale != 1.0:
+            plural = (plural / self._scale).astype(int)
+        if len(plural) > 0 and (offset_x or offset_y):
+            plural = plural + (offset_x, offset_y, 0, 0)
+        return plural
 
-    def _exit_if_none_detected(self):
-        if len(self._plural) == 0:
-            message = _('Feature not detected: %s') % (self._name)
-            if self._last_attempt_successful:
-                self._last_attempt_successful = False
-                LOGGER.info(message)
-            raise FeatureNotFoundException(message)
-        else:
-            if not self._last_attempt_successful:
-                self._last_attempt_successful = True
-                message = _('Feature detected: %s') % (self._name)
-                LOGGER.info(message)
+    def _update_last_attempt(self):
+        '''Return True if the feature was found. Logs when that changes.'''
+        successful = len(self._plural) > 0
+        if successful != self._last_attempt_successful:
+            self._last_attempt_successful = successful
+            if successful:
+                LOGGER.info(_('Feature detected: %s'), self._name)
+            else:
+                LOGGER.info(_('Feature not detected: %s'), self._name)
+        return successful
 
-    def _unpack_first(self):
-        self._single = dict(
-            zip(['x', 'y', 'width', 'height'], self._plural[0])
-        )
+    def _select_single(self):
+        single = Detection(self._config, self._image, self._plural)
+        if self._select == SELECT_LARGEST:
+            single = single.select_largest()
+        elif self._select == SELECT_NEAREST and self._last_center is not None:
+            single = single.select_nearest(*self._last_center)
+        self._last_center = (single.center_x, single.center_y)
+        self._single = single
+
+    def get_name(self):
+        return self._name
 
-    def _calculate_center(self):
-        self._single["center"] = {
-            "x": (self._single["x"] + self._single["width"]) // 2,
-            "y": (self._single["y"] + self._single["height"]) // 2,
+    def get_parameters(self):
+        return {
+            'scale_factor': self._scale_factor,
+            'min_neighbors': self._min_neighbors,
+            'scale': self._scale,
+            'select': self._select,
+            'search_region': self._search_region.to_tuple(),
         }
 
-    def _extract_image(self):
-        single = self._single
-        from_y = single['y']
-        to_y = single['y'] + single['height']
-        from_x = single['x']
-        to_x = single['x'] + single['width']
-        image_cv_grayscale = self._image.to_cv_grayscale()
-        single["image"] = Image(
-            self._config,
-            image_cv_grayscale[from_y:to_y, from_x:to_x],
-            is_grayscale=True,
-        )
+    def set_parameters(self, scale_factor=None, min_neighbors=None,
+                       scale=None):
+        '''
+        Change how this detector searches from the next image on. The
+        detector keeps the DetectionSession key it was built with.
+        '''
+        if scale_factor is not None:
+            self._scale_factor = scale_factor
+        if min_neighbors is not None:
+            self._min_neighbors = min_neighbors
+        if scale is not None:
+            self._scale = scale
+        LOGGER.info(
+            "Detector %s parameters: %s", self._name, self.get_parameters())
+
+    def get_stats(self):
+        '''
+        Counts since this detector was built, of images it was asked about
+        (attempts), found the feature in (hits) and answered with a reused
+        result (reused). Repeated requests for the same image count once.
+        '''
+        return {
+            'attempts': self._attempts,
+            'hits': self._hits,
+            'reused': self._reuses,
+        }
+
+    def is_last_attempt_successful(self):
+        return self._last_attempt_successful
+
+    def get_cached_results(self):
+        '''
+        Return (image, result) pairs cached since the last clear_cache, where
+        result is a detection or None.
+        '''
+        return list(self._detect_cache.items())
 
     def clear_cache(self):
         self._detect_cache.clear()
+        self._reused_image = None
 
 
 class FeatureDetectorClearCachePlugin(interface.Plugin):
@@ -236,7 +1556,7 @@ class FeatureDetectorClearCachePlugin(interface.Plugin):
         self._config = config
 
     def run(self, app):
-        FeatureDetector.clear_all_detection_caches()
+        app.session.clear_all_detection_caches()
 
 
 class FeatureNotFoundException(Exception):